@@ -8,20 +8,29 @@ from dotenv import load_dotenv
 load_dotenv()
 
 from gevent.pywsgi import WSGIServer
+from gevent.event import AsyncResult
+from gevent.queue import Queue, Empty
+from gevent.threadpool import ThreadPool
 
-import random
 import threading
 import time
 import json
-from flask import Response
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session
+import csv
+import io
+from collections import OrderedDict, namedtuple
+from flask import Response, stream_with_context
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session, has_request_context, g
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy import Numeric # Import Numeric type
-from sqlalchemy.orm import joinedload
+from sqlalchemy.orm import joinedload, make_transient_to_detached, Session as SASession
+from sqlalchemy import event, inspect as sa_inspect
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
 from flask_migrate import Migrate
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
+from werkzeug.local import LocalProxy
 from flask import send_from_directory
 from datetime import datetime
 from flask_wtf import FlaskForm
@@ -35,9 +44,24 @@ import jwt
 import requests
 import datetime as dt_module
 import uuid
+import base64
+import binascii
+import hashlib
+import heapq
+import itertools
+import hmac
+import secrets
+import zlib
+import numpy as np
 import stripe
-from sqlalchemy import func, or_
+from sqlalchemy import func, or_, and_, case, insert, update, delete
 from flask import jsonify
+import click
+import socket
+import tempfile
+from urllib.parse import urlparse
+from socketio_broker import UnixSocketManager, run_socketio_broker
+from benchmarks import bench_chat_command, bench_logins_command, bench_socketio_command, bench_sqlite_command, stress_transfers_command
 
 
 # --- CONFIGURATION (Banking) ---
@@ -51,6 +75,62 @@ STRIPE_SECRET_KEY = os.getenv('STRIPE_SECRET_KEY', 'YOUR_SECRET_KEY_HERE')
 stripe.api_key = STRIPE_SECRET_KEY
 PREMIUM_PLAN_PRICE_ID = os.getenv('PREMIUM_PLAN_PRICE_ID', 'YOUR_PRICE_ID_HERE')
 MAX_COMPLETED_TRANSACTIONS_TO_KEEP = 25
+TRANSACTION_ARCHIVE_INTERVAL = int(os.getenv('TRANSACTION_ARCHIVE_INTERVAL', 600))  # seconds; 0 disables the sweeper
+TRANSACTION_ARCHIVE_CHUNK_SIZE = 500  # customers checked per query
+ARCHIVE_SEGMENT_ROWS = 1000  # transactions packed into one compressed archive segment
+SPENDING_TRANSACTION_TYPES = ('send',)  # completed transactions of these types count as spending
+# Both legs of a move between a customer's own accounts carry this category; they are neither spending nor income
+INTERNAL_TRANSFER_CATEGORY = 'Internal Transfer'
+SPENDING_ANALYTICS_MONTHS = 3  # default window of the dashboard chart, current month included
+SPENDING_CHART_COLORS = ['#4f46e5', '#06b6d4', '#f59e0b', '#ef4444', '#10b981', '#8b5cf6', '#ec4899', '#64748b']
+INCOME_TRANSACTION_TYPES = ('receive', 'admin_deposit')  # completed transactions of these types count as inflow
+FINANCIAL_HEALTH_CHUNK_SIZE = 2000  # customers scored per batch
+FINANCIAL_HEALTH_CASH_FLOW_DAYS = 90  # window of the inflow/outflow ratio
+FINANCIAL_HEALTH_MONTHS = 6  # complete months of spending the volatility is measured over
+FINANCIAL_HEALTH_TARGET_BALANCE = 10000.0  # total balance that earns the full balance component
+FINANCIAL_HEALTH_WEIGHTS = (0.40, 0.35, 0.25)  # balance, cash flow, spending stability
+MAX_BATCH_TRANSFERS = 5000
+MAX_BULK_APPROVALS = 5000
+PENDING_QUEUE_PAGE_SIZE = 100
+HISTORY_PAGE_SIZE = 10
+ADMIN_HISTORY_PAGE_SIZE = 50
+MAX_HISTORY_PAGE_SIZE = 100
+STATEMENT_CHUNK_ROWS = 500  # rows fetched per round trip and written per streamed chunk of an export
+CUSTOMER_DIRECTORY_PAGE_SIZE = 50
+SUBMISSIONS_PAGE_SIZE = 50
+CHAT_HISTORY_PAGE_SIZE = 50
+CHAT_PREVIEW_LENGTH = 200
+NOTIFICATION_FEED_SIZE = 10
+NOTIFICATION_CACHE_TTL = int(os.getenv('NOTIFICATION_CACHE_TTL', 60))  # seconds
+NOTIFICATION_CACHE_MAX_ENTRIES = 10000
+IDENTITY_CACHE_TTL = int(os.getenv('IDENTITY_CACHE_TTL', 300))  # seconds
+IDENTITY_CACHE_MAX_ENTRIES = 10000
+RECIPIENT_CACHE_TTL = int(os.getenv('RECIPIENT_CACHE_TTL', 60))  # seconds
+RECIPIENT_CACHE_MAX_ENTRIES = 10000
+# Group commit batches chat message inserts from concurrent handlers into one commit
+CHAT_GROUP_COMMIT = os.getenv('CHAT_GROUP_COMMIT', 'false').lower() in ['true', '1', 't']
+CHAT_GROUP_COMMIT_MAX_BATCH = int(os.getenv('CHAT_GROUP_COMMIT_MAX_BATCH', 200))
+CHAT_GROUP_COMMIT_MAX_DELAY = float(os.getenv('CHAT_GROUP_COMMIT_MAX_DELAY', 0.005))  # seconds
+# Shared Socket.IO message queue for running several workers (redis://..., kafka://...,
+# or unix:///path/to/broker.sock for the bundled `flask socketio-broker`). Unset = single process.
+SOCKETIO_MESSAGE_QUEUE = os.getenv('SOCKETIO_MESSAGE_QUEUE')
+SOCKETIO_CHANNEL = os.getenv('SOCKETIO_CHANNEL', 'wellcare-socketio')
+PRESENCE_FLUSH_INTERVAL = float(os.getenv('PRESENCE_FLUSH_INTERVAL', 1.0))  # seconds between deltas to agents
+PRESENCE_SYNC_INTERVAL = float(os.getenv('PRESENCE_SYNC_INTERVAL', 5.0))  # seconds, multi-worker only
+# Password hashing runs on native threads so it doesn't stall the gevent hub; 0 = inline
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', 4))
+# PBKDF2 work factor for new hashes; existing hashes keep verifying with their own iteration count
+PASSWORD_HASH_ITERATIONS = os.getenv('PASSWORD_HASH_ITERATIONS')
+PASSWORD_HASH_METHOD = f"pbkdf2:sha256:{PASSWORD_HASH_ITERATIONS}" if PASSWORD_HASH_ITERATIONS else 'pbkdf2:sha256'
+# Account numbers each worker reserves from the shared sequence at a time
+ACCOUNT_NUMBER_BLOCK_SIZE = int(os.getenv('ACCOUNT_NUMBER_BLOCK_SIZE', 100))
+# Engine profiles; SQLALCHEMY_ENGINE_OPTIONS from the app config override these
+SQLITE_BUSY_TIMEOUT = int(os.getenv('SQLITE_BUSY_TIMEOUT', 5000))  # ms to wait for another writer before "database is locked"
+SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))  # bytes of the file read through mmap
+SQLITE_CACHE_SIZE = int(os.getenv('SQLITE_CACHE_SIZE', -64000))  # page cache per connection; negative = KiB
+SQLITE_POOL_SIZE = int(os.getenv('SQLITE_POOL_SIZE', 10))
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 10))  # Postgres connections kept per worker
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 20))
 
 # Initialize Flask app
 app = Flask(__name__)
@@ -116,6 +196,9 @@ else:
     DATABASE_URL = os.getenv('DATABASE_URL')
     if DATABASE_URL and DATABASE_URL.startswith('postgres'):
         app.config['SQLALCHEMY_DATABASE_URI'] = DATABASE_URL.replace('postgres://', 'postgresql://', 1)
+    elif DATABASE_URL:
+        # e.g. a throwaway sqlite:/// file for the test suite
+        app.config['SQLALCHEMY_DATABASE_URI'] = DATABASE_URL
     else:
         db_path = os.path.join(basedir, 'northsecure_bank.db')
         app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + db_path
@@ -124,8 +207,103 @@ app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['SENSITIVE_FILES_FOLDER'] = SENSITIVE_FILES_FOLDER
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'a_very_secret_key_for_socketio')
-socketio = SocketIO(app, async_mode='gevent')
+
+
+# --- DATABASE ENGINE PROFILES ---
+
+SQLITE_PRAGMAS = (
+    f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT}",  # first, so switching to WAL can wait for other connections
+    "PRAGMA journal_mode=WAL",  # readers and the writer stop blocking each other
+    "PRAGMA synchronous=NORMAL",  # safe with WAL; a power loss can only drop the last commits
+    f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}",
+    f"PRAGMA cache_size={SQLITE_CACHE_SIZE}",
+)
+
+
+def engine_profile(database_uri):
+    """Default engine options for the database's dialect."""
+    url = make_url(database_uri)
+    if url.get_backend_name() == 'sqlite':
+        if not url.database or url.database == ':memory:':
+            return {}
+        # A bounded QueuePool: greenlets waiting for a connection park on gevent-patched locks
+        # instead of piling onto the file, and pooled connections keep their PRAGMAs
+        return {
+            'poolclass': QueuePool,
+            'pool_size': SQLITE_POOL_SIZE,
+            'max_overflow': SQLITE_POOL_SIZE * 2
+        }
+    if url.get_backend_name() == 'postgresql':
+        return {
+            'pool_size': DB_POOL_SIZE,
+            'max_overflow': DB_MAX_OVERFLOW,
+            'pool_recycle': 1800,
+            'pool_pre_ping': True,
+            'pool_use_lifo': True,  # idle extras age out instead of all staying warm
+            'connect_args': {'application_name': 'wellcare-spendables'}
+        }
+    return {}
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for pragma in SQLITE_PRAGMAS:
+        cursor.execute(pragma)
+    cursor.close()
+
+
+def _gevent_wait_callback(conn, timeout=None):
+    """psycopg2 wait callback that yields to the gevent hub while the server works."""
+    from psycopg2 import extensions, OperationalError
+    from gevent.socket import wait_read, wait_write
+    while True:
+        state = conn.poll()
+        if state == extensions.POLL_OK:
+            return
+        if state == extensions.POLL_READ:
+            wait_read(conn.fileno(), timeout=timeout)
+        elif state == extensions.POLL_WRITE:
+            wait_write(conn.fileno(), timeout=timeout)
+        else:
+            raise OperationalError(f"Bad result from poll: {state!r}")
+
+
+def configure_engine(engine):
+    """Applies the per-connection half of the dialect's profile to an engine."""
+    if engine.dialect.name == 'sqlite' and engine.url.database not in (None, '', ':memory:'):
+        event.listen(engine, 'connect', _set_sqlite_pragmas)
+    elif engine.dialect.name == 'postgresql' and engine.dialect.driver == 'psycopg2':
+        # Without this every query blocks the whole gevent worker until Postgres answers
+        from psycopg2 import extensions
+        extensions.set_wait_callback(_gevent_wait_callback)
+    return engine
+
+
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+    **engine_profile(app.config['SQLALCHEMY_DATABASE_URI']),
+    **app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})
+}
+
+
+# --- SOCKET.IO SCALE-OUT ---
+
+def socketio_options():
+    """SocketIO kwargs for the configured message queue (none when running a single process)."""
+    if not SOCKETIO_MESSAGE_QUEUE:
+        return {}
+    if SOCKETIO_MESSAGE_QUEUE.startswith('unix://'):
+        return {'client_manager': UnixSocketManager(SOCKETIO_MESSAGE_QUEUE, channel=SOCKETIO_CHANNEL)}
+    return {'message_queue': SOCKETIO_MESSAGE_QUEUE, 'channel': SOCKETIO_CHANNEL}
+
+
+# Behind several workers a long-polling client can land on a different process for each
+# request, so browsers are told to go straight to WebSocket whenever a queue is configured.
+SOCKET_CLIENT_OPTIONS = {'transports': ['websocket']} if SOCKETIO_MESSAGE_QUEUE else {}
+
+socketio = SocketIO(app, async_mode='gevent', **socketio_options())
 db = SQLAlchemy(app)
+with app.app_context():
+    configure_engine(db.engine)
 # Use render_as_batch=True for SQLite compatibility with migrations
 migrate = Migrate(app, db, render_as_batch=True) 
 login_manager = LoginManager(app)
@@ -197,16 +375,18 @@ class TransferForm(FlaskForm):
         super(TransferForm, self).__init__(*args, **kwargs)
         # Populate account choices dynamically
         if current_user.is_authenticated:
-            self.from_account.choices = [(a.id, f"{a.account_type.title()} | Balance: ${a.balance:.2f}") for a in current_user.accounts]
-            self.to_account_internal.choices = [(a.id, a.account_type.title()) for a in current_user.accounts]
+            accounts = get_account_snapshot().values()
+            self.from_account.choices = [(a.id, f"{a.account_type.title()} | Balance: ${a.balance:.2f}") for a in accounts]
+            self.to_account_internal.choices = [(a.id, a.account_type.title()) for a in accounts]
 
     def validate_amount(self, amount):
         if amount.data is None or amount.data <= 0:
             raise ValidationError('Transfer amount must be positive.')
         from_account_id = self.from_account.data
         if from_account_id:
-            from_account = Account.query.get(from_account_id)
-            if amount.data > decimal.Decimal(from_account.balance):
+            from_account = get_account_snapshot().get(from_account_id)
+            # Accounts that aren't the user's already fail the from_account choice check
+            if from_account and amount.data > decimal.Decimal(from_account.balance):
                 raise ValidationError('Insufficient funds for this transfer.')
 
     def validate(self, **kwargs):
@@ -226,7 +406,7 @@ class TransferForm(FlaskForm):
             if not self.recipient_account_number.data:
                 self.recipient_account_number.errors.append('Recipient account number is required.')
                 return False
-            recipient = Customer.query.filter_by(account_number=self.recipient_account_number.data).first()
+            recipient = resolve_recipient(self.recipient_account_number.data)
             if not recipient:
                 self.recipient_account_number.errors.append('Recipient account number not found.')
                 return False
@@ -234,13 +414,116 @@ class TransferForm(FlaskForm):
                  self.recipient_account_number.errors.append('Cannot send funds to yourself.')
                  return False
         return True
+
+class AccountNumberAllocator:
+    """
+    Hands out unique 10-digit account numbers without checking the customer table.
+
+    Workers reserve blocks of positions from the shared accountnumbersequence row, and a
+    keyed Feistel permutation over 0..10^10-1 maps each position to its account number.
+    The permutation is a bijection, so distinct positions can never produce the same
+    number, and the numbers still look random from one customer to the next. The key
+    lives in the sequence row so every worker and every restart uses the same mapping.
+    """
+    DOMAIN_HALF = 10 ** 5  # 10^10 positions split into two 5-digit halves
+    ROUNDS = 7
+
+    def __init__(self, block_size=ACCOUNT_NUMBER_BLOCK_SIZE):
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._key = None
+        self._numbers = []
+        self._pid = None
+
+    def _permute(self, position):
+        left, right = divmod(position, self.DOMAIN_HALF)
+        for round_number in range(self.ROUNDS):
+            digest = hmac.new(self._key, f"{round_number}:{right}".encode(), hashlib.sha256).digest()
+            left, right = right, (left + int.from_bytes(digest[:8], 'big')) % self.DOMAIN_HALF
+        return f"{left * self.DOMAIN_HALF + right:010d}"
+
+    def _reserve(self, connection, count):
+        """
+        Claims `count` positions in the caller's own transaction. A connection of its own
+        would deadlock on SQLite: the column default runs mid-flush, when the caller may
+        already hold the database's write lock.
+        """
+        claimed = connection.execute(
+            update(AccountNumberSequence).where(AccountNumberSequence.id == 1)
+            .values(next_position=AccountNumberSequence.next_position + count)
+        ).rowcount
+        if not claimed:
+            # First allocation on a database built without migrations
+            connection.execute(insert(AccountNumberSequence).values(id=1, next_position=count, key=secrets.token_hex(16)))
+        next_position, key = connection.execute(
+            db.select(AccountNumberSequence.next_position, AccountNumberSequence.key).where(AccountNumberSequence.id == 1)
+        ).one()
+        if next_position > self.DOMAIN_HALF ** 2:
+            raise RuntimeError("Account number space exhausted.")
+        self._key = key.encode()
+        numbers = [self._permute(position) for position in range(next_position - count, next_position)]
+
+        # Numbers issued by the old random generator can collide with the permutation;
+        # one query per block drops those, instead of one per customer.
+        taken = set()
+        for start in range(0, len(numbers), 500):
+            chunk = numbers[start:start + 500]
+            taken.update(connection.execute(db.select(Customer.account_number).where(Customer.account_number.in_(chunk))).scalars())
+        return [n for n in numbers if n not in taken]
+
+    def allocate_many(self, count, db_session=None):
+        """
+        Returns `count` fresh account numbers, reserving what the blocks on hand can't cover in one go.
+        A block reserved by an open transaction serves only that session until it commits
+        (see _release_account_numbers); a rollback undoes the claim and takes the block with it.
+        """
+        db_session = db_session or db.session
+        pending = db_session.info.setdefault('account_numbers', [])
+        allocated, pending[:] = pending[:count], pending[count:]
+        if len(allocated) < count:
+            with self._lock:
+                if self._pid != os.getpid():
+                    # A block inherited across fork() is shared with the parent; drop it
+                    self._numbers, self._pid = [], os.getpid()
+                needed = count - len(allocated)
+                allocated, self._numbers = allocated + self._numbers[:needed], self._numbers[needed:]
+        while len(allocated) < count:
+            # Outside the lock: on Postgres this waits for any other transaction holding the sequence row
+            pending.extend(self._reserve(db_session.connection(), max(self.block_size, count - len(allocated))))
+            needed = count - len(allocated)
+            allocated, pending[:] = allocated + pending[:needed], pending[needed:]
+        return allocated
+
+    def allocate(self):
+        return self.allocate_many(1)[0]
+
+    def release(self, numbers):
+        """Makes numbers from a committed reservation available to every session."""
+        with self._lock:
+            if self._pid == os.getpid():
+                self._numbers.extend(numbers)
+
+
+account_number_allocator = AccountNumberAllocator()
+
+
+@event.listens_for(SASession, 'after_commit')
+def _release_account_numbers(db_session):
+    # The reservation is durable now, so the rest of its block can serve any transaction
+    leftover = db_session.info.pop('account_numbers', None)
+    if leftover:
+        account_number_allocator.release(leftover)
+
+
+@event.listens_for(SASession, 'after_soft_rollback')
+def _discard_account_numbers(db_session, previous_transaction):
+    # The claim was rolled back with the transaction; another worker may reserve these positions
+    db_session.info.pop('account_numbers', None)
+
+
 def generate_unique_account_number():
     """Generates a unique 10-digit account number."""
-    while True:
-        acc_num = ''.join([str(random.randint(0, 9)) for _ in range(10)])
-        exists = Customer.query.filter_by(account_number=acc_num).first()
-        if not exists:
-            return acc_num
+    return account_number_allocator.allocate()
 
 # --- REFACTORED DATABASE MODELS ---
 
@@ -263,6 +546,8 @@ class Customer(UserMixin, db.Model):
     account_number = db.Column(db.String(10), unique=True, nullable=False, default=generate_unique_account_number, index=True)
     avatar_url = db.Column(db.String(100), default='default.png')
     date_joined = db.Column(db.DateTime, nullable=False, default=dt_module.datetime.utcnow)
+    # Notifications (transactions) up to this moment have been seen; NULL = none yet
+    notifications_read_at = db.Column(db.DateTime, nullable=True)
     accounts = db.relationship('Account', backref='owner', lazy=True, cascade="all, delete-orphan")
     transactions = db.relationship('Transaction', backref='owner', lazy=True, cascade="all, delete-orphan")
 
@@ -270,6 +555,10 @@ class Customer(UserMixin, db.Model):
     def is_premier(self):
         return self.account_tier == 'premier'
 
+# Case-insensitive prefix search in the admin customer directory
+db.Index('ix_customer_username_lower', func.lower(Customer.username))
+db.Index('ix_customer_email_lower', func.lower(Customer.email))
+
 
 class Account(db.Model):
     __tablename__ = 'account'
@@ -291,7 +580,12 @@ class Transaction(db.Model):
     customer_id = db.Column(db.Integer, db.ForeignKey('customer.id'), nullable=False, index=True)
     status = db.Column(db.String(20), nullable=False, default='completed')
     category = db.Column(db.String(50), nullable=True, default='Uncategorized')
-    is_read = db.Column(db.Boolean, default=False, nullable=False)
+    is_read = db.Column(db.Boolean, default=False, nullable=False)  # superseded by Customer.notifications_read_at
+
+# Keyset pagination index: WHERE customer_id = ? ORDER BY timestamp DESC, id DESC
+db.Index('ix_transaction_customer_id_timestamp', Transaction.customer_id, Transaction.timestamp.desc(), Transaction.id.desc())
+# Approval queue: WHERE status = 'pending' ORDER BY timestamp, id
+db.Index('ix_transaction_status_timestamp', Transaction.status, Transaction.timestamp, Transaction.id)
 
 class ChatSession(db.Model):
     __tablename__ = 'chatsession'
@@ -300,6 +594,10 @@ class ChatSession(db.Model):
     agent_id = db.Column(db.Integer, db.ForeignKey('customer.id'), nullable=True) # The agent is also a 'Customer' with is_admin=True
     start_time = db.Column(db.DateTime, default=datetime.utcnow)
     status = db.Column(db.String(20), default='active', nullable=False) # open, active, closed
+    # Denormalized summary for the agent sidebar, maintained on every message insert
+    last_message_text = db.Column(db.String(CHAT_PREVIEW_LENGTH), nullable=True)
+    last_message_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    unread_for_agents = db.Column(db.Integer, nullable=False, default=0)
     
     # Relationships
     customer = db.relationship('Customer', foreign_keys=[customer_id])
@@ -316,10 +614,656 @@ class ChatMessage(db.Model):
     
     sender = db.relationship('Customer', foreign_keys=[sender_id])
 
+# Chat history pages: WHERE session_id = ? ORDER BY timestamp DESC
+db.Index('ix_chatmessage_session_id_timestamp', ChatMessage.session_id, ChatMessage.timestamp)
+
+class TransactionArchive(db.Model):
+    """
+    One compressed segment of a customer's archived transactions. `payload` is
+    zlib-compressed JSON: one array per transaction, newest first (see ARCHIVE_FIELDS).
+    Segments hold up to ARCHIVE_SEGMENT_ROWS rows; only a customer's newest one is ever
+    partial, and the sweeper tops it up rather than starting another.
+    """
+    __tablename__ = 'transactionarchive'
+    id = db.Column(db.Integer, primary_key=True)
+    customer_id = db.Column(db.Integer, db.ForeignKey('customer.id'), nullable=False)
+    first_timestamp = db.Column(db.DateTime, nullable=False)  # oldest transaction in the segment
+    last_timestamp = db.Column(db.DateTime, nullable=False)   # newest transaction in the segment
+    row_count = db.Column(db.Integer, nullable=False)
+    payload = db.Column(db.LargeBinary, nullable=False)
+    archived_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+# Segments of one customer, newest first; also answers MAX(last_timestamp) from the index
+db.Index('ix_transactionarchive_customer_id_last_timestamp', TransactionArchive.customer_id, TransactionArchive.last_timestamp)
+
+class SpendingRollup(db.Model):
+    """Completed spending per customer, month ('YYYY-MM') and category, kept current as transactions are written."""
+    __tablename__ = 'spendingrollup'
+    id = db.Column(db.Integer, primary_key=True)
+    customer_id = db.Column(db.Integer, db.ForeignKey('customer.id'), nullable=False)
+    month = db.Column(db.String(7), nullable=False)
+    category = db.Column(db.String(50), nullable=False)
+    total = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    __table_args__ = (db.UniqueConstraint('customer_id', 'month', 'category', name='uq_spendingrollup_customer_month_category'),)
+
+class FinancialHealthScore(db.Model):
+    """Latest batch-computed health score of one customer; components are 0..1 before weighting."""
+    __tablename__ = 'financialhealthscore'
+    customer_id = db.Column(db.Integer, db.ForeignKey('customer.id'), primary_key=True)
+    score = db.Column(db.Integer, nullable=False)
+    previous_score = db.Column(db.Integer, nullable=True)  # score of the run before, for the trend
+    balance_score = db.Column(db.Float, nullable=False)
+    cash_flow_score = db.Column(db.Float, nullable=False)
+    stability_score = db.Column(db.Float, nullable=False)
+    computed_at = db.Column(db.DateTime, nullable=False)
+
+class AccountNumberSequence(db.Model):
+    """Single row: the next unreserved position for AccountNumberAllocator and its permutation key."""
+    __tablename__ = 'accountnumbersequence'
+    id = db.Column(db.Integer, primary_key=True)
+    next_position = db.Column(db.BigInteger, nullable=False, default=0)
+    key = db.Column(db.String(64), nullable=False)
+
+class PresenceRecord(db.Model):
+    """One worker's live Socket.IO connections for one user, rewritten on every presence sync."""
+    __tablename__ = 'presencerecord'
+    id = db.Column(db.Integer, primary_key=True)
+    worker_id = db.Column(db.String(100), nullable=False, index=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    is_agent = db.Column(db.Boolean, nullable=False, default=False)
+    connections = db.Column(db.Integer, nullable=False)
+    last_seen = db.Column(db.DateTime, nullable=False)
+    heartbeat_at = db.Column(db.DateTime, nullable=False, index=True)
+
+
+# --- CACHING HELPERS ---
+
+class TTLCache:
+    """A small thread/greenlet-safe LRU cache whose entries expire after `ttl` seconds.
+
+    Caches are per-process; entries are invalidated explicitly by the code that
+    writes the underlying rows, and the TTL bounds staleness across workers.
+    """
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < now:
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._data), 'maxsize': self.maxsize, 'ttl': self.ttl,
+                    'hits': self.hits, 'misses': self.misses}
+
+
+# --- IDENTITY CACHE ---
+
+identity_cache = TTLCache(maxsize=IDENTITY_CACHE_MAX_ENTRIES, ttl=IDENTITY_CACHE_TTL)
+# Socket.IO connections keep the identity they authenticated with: sid -> (customer_id, snapshot)
+socket_identities = {}
+_socket_sids_by_customer = {}
+
+
+def _customer_snapshot(customer):
+    """Copies the loaded column values of a Customer into a plain dict."""
+    return {attr.key: getattr(customer, attr.key) for attr in sa_inspect(Customer).column_attrs}
+
+
+def _customer_from_snapshot(snapshot):
+    """Re-attaches a cached Customer to the current session without issuing a SELECT."""
+    customer = Customer(**snapshot)
+    make_transient_to_detached(customer)
+    return db.session.merge(customer, load=False)
+
+
+def invalidate_identity(customer_id):
+    """Drops a customer's cached identity, including any snapshots pinned to open sockets."""
+    identity_cache.invalidate(customer_id)
+    for sid in _socket_sids_by_customer.pop(customer_id, ()):
+        socket_identities.pop(sid, None)
+
+
+def pin_socket_identity(sid, customer):
+    socket_identities[sid] = (customer.id, _customer_snapshot(customer))
+    _socket_sids_by_customer.setdefault(customer.id, set()).add(sid)
+
+
+def unpin_socket_identity(sid):
+    pinned = socket_identities.pop(sid, None)
+    if pinned:
+        sids = _socket_sids_by_customer.get(pinned[0])
+        if sids:
+            sids.discard(sid)
+            if not sids:
+                _socket_sids_by_customer.pop(pinned[0], None)
+
 
 @login_manager.user_loader
 def load_user(user_id):
-    return Customer.query.get(int(user_id))
+    user_id = int(user_id)
+
+    # Socket.IO events reuse the snapshot taken at connect time
+    sid = getattr(request, 'sid', None) if has_request_context() else None
+    pinned = socket_identities.get(sid) if sid else None
+    if pinned and pinned[0] == user_id:
+        return _customer_from_snapshot(pinned[1])
+
+    snapshot = identity_cache.get(user_id)
+    if snapshot is not None:
+        return _customer_from_snapshot(snapshot)
+
+    customer = Customer.query.get(user_id)
+    if customer:
+        identity_cache.set(user_id, _customer_snapshot(customer))
+    return customer
+
+
+# --- RECIPIENT RESOLVER ---
+
+recipient_cache = TTLCache(maxsize=RECIPIENT_CACHE_MAX_ENTRIES, ttl=RECIPIENT_CACHE_TTL)
+# What the transfer flow needs to know about an external recipient; checking_account_id is None until they have one
+Recipient = namedtuple('Recipient', 'id username masked_name checking_account_id')
+
+
+def _mask_name(username):
+    """A partial name for privacy, e.g. "John D."."""
+    username_parts = username.split()
+    masked_name = username_parts[0]
+    if len(username_parts) > 1:
+        masked_name += f" {username_parts[-1][0]}."
+    return masked_name
+
+
+def resolve_recipient(account_number):
+    """
+    Looks up a transfer recipient by account number, through a short-lived cache shared by
+    every step of the transfer flow. Returns None for unknown numbers, which aren't cached.
+    """
+    recipient = recipient_cache.get(account_number)
+    if recipient is None:
+        row = db.session.query(Customer.id, Customer.username, func.min(Account.id)).outerjoin(
+            Account, and_(Account.customer_id == Customer.id, Account.account_type == 'Checking')
+        ).filter(Customer.account_number == account_number).group_by(Customer.id).first()
+        if row is None:
+            return None
+        recipient = Recipient(row[0], row[1], _mask_name(row[1]), row[2])
+        recipient_cache.set(account_number, recipient)
+    return recipient
+
+
+def invalidate_recipient(account_number):
+    recipient_cache.invalidate(account_number)
+
+
+# --- PASSWORD HASHING ---
+
+# PBKDF2 spends tens of milliseconds in OpenSSL with the GIL released. On a bounded pool
+# of native threads, a login storm queues up for the pool instead of freezing every
+# greenlet (and with them all Socket.IO traffic) for the length of each hash.
+password_pool = ThreadPool(PASSWORD_HASH_WORKERS) if PASSWORD_HASH_WORKERS > 0 else None
+
+
+def _run_password_work(fn, *args, **kwargs):
+    if password_pool is None:
+        return fn(*args, **kwargs)
+    return password_pool.apply(fn, args, kwargs)
+
+
+def hash_password(password):
+    return _run_password_work(generate_password_hash, password, method=PASSWORD_HASH_METHOD)
+
+
+def verify_password(password_hash, password):
+    return _run_password_work(check_password_hash, password_hash, password)
+
+
+# --- PAYMENT SUBMISSION INDEX ---
+
+class SubmissionIndex:
+    """
+    In-memory index of the .txt payment submissions in a folder, newest first.
+    The folder is only rescanned (one os.scandir pass) when its mtime changes,
+    which happens whenever a file is added, renamed or removed.
+    """
+    def __init__(self, folder):
+        self.folder = folder
+        self._dir_mtime = None
+        self._names = []
+        self._mtimes = {}
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        try:
+            dir_mtime = os.stat(self.folder).st_mtime_ns
+        except FileNotFoundError:
+            self._dir_mtime, self._names, self._mtimes = None, [], {}
+            return
+        if dir_mtime == self._dir_mtime:
+            return
+        with os.scandir(self.folder) as it:
+            mtimes = {e.name: e.stat().st_mtime for e in it if e.name.endswith('.txt') and e.is_file()}
+        self._names = sorted(mtimes, key=mtimes.get, reverse=True)
+        self._mtimes = mtimes
+        self._dir_mtime = dir_mtime
+
+    def page(self, page=1, per_page=SUBMISSIONS_PAGE_SIZE):
+        """Returns (names on the page, total number of submissions)."""
+        with self._lock:
+            self._refresh()
+            start = (max(page, 1) - 1) * per_page
+            return self._names[start:start + per_page], len(self._names)
+
+    def __contains__(self, name):
+        with self._lock:
+            self._refresh()
+            return name in self._mtimes
+
+    def remove(self, name):
+        """Deletes an indexed submission; returns False if the name isn't in the index."""
+        with self._lock:
+            self._refresh()
+            if name not in self._mtimes:
+                return False
+            os.remove(os.path.join(self.folder, name))
+            del self._mtimes[name]
+            self._names.remove(name)
+            # Our own delete bumped the folder mtime; record it so it doesn't force a rescan
+            self._dir_mtime = os.stat(self.folder).st_mtime_ns
+            return True
+
+
+submission_index = SubmissionIndex(SENSITIVE_FILES_FOLDER)
+
+
+# --- NOTIFICATION FEED ---
+
+notification_cache = TTLCache(maxsize=NOTIFICATION_CACHE_MAX_ENTRIES, ttl=NOTIFICATION_CACHE_TTL)
+
+WELCOME_MESSAGE_TEXT = "Welcome to Well Care Spendables! Your new account is under a standard review for the first 21 days. During this period, certain transaction limits and feature restrictions may apply. We appreciate your patience as we ensure your account's security."
+
+
+def _build_notification_feed(customer):
+    """Queries the most recent notifications for a customer and compares them with their read watermark."""
+    # Read fresh rather than from the identity snapshot, which may predate the last mark-as-read
+    read_at = db.session.scalar(db.select(Customer.notifications_read_at).where(Customer.id == customer.id))
+
+    recent = Transaction.query.filter_by(
+        customer_id=customer.id
+    ).order_by(Transaction.timestamp.desc()).limit(NOTIFICATION_FEED_SIZE).all()
+    # The newest transaction decides: anything after the watermark is unread
+    has_unread = bool(recent) and (read_at is None or recent[0].timestamp > read_at)
+
+    # Plain dicts so the cached feed never holds on to session-bound ORM objects
+    notifications = [
+        {
+            'id': tx.id,
+            'type': tx.type,
+            'notes': tx.notes,
+            'timestamp': tx.timestamp,
+            'amount': tx.amount,
+            'account_type': tx.account_type,
+            'is_read': read_at is not None and tx.timestamp <= read_at
+        } for tx in recent
+    ]
+
+    # New users get a welcome message for their first 21 days
+    days_since_joined = (dt_module.datetime.utcnow() - customer.date_joined).days
+    if days_since_joined <= 21:
+        notifications.insert(0, {
+            'type': 'welcome_message',
+            'notes': WELCOME_MESSAGE_TEXT,
+            'timestamp': customer.date_joined
+        })
+
+    return {'has_unread': has_unread, 'notifications': notifications}
+
+
+def get_notification_feed(customer):
+    """Returns the cached notification feed for a customer, building it on a miss."""
+    feed = notification_cache.get(customer.id)
+    if feed is None:
+        feed = _build_notification_feed(customer)
+        notification_cache.set(customer.id, feed)
+    return feed
+
+
+def invalidate_notification_feed(customer_id):
+    notification_cache.invalidate(customer_id)
+
+
+@event.listens_for(SASession, 'after_flush')
+def _track_notification_writes(db_session, flush_context):
+    """Remembers which customers had Transaction rows written in this flush."""
+    touched = db_session.info.setdefault('notification_customer_ids', set())
+    for obj in list(db_session.new) + list(db_session.dirty) + list(db_session.deleted):
+        if isinstance(obj, Transaction) and obj.customer_id is not None:
+            touched.add(obj.customer_id)
+
+
+@event.listens_for(SASession, 'after_commit')
+def _invalidate_notification_feeds(db_session):
+    # Invalidate only once the write is durable so a concurrent render can't re-cache old rows
+    for customer_id in db_session.info.pop('notification_customer_ids', ()):
+        invalidate_notification_feed(customer_id)
+
+
+@event.listens_for(SASession, 'after_soft_rollback')
+def _discard_notification_writes(db_session, previous_transaction):
+    db_session.info.pop('notification_customer_ids', None)
+    db_session.info.pop('notification_pushes', None)
+
+
+def notification_delta(transaction_id, type, notes, amount, account_type, timestamp, status):
+    """Compact wire form of one notification, as the panel in spendables.js renders it."""
+    return {
+        'id': transaction_id,
+        'type': type,
+        'notes': notes,
+        'amount': f"{decimal.Decimal(amount):.2f}",
+        'account_type': account_type,
+        'timestamp': timestamp.isoformat(),
+        'status': status
+    }
+
+
+def push_notifications(deltas):
+    """Emits (customer_id, delta) pairs to each customer's private room, one event per customer."""
+    by_customer = {}
+    for customer_id, delta in deltas:
+        by_customer.setdefault(customer_id, []).append(delta)
+    for customer_id, items in by_customer.items():
+        socketio.emit('notifications', {'items': items}, to=str(customer_id))
+
+
+@event.listens_for(SASession, 'after_flush')
+def _collect_notification_pushes(db_session, flush_context):
+    """Snapshots every Transaction created, or whose status changed, in this flush for pushing after commit."""
+    pushes = db_session.info.setdefault('notification_pushes', {})
+    for obj in list(db_session.new) + list(db_session.dirty):
+        if not isinstance(obj, Transaction):
+            continue
+        if obj not in db_session.new and not sa_inspect(obj).attrs.status.history.has_changes():
+            continue
+        pushes[obj.id] = (obj.customer_id, notification_delta(
+            obj.id, obj.type, obj.notes, obj.amount, obj.account_type, obj.timestamp, obj.status
+        ))
+
+
+@event.listens_for(SASession, 'after_commit')
+def _push_notifications(db_session):
+    # Only once the rows are durable, so a client that refetches never gets ahead of the database
+    pushes = db_session.info.pop('notification_pushes', None)
+    if pushes:
+        push_notifications(pushes.values())
+
+
+# --- SPENDING ANALYTICS ---
+
+def is_spending(type, category):
+    """Whether a completed transaction of this type and category counts as spending."""
+    return type in SPENDING_TRANSACTION_TYPES and category != INTERNAL_TRANSFER_CATEGORY
+
+
+def _not_internal_transfer(category):
+    """SQL counterpart of the category half of is_spending(); a NULL category is not an internal transfer."""
+    return func.coalesce(category, '') != INTERNAL_TRANSFER_CATEGORY
+
+
+def _spending_key(customer_id, timestamp, category):
+    return (customer_id, timestamp.strftime('%Y-%m'), category or 'Uncategorized')
+
+
+def add_spending(deltas, customer_id, timestamp, category, amount):
+    """Accumulates one completed spending transaction into a {(customer, month, category): [total, count]} map."""
+    delta = deltas.setdefault(_spending_key(customer_id, timestamp, category), [decimal.Decimal('0'), 0])
+    delta[0] += decimal.Decimal(amount)
+    delta[1] += 1
+
+
+def apply_spending_deltas(connection, deltas):
+    """Adds the accumulated deltas to their rollup rows, creating rows that don't exist yet."""
+    if not deltas:
+        return
+    values = [{'customer_id': customer_id, 'month': month, 'category': category, 'total': total, 'count': count}
+              for (customer_id, month, category), (total, count) in deltas.items()]
+    dialect = connection.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert as upsert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as upsert
+        stmt = upsert(SpendingRollup)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['customer_id', 'month', 'category'],
+            set_={'total': SpendingRollup.total + stmt.excluded.total, 'count': SpendingRollup.count + stmt.excluded.count}
+        )
+        connection.execute(stmt, values)
+        return
+    for row in values:
+        updated = connection.execute(
+            update(SpendingRollup).where(
+                SpendingRollup.customer_id == row['customer_id'], SpendingRollup.month == row['month'],
+                SpendingRollup.category == row['category']
+            ).values(total=SpendingRollup.total + row['total'], count=SpendingRollup.count + row['count'])
+        ).rowcount
+        if not updated:
+            connection.execute(insert(SpendingRollup), row)
+
+
+@event.listens_for(SASession, 'after_flush')
+def _roll_up_spending(db_session, flush_context):
+    """Folds spending that became completed in this flush into the rollups, inside the same transaction."""
+    deltas = {}
+    for obj in db_session.new:
+        if isinstance(obj, Transaction) and obj.status == 'completed' and is_spending(obj.type, obj.category):
+            add_spending(deltas, obj.customer_id, obj.timestamp, obj.category, obj.amount)
+    for obj in db_session.dirty:
+        if isinstance(obj, Transaction) and obj.status == 'completed' and is_spending(obj.type, obj.category):
+            status = sa_inspect(obj).attrs.status.history
+            if status.has_changes() and 'completed' not in status.deleted:
+                add_spending(deltas, obj.customer_id, obj.timestamp, obj.category, obj.amount)
+    apply_spending_deltas(db_session.connection(), deltas)
+
+
+def _month_bucket(column):
+    if db.engine.dialect.name == 'postgresql':
+        return func.to_char(column, 'YYYY-MM')
+    return func.strftime('%Y-%m', column)
+
+
+def rebuild_spending_rollups(customer_ids):
+    """Recomputes the rollups of the given customers from their hot and archived history."""
+    deltas = {}
+    month = _month_bucket(Transaction.timestamp)
+    hot = db.session.query(
+        Transaction.customer_id, month, func.coalesce(Transaction.category, 'Uncategorized'),
+        func.sum(Transaction.amount), func.count()
+    ).filter(
+        Transaction.customer_id.in_(customer_ids), Transaction.status == 'completed',
+        Transaction.type.in_(SPENDING_TRANSACTION_TYPES), _not_internal_transfer(Transaction.category)
+    ).group_by(Transaction.customer_id, month, func.coalesce(Transaction.category, 'Uncategorized'))
+    for customer_id, month_key, category, total, count in hot:
+        deltas[(customer_id, month_key, category)] = [decimal.Decimal(str(total)), count]
+
+    segments = db.session.query(TransactionArchive.customer_id, TransactionArchive.payload).filter(
+        TransactionArchive.customer_id.in_(customer_ids)
+    ).yield_per(50)
+    for customer_id, payload in segments:
+        for t in _unpack_segment(customer_id, payload):
+            if t.status == 'completed' and is_spending(t.type, t.category):
+                add_spending(deltas, customer_id, t.timestamp, t.category, t.amount)
+
+    SpendingRollup.query.filter(SpendingRollup.customer_id.in_(customer_ids)).delete(synchronize_session=False)
+    apply_spending_deltas(db.session.connection(), deltas)
+    db.session.commit()
+    return len(deltas)
+
+
+def get_spending_by_category(customer_id, months=SPENDING_ANALYTICS_MONTHS):
+    """Spending per category over the last `months` calendar months: an index range scan over the rollups."""
+    today = datetime.utcnow()
+    month_index = today.year * 12 + today.month - months  # months back from the current one
+    first_month = f"{month_index // 12:04d}-{month_index % 12 + 1:02d}"
+    return db.session.query(SpendingRollup.category, func.sum(SpendingRollup.total)).filter(
+        SpendingRollup.customer_id == customer_id, SpendingRollup.month >= first_month
+    ).group_by(SpendingRollup.category).order_by(func.sum(SpendingRollup.total).desc()).all()
+
+
+# --- FINANCIAL HEALTH ---
+
+def _complete_months(today, months):
+    """The `months` calendar months before the current one, oldest first, as 'YYYY-MM'."""
+    first = today.year * 12 + today.month - 1 - months
+    return [f"{(first + i) // 12:04d}-{(first + i) % 12 + 1:02d}" for i in range(months)]
+
+
+def score_financial_health(balances, inflows, outflows, monthly_spending):
+    """
+    Scores a whole chunk at once. The first three arguments are float arrays indexed by customer,
+    `monthly_spending` is customers x months. Returns the 0-100 scores and the three 0..1 components.
+    """
+    # Balance: logarithmic up to the target, so the first thousand counts more than the tenth
+    balance = np.clip(np.log1p(np.maximum(balances, 0)) / np.log1p(FINANCIAL_HEALTH_TARGET_BALANCE), 0, 1)
+    # Cash flow: inflow/outflow ratio, 0.5 or less scores 0 and 2 or more scores 1; no outflow counts as 2
+    ratio = np.divide(inflows, outflows, out=np.where(inflows > 0, 2.0, 1.0), where=outflows > 0)
+    cash_flow = np.clip((ratio - 0.5) / 1.5, 0, 1)
+    # Stability: coefficient of variation of monthly spending; no spending at all is perfectly stable
+    mean = monthly_spending.mean(axis=1)
+    variation = np.divide(monthly_spending.std(axis=1), mean, out=np.zeros_like(mean), where=mean > 0)
+    stability = 1 - np.clip(variation / 1.5, 0, 1)
+    weights = np.array(FINANCIAL_HEALTH_WEIGHTS)
+    components = np.column_stack((balance, cash_flow, stability))
+    scores = np.rint(100 * components @ weights).astype(int)
+    return scores, balance, cash_flow, stability
+
+
+def compute_financial_health(customer_ids):
+    """Pulls the aggregates of one chunk of customers in three grouped queries, scores them and stores the results."""
+    now = datetime.utcnow()
+    position = {customer_id: i for i, customer_id in enumerate(customer_ids)}
+    balances = np.zeros(len(customer_ids))
+    inflows = np.zeros(len(customer_ids))
+    outflows = np.zeros(len(customer_ids))
+    months = _complete_months(now, FINANCIAL_HEALTH_MONTHS)
+    month_position = {month: j for j, month in enumerate(months)}
+    monthly_spending = np.zeros((len(customer_ids), len(months)))
+
+    for customer_id, total in db.session.query(Account.customer_id, func.sum(Account.balance)).filter(
+        Account.customer_id.in_(customer_ids)
+    ).group_by(Account.customer_id):
+        balances[position[customer_id]] = float(total or 0)
+
+    # Hot rows only: both sides of the ratio come from the same recent sample. Moves between
+    # the customer's own accounts would count on both sides, so they are left out entirely
+    flows = db.session.query(
+        Transaction.customer_id,
+        func.sum(case((Transaction.type.in_(INCOME_TRANSACTION_TYPES), Transaction.amount), else_=0)),
+        func.sum(case((Transaction.type.in_(SPENDING_TRANSACTION_TYPES), Transaction.amount), else_=0))
+    ).filter(
+        Transaction.customer_id.in_(customer_ids), Transaction.status == 'completed', _not_internal_transfer(Transaction.category),
+        Transaction.timestamp >= now - dt_module.timedelta(days=FINANCIAL_HEALTH_CASH_FLOW_DAYS)
+    ).group_by(Transaction.customer_id)
+    for customer_id, inflow, outflow in flows:
+        inflows[position[customer_id]] = float(inflow or 0)
+        outflows[position[customer_id]] = float(outflow or 0)
+
+    # The rollups cover archived history too
+    spending = db.session.query(SpendingRollup.customer_id, SpendingRollup.month, func.sum(SpendingRollup.total)).filter(
+        SpendingRollup.customer_id.in_(customer_ids), SpendingRollup.month >= months[0], SpendingRollup.month <= months[-1]
+    ).group_by(SpendingRollup.customer_id, SpendingRollup.month)
+    for customer_id, month, total in spending:
+        monthly_spending[position[customer_id], month_position[month]] = float(total or 0)
+
+    scores, balance, cash_flow, stability = score_financial_health(balances, inflows, outflows, monthly_spending)
+
+    store_financial_health(db.session.connection(), [{
+        'customer_id': customer_id,
+        'score': score,
+        'balance_score': b,
+        'cash_flow_score': c,
+        'stability_score': s,
+        'computed_at': now
+    } for customer_id, score, b, c, s in zip(customer_ids, scores.tolist(), balance.tolist(), cash_flow.tolist(), stability.tolist())])
+    db.session.commit()
+    return len(customer_ids)
+
+
+def store_financial_health(connection, rows):
+    """
+    Writes fresh scores, moving each customer's stored score to previous_score. An upsert, so
+    two requests scoring the same new customer at once both succeed instead of one hitting
+    the primary key.
+    """
+    dialect = connection.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert as upsert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as upsert
+        stmt = upsert(FinancialHealthScore)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['customer_id'],
+            set_={'previous_score': FinancialHealthScore.score, 'score': stmt.excluded.score,
+                  'balance_score': stmt.excluded.balance_score, 'cash_flow_score': stmt.excluded.cash_flow_score,
+                  'stability_score': stmt.excluded.stability_score, 'computed_at': stmt.excluded.computed_at}
+        )
+        connection.execute(stmt, rows)
+        return
+    for row in rows:
+        # previous_score first: some databases evaluate SET clauses left to right
+        updated = connection.execute(
+            update(FinancialHealthScore).where(FinancialHealthScore.customer_id == row['customer_id'])
+            .ordered_values((FinancialHealthScore.previous_score, FinancialHealthScore.score),
+                            *((getattr(FinancialHealthScore, key), value) for key, value in row.items() if key != 'customer_id'))
+        ).rowcount
+        if not updated:
+            connection.execute(insert(FinancialHealthScore), row)
+
+
+def refresh_financial_health(chunk_size=FINANCIAL_HEALTH_CHUNK_SIZE):
+    """Rescores every customer, one chunk of ids at a time."""
+    scored = 0
+    last_id = 0
+    while True:
+        customer_ids = db.session.scalars(
+            db.select(Customer.id).where(Customer.id > last_id, Customer.is_admin == False).order_by(Customer.id).limit(chunk_size)
+        ).all()
+        if not customer_ids:
+            return scored
+        scored += compute_financial_health(customer_ids)
+        last_id = customer_ids[-1]
+
 
 @app.context_processor
 def inject_global_vars():
@@ -329,46 +1273,18 @@ def inject_global_vars():
     
     if current_user.is_authenticated:
         profile_form = ProfileForm()
-        
-        # Check for any unread notifications to show the red dot
-        has_unread_notifications = db.session.query(Transaction.id).filter_by(
-            customer_id=current_user.id, 
-            is_read=False
-        ).first() is not None
-
-        # Fetch recent transactions to display in the panel
-        recent_notifications = Transaction.query.filter_by(
-            customer_id=current_user.id
-        ).order_by(Transaction.timestamp.desc()).limit(10).all()
-
-        # --- ADD THE NEW USER WELCOME MESSAGE ---
-        # Check if the user joined within the last 21 days
-        days_since_joined = (dt_module.datetime.utcnow() - current_user.date_joined).days
-        if days_since_joined <= 21:
-            # Create a fake "Transaction" object to represent the welcome message
-            # This allows us to use the same rendering logic in the template
-            welcome_message = {
-                'type': 'welcome_message',
-                'notes': "Welcome to Well Care Spendables! Your new account is under a standard review for the first 21 days. During this period, certain transaction limits and feature restrictions may apply. We appreciate your patience as we ensure your account's security.",
-                'timestamp': current_user.date_joined
-            }
-            # We convert our real transaction objects to dicts to have a common format
-            recent_notifications = [welcome_message] + [
-                {
-                    'type': tx.type, 
-                    'notes': tx.notes, 
-                    'timestamp': tx.timestamp, 
-                    'amount': tx.amount,
-                    'account_type': tx.account_type,
-                    'is_read': tx.is_read
-                } for tx in recent_notifications
-            ]
+
+        # Lazily resolved: templates that never touch the notification panel pay nothing,
+        # and the ones that do are served from the per-customer feed cache.
+        recent_notifications = LocalProxy(lambda: get_notification_feed(current_user)['notifications'])
+        has_unread_notifications = LocalProxy(lambda: get_notification_feed(current_user)['has_unread'])
 
     return {
         'current_year': dt_module.datetime.utcnow().year,
         'profile_form': profile_form,
         'recent_notifications': recent_notifications,
-        'has_unread_notifications': has_unread_notifications
+        'has_unread_notifications': has_unread_notifications,
+        'socket_client_options': SOCKET_CLIENT_OPTIONS
     }
 
 # App context and initial data setup
@@ -378,15 +1294,509 @@ def inject_global_vars():
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def prune_old_transactions(customer_id):
-    transactions_to_check = Transaction.query.filter_by(
-        customer_id=customer_id, status='completed'
-    ).order_by(Transaction.timestamp.desc()).all()
-    if len(transactions_to_check) > MAX_COMPLETED_TRANSACTIONS_TO_KEEP:
-        transactions_to_delete = transactions_to_check[MAX_COMPLETED_TRANSACTIONS_TO_KEEP:]
-        for t in transactions_to_delete:
-            db.session.delete(t)
-        db.session.commit()
+# Read-only view of one of the current user's accounts, as of the first time the request asked
+AccountSnapshot = namedtuple('AccountSnapshot', 'id account_type balance')
+
+
+def get_account_snapshot():
+    """The current user's accounts by id, loaded with one query per request and reused after that."""
+    if 'account_snapshot' not in g:
+        rows = db.session.query(Account.id, Account.account_type, Account.balance).filter(
+            Account.customer_id == current_user.id
+        ).order_by(Account.id)
+        g.account_snapshot = {row.id: AccountSnapshot(*row) for row in rows}
+    return g.account_snapshot
+
+
+def checking_account_for_credit(db_session, customer_id):
+    """
+    Returns (account id, whether it was just opened) for the customer's Checking account,
+    opening one if they have none, or (None, False) if the customer no longer exists.
+    Reads inside the caller's transaction after locking the customer row, so concurrent
+    credits to the same customer can't both open an account; account rows are left for
+    move_funds to lock in its deadlock-free order.
+    """
+    if db_session.query(Customer.id).filter(Customer.id == customer_id).with_for_update().scalar() is None:
+        return None, False
+    account_id = db_session.query(func.min(Account.id)).filter(
+        Account.customer_id == customer_id, Account.account_type == 'Checking'
+    ).scalar()
+    if account_id is not None:
+        return account_id, False
+    account = Account(account_type='Checking', balance=0, customer_id=customer_id)
+    db_session.add(account)
+    db_session.flush()
+    return account.id, True
+
+def move_funds(db_session, from_account_id, to_account_id, amount, owner_id=None, recipient_id=None):
+    """
+    Debits one account and credits another using conditional UPDATEs, so the balance
+    check and the write happen atomically in the database instead of read-then-write.
+    Returns False, leaving the caller to roll back, unless both UPDATEs matched exactly one
+    row: the debit fails on insufficient funds or, when owner_id is given, an account the
+    owner doesn't hold; the credit fails on an account that no longer exists or, when
+    recipient_id is given, one that no longer belongs to that (still existing) customer.
+    The caller owns the transaction and commits it.
+    """
+    debit = update(Account).where(Account.id == from_account_id, Account.balance >= amount)
+    if owner_id is not None:
+        debit = debit.where(Account.customer_id == owner_id)
+    debit = debit.values(balance=Account.balance - amount).execution_options(synchronize_session=False)
+    credit = update(Account).where(Account.id == to_account_id)
+    if recipient_id is not None:
+        # Checked in the same statement as the write: the caller's view of the recipient may be stale
+        credit = credit.where(Account.customer_id == recipient_id,
+                              db.select(Customer.id).where(Customer.id == recipient_id).exists())
+    credit = credit.values(balance=Account.balance + amount).execution_options(synchronize_session=False)
+
+    # Touch rows in ascending id order so opposing transfers can't deadlock on Postgres
+    first, second = (credit, debit) if to_account_id < from_account_id else (debit, credit)
+    return db_session.execute(first).rowcount == 1 and db_session.execute(second).rowcount == 1
+
+def encode_history_cursor(row):
+    """Builds an opaque cursor pointing just past the given row (anything with timestamp and id)."""
+    raw = f"{row.timestamp.isoformat()}|{row.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_history_cursor(cursor):
+    """Returns (timestamp, id) for a cursor, raising ValueError if it is malformed."""
+    try:
+        timestamp, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        timestamp, row_id = dt_module.datetime.fromisoformat(timestamp), int(row_id)
+    except (binascii.Error, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+    # Timestamps are stored naive UTC and ids are 64-bit; anything else can't have come from encode_history_cursor
+    if timestamp.tzinfo is not None or not 0 <= row_id < 2 ** 63:
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return timestamp, row_id
+
+def get_transaction_page(customer_id, before=None, limit=HISTORY_PAGE_SIZE):
+    """
+    Returns one page of a customer's transactions, newest first, plus the cursor for the
+    next page (None on the last page). Keyset pagination keeps every page an index range
+    scan, however long the history is. Pages reach into the archive tier only once the
+    history gets there; archived rows come back as ArchivedTransaction tuples.
+    """
+    query = Transaction.query.filter_by(customer_id=customer_id)
+    if before:
+        timestamp, transaction_id = before
+        query = query.filter(or_(
+            Transaction.timestamp < timestamp,
+            and_(Transaction.timestamp == timestamp, Transaction.id < transaction_id)
+        ))
+    rows = query.order_by(Transaction.timestamp.desc(), Transaction.id.desc()).limit(limit + 1).all()
+
+    newest_archived = db.session.query(func.max(TransactionArchive.last_timestamp)).filter(
+        TransactionArchive.customer_id == customer_id
+    ).scalar()
+    if newest_archived is not None and (len(rows) <= limit or rows[limit].timestamp <= newest_archived):
+        rows = list(itertools.islice(iter_transaction_history(customer_id, before), limit + 1))
+    next_cursor = encode_history_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+def _prefix_range(column, prefix):
+    """Index-friendly prefix match: column >= prefix AND column < (prefix with its last char bumped)."""
+    upper_bound = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return and_(column >= prefix, column < upper_bound)
+
+def get_customer_page(search=None, after_id=None, limit=CUSTOMER_DIRECTORY_PAGE_SIZE):
+    """
+    Returns one page of the customer directory ordered by id, plus the id to pass as
+    `after` for the next page. `search` is a case-insensitive prefix over username,
+    email and account number; each branch is a range scan on its own index.
+    """
+    query = Customer.query
+    if search:
+        search = search.strip().lower()
+    if search:
+        query = query.filter(or_(
+            _prefix_range(func.lower(Customer.username), search),
+            _prefix_range(func.lower(Customer.email), search),
+            _prefix_range(Customer.account_number, search)
+        ))
+    if after_id:
+        query = query.filter(Customer.id > after_id)
+    rows = query.order_by(Customer.id).limit(limit + 1).all()
+    next_after = rows[limit - 1].id if len(rows) > limit else None
+    return rows[:limit], next_after
+
+# Transactions read back from the archive tier quack like Transaction rows for templates and JSON
+ARCHIVE_FIELDS = ('id', 'timestamp', 'type', 'account_type', 'amount', 'notes', 'status', 'category', 'is_read')
+ArchivedTransaction = namedtuple('ArchivedTransaction', ARCHIVE_FIELDS + ('customer_id',))
+
+
+def _pack_segment(transactions):
+    rows = [[t.id, t.timestamp.isoformat(), t.type, t.account_type, str(t.amount), t.notes, t.status, t.category, t.is_read]
+            for t in transactions]
+    return zlib.compress(json.dumps(rows, separators=(',', ':')).encode())
+
+
+def _unpack_segment(customer_id, payload):
+    for row in json.loads(zlib.decompress(payload)):
+        row[1] = datetime.fromisoformat(row[1])
+        row[4] = decimal.Decimal(row[4])
+        yield ArchivedTransaction(*row, customer_id=customer_id)
+
+
+def _claim_for_archive(transaction_ids):
+    """
+    Deletes the given completed transactions and returns the rows it actually deleted, newest
+    first. The DELETE is the claim: a sweeper on another worker that picked the same rows gets
+    back only what is still there once the first commits, so no row is archived twice.
+    """
+    claimed = db.session.execute(
+        delete(Transaction).where(Transaction.id.in_(transaction_ids), Transaction.status == 'completed')
+        .returning(*(getattr(Transaction, field) for field in ARCHIVE_FIELDS))
+        .execution_options(synchronize_session=False)
+    ).all()
+    return sorted(claimed, key=lambda row: (row.timestamp, row.id), reverse=True)
+
+
+def _append_to_archive(customer_id, rows):
+    """
+    Adds newest-first rows, all newer than anything archived so far, to a customer's archive.
+    The newest segment is topped up while it holds fewer than ARCHIVE_SEGMENT_ROWS rows, so
+    frequent small sweeps don't leave a trail of tiny segments; whatever doesn't fit goes
+    into new, full segments. Older segments are never reopened, so time ranges don't overlap.
+    """
+    segment = TransactionArchive.query.filter_by(customer_id=customer_id).order_by(
+        TransactionArchive.last_timestamp.desc(), TransactionArchive.id.desc()
+    ).with_for_update().first()
+    if segment is not None and segment.row_count >= ARCHIVE_SEGMENT_ROWS:
+        segment = None
+    if segment is not None:
+        rows = list(heapq.merge(rows, _unpack_segment(customer_id, segment.payload),
+                                key=lambda row: (row.timestamp, row.id), reverse=True))
+
+    # Oldest rows first, so only the newest segment can end up partial
+    for end in range(len(rows), 0, -ARCHIVE_SEGMENT_ROWS):
+        chunk = rows[max(end - ARCHIVE_SEGMENT_ROWS, 0):end]
+        if segment is None:
+            segment = TransactionArchive(customer_id=customer_id)
+            db.session.add(segment)
+        segment.first_timestamp = chunk[-1].timestamp
+        segment.last_timestamp = chunk[0].timestamp
+        segment.row_count = len(chunk)
+        segment.payload = _pack_segment(chunk)
+        segment = None
+
+
+def archive_old_transactions(customer_ids):
+    """
+    Moves every completed transaction past each customer's newest
+    MAX_COMPLETED_TRANSACTIONS_TO_KEEP into compressed archive segments. Customers with
+    nothing to archive are found with one GROUP BY; the rest are archived at most
+    ARCHIVE_SEGMENT_ROWS rows at a time, so a long history never sits in memory at once.
+    Returns the number of transactions archived.
+    """
+    over_cap = db.session.scalars(
+        db.select(Transaction.customer_id)
+        .where(Transaction.customer_id.in_(customer_ids), Transaction.status == 'completed')
+        .group_by(Transaction.customer_id)
+        .having(func.count() > MAX_COMPLETED_TRANSACTIONS_TO_KEEP)
+    ).all()
+
+    archived = 0
+    for customer_id in over_cap:
+        completed = (Transaction.customer_id == customer_id, Transaction.status == 'completed')
+        # The oldest row still kept; everything before it has aged out
+        boundary = db.session.execute(
+            db.select(Transaction.timestamp, Transaction.id).where(*completed)
+            .order_by(Transaction.timestamp.desc(), Transaction.id.desc())
+            .offset(MAX_COMPLETED_TRANSACTIONS_TO_KEEP - 1).limit(1)
+        ).first()
+        if boundary is None:
+            continue
+        aged = or_(Transaction.timestamp < boundary.timestamp,
+                   and_(Transaction.timestamp == boundary.timestamp, Transaction.id < boundary.id))
+        while True:
+            # Oldest first, so each batch is newer than everything already archived
+            batch = db.session.scalars(
+                db.select(Transaction.id).where(*completed, aged)
+                .order_by(Transaction.timestamp, Transaction.id).limit(ARCHIVE_SEGMENT_ROWS)
+            ).all()
+            if not batch:
+                break
+            # Only rows this transaction managed to delete are packed, in the same commit
+            claimed = _claim_for_archive(batch)
+            if claimed:
+                _append_to_archive(customer_id, claimed)
+            db.session.commit()
+            archived += len(claimed)
+            if len(batch) < ARCHIVE_SEGMENT_ROWS:
+                break
+    return archived
+
+
+def sweep_old_transactions(chunk_size=TRANSACTION_ARCHIVE_CHUNK_SIZE):
+    """Archives every customer's aged history, walking customers in id order one chunk at a time."""
+    archived = 0
+    last_id = 0
+    while True:
+        customer_ids = db.session.scalars(
+            db.select(Customer.id).where(Customer.id > last_id).order_by(Customer.id).limit(chunk_size)
+        ).all()
+        if not customer_ids:
+            return archived
+        archived += archive_old_transactions(customer_ids)
+        last_id = customer_ids[-1]
+        gevent.sleep(0)  # let request greenlets run between chunks
+
+
+def iter_archived_transactions(customer_id, before=None):
+    """
+    Streams a customer's archived transactions newest first, optionally only those older
+    than a (timestamp, id) cursor. Segments are decompressed one at a time, only once the
+    stream reaches their newest row, so reading the tail of a long history stays cheap.
+    """
+    segments = db.session.query(TransactionArchive.id, TransactionArchive.last_timestamp).filter(
+        TransactionArchive.customer_id == customer_id
+    )
+    if before:
+        segments = segments.filter(TransactionArchive.first_timestamp <= before[0])
+    segments = segments.order_by(TransactionArchive.last_timestamp.desc(), TransactionArchive.id.desc()).all()
+
+    def order_key(row):
+        return (row.timestamp, row.id)
+
+    # Max-heap of each open segment's next row; heapq is a min-heap, hence the inverted key
+    heap = []
+    next_segment = 0
+    while True:
+        while next_segment < len(segments) and (not heap or segments[next_segment].last_timestamp >= heap[0][2].timestamp):
+            segment_id = segments[next_segment].id
+            payload = db.session.query(TransactionArchive.payload).filter_by(id=segment_id).scalar()
+            rows = _unpack_segment(customer_id, payload)
+            if before:
+                rows = (r for r in rows if order_key(r) < before)
+            first = next(rows, None)
+            if first is not None:
+                heapq.heappush(heap, (_descending(order_key(first)), next_segment, first, rows))
+            next_segment += 1
+        if not heap:
+            return
+        _, index, row, rows = heapq.heappop(heap)
+        yield row
+        following = next(rows, None)
+        if following is not None:
+            heapq.heappush(heap, (_descending(order_key(following)), index, following, rows))
+
+
+def _descending(key):
+    timestamp, transaction_id = key
+    return (-((timestamp - datetime.min) // dt_module.timedelta(microseconds=1)), -transaction_id)
+
+
+def iter_transaction_history(customer_id, before=None):
+    """Streams a customer's full history, hot and archived, newest first."""
+    hot = Transaction.query.filter_by(customer_id=customer_id)
+    if before:
+        timestamp, transaction_id = before
+        hot = hot.filter(or_(
+            Transaction.timestamp < timestamp,
+            and_(Transaction.timestamp == timestamp, Transaction.id < transaction_id)
+        ))
+    hot = hot.order_by(Transaction.timestamp.desc(), Transaction.id.desc()).yield_per(500)
+    return heapq.merge(hot, iter_archived_transactions(customer_id, before),
+                       key=lambda row: (row.timestamp, row.id), reverse=True)
+
+
+_transaction_sweeper = None
+
+
+def _run_transaction_sweeper():
+    while True:
+        gevent.sleep(TRANSACTION_ARCHIVE_INTERVAL)
+        with app.app_context():
+            try:
+                archived = sweep_old_transactions()
+                if archived:
+                    app.logger.info(f"Transaction sweeper archived {archived} old transaction(s).")
+            except Exception as e:
+                db.session.rollback()
+                app.logger.error(f"Transaction sweeper failed: {e}")
+
+
+@app.before_request
+def start_transaction_sweeper():
+    """Starts the archiving sweeper in whichever process ends up serving requests."""
+    global _transaction_sweeper
+    if TRANSACTION_ARCHIVE_INTERVAL > 0 and (_transaction_sweeper is None or _transaction_sweeper.dead):
+        _transaction_sweeper = gevent.spawn(_run_transaction_sweeper)
+
+# --- STATEMENT EXPORT ---
+
+STATEMENT_FIELDS = ('id', 'timestamp', 'type', 'account_type', 'amount', 'status', 'category', 'notes')
+STATEMENT_MIMETYPES = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+
+def parse_statement_range(args):
+    """Turns ?from= and ?to= (inclusive YYYY-MM-DD dates, either optional) into a [start, end) range."""
+    start = datetime.strptime(args['from'], '%Y-%m-%d') if args.get('from') else None
+    end = datetime.strptime(args['to'], '%Y-%m-%d') + dt_module.timedelta(days=1) if args.get('to') else None
+    if start and end and start >= end:
+        raise ValueError("'from' is after 'to'")
+    return start, end
+
+
+def _since(rows, start):
+    """Cuts a newest-first stream off at `start`, without reading past it."""
+    return itertools.takewhile(lambda row: row.timestamp >= start, rows) if start else rows
+
+
+def iter_customer_statement(customer_id, start=None, end=None):
+    """One customer's hot and archived transactions in [start, end), newest first."""
+    return _since(iter_transaction_history(customer_id, before=(end, 0) if end else None), start)
+
+
+def iter_bank_statement(start=None, end=None):
+    """
+    Every customer's transactions in [start, end), grouped by customer and newest first
+    within each. Hot rows come from one streamed query; archive segments are only opened
+    for customers that have one overlapping the range.
+    """
+    hot = Transaction.query
+    archived_customers = db.select(TransactionArchive.customer_id).distinct()
+    if start:
+        hot = hot.filter(Transaction.timestamp >= start)
+        archived_customers = archived_customers.where(TransactionArchive.last_timestamp >= start)
+    if end:
+        hot = hot.filter(Transaction.timestamp < end)
+        archived_customers = archived_customers.where(TransactionArchive.first_timestamp < end)
+    hot = hot.order_by(Transaction.customer_id, Transaction.timestamp.desc(), Transaction.id.desc()).yield_per(STATEMENT_CHUNK_ROWS)
+    archived_customers = db.session.scalars(archived_customers.order_by(TransactionArchive.customer_id)).all()
+    archived = (
+        row for customer_id in archived_customers
+        for row in _since(iter_archived_transactions(customer_id, before=(end, 0) if end else None), start)
+    )
+    return heapq.merge(hot, archived, key=lambda row: (row.customer_id, _descending((row.timestamp, row.id))))
+
+
+def statement_response(rows, fmt, filename, fields=STATEMENT_FIELDS):
+    """
+    Streams rows as CSV or NDJSON, STATEMENT_CHUNK_ROWS at a time, so an export of any
+    length holds one chunk in memory and starts sending before the last row is read.
+    """
+    def generate():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if fmt == 'csv':
+            writer.writerow(fields)
+        for count, row in enumerate(rows, 1):
+            values = {field: getattr(row, field) for field in fields}
+            values['timestamp'] = values['timestamp'].isoformat()
+            values['amount'] = f"{values['amount']:.2f}"
+            if fmt == 'csv':
+                writer.writerow(values.values())
+            else:
+                buffer.write(json.dumps(values) + '\n')
+            if count % STATEMENT_CHUNK_ROWS == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+
+    return Response(stream_with_context(generate()), mimetype=STATEMENT_MIMETYPES[fmt], headers={
+        'Content-Disposition': f'attachment; filename="{filename}.{fmt}"'
+    })
+
+
+def _statement_filename(prefix, start, end):
+    first = start.strftime('%Y-%m-%d') if start else 'start'
+    last = (end - dt_module.timedelta(days=1)).strftime('%Y-%m-%d') if end else datetime.utcnow().strftime('%Y-%m-%d')
+    return f"{prefix}-{first}-to-{last}"
+
+
+# --- PENDING APPROVALS ---
+
+def get_pending_page(after=None, limit=PENDING_QUEUE_PAGE_SIZE):
+    """
+    One page of the cross-customer approval queue, oldest first, with each row's username.
+    Keyset-paginated on (timestamp, id) and served by ix_transaction_status_timestamp.
+    """
+    query = db.session.query(Transaction, Customer.username).join(
+        Customer, Customer.id == Transaction.customer_id
+    ).filter(Transaction.status == 'pending')
+    if after:
+        timestamp, transaction_id = after
+        query = query.filter(or_(
+            Transaction.timestamp > timestamp,
+            and_(Transaction.timestamp == timestamp, Transaction.id > transaction_id)
+        ))
+    rows = query.order_by(Transaction.timestamp, Transaction.id).limit(limit + 1).all()
+    next_cursor = encode_history_cursor(rows[limit - 1][0]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+def approve_pending_transactions(transaction_ids):
+    """
+    Approves many pending transactions at once: one set-based status flip, one UPDATE crediting
+    every affected account with its summed amount, one commit. Ids that aren't pending are
+    skipped; returns how many were approved.
+    """
+    while True:
+        rows = db.session.query(
+            Transaction.id, Transaction.customer_id, Transaction.account_type, Transaction.amount,
+            Transaction.type, Transaction.category, Transaction.notes, Transaction.timestamp
+        ).filter(Transaction.id.in_(transaction_ids), Transaction.status == 'pending').with_for_update().all()
+        if not rows:
+            db.session.rollback()
+            return 0
+        flipped = db.session.execute(
+            update(Transaction).where(Transaction.id.in_([r.id for r in rows]), Transaction.status == 'pending')
+            .values(status='completed').execution_options(synchronize_session=False)
+        ).rowcount
+        if flipped == len(rows):
+            break
+        # Another approval committed some of these since we read them; start over without them
+        db.session.rollback()
+
+    deltas = {}
+    for r in rows:
+        key = (r.customer_id, r.account_type)
+        deltas[key] = deltas.get(key, 0) + r.amount
+
+    # Credit each customer's first account of the type, creating it if they don't have one
+    targets = {}
+    existing = db.session.query(Account.customer_id, Account.account_type, func.min(Account.id)).filter(
+        Account.customer_id.in_({customer_id for customer_id, _ in deltas})
+    ).group_by(Account.customer_id, Account.account_type)
+    for customer_id, account_type, account_id in existing:
+        if (customer_id, account_type) in deltas:
+            targets[(customer_id, account_type)] = account_id
+    new_accounts = {key: Account(customer_id=key[0], account_type=key[1], balance=0) for key in deltas if key not in targets}
+    if new_accounts:
+        db.session.add_all(new_accounts.values())
+        db.session.flush()
+        targets.update((key, account.id) for key, account in new_accounts.items())
+        # Cached recipients may still say these customers have no Checking account
+        opened_checking = {customer_id for customer_id, account_type in new_accounts if account_type == 'Checking'}
+        if opened_checking:
+            for account_number in db.session.scalars(db.select(Customer.account_number).where(Customer.id.in_(opened_checking))):
+                invalidate_recipient(account_number)
+
+    credits = {targets[key]: amount for key, amount in deltas.items()}
+    db.session.execute(
+        update(Account).where(Account.id.in_(credits.keys()))
+        .values(balance=Account.balance + case(credits, value=Account.id))
+        .execution_options(synchronize_session=False)
+    )
+    # The status flip bypasses the flush hooks, so roll up newly completed spending explicitly
+    spending = {}
+    for r in rows:
+        if is_spending(r.type, r.category):
+            add_spending(spending, r.customer_id, r.timestamp, r.category, r.amount)
+    apply_spending_deltas(db.session.connection(), spending)
+    db.session.commit()
+
+    for customer_id in {r.customer_id for r in rows}:
+        invalidate_notification_feed(customer_id)
+    push_notifications(
+        (r.customer_id, notification_delta(r.id, r.type, r.notes, r.amount, r.account_type, r.timestamp, 'completed'))
+        for r in rows
+    )
+    return len(rows)
+
 
 # --- HELPER FUNCTION ---
 def get_or_create_session(customer_id, agent_id=None):
@@ -406,6 +1816,193 @@ def get_or_create_session(customer_id, agent_id=None):
     db.session.commit()
     return session
 
+# --- PRESENCE ---
+
+class PresenceRegistry:
+    """
+    Who is connected over Socket.IO: connection counts, last-seen times and which users
+    are agents. Connects and disconnects on this worker update it directly; with a shared
+    message queue, sync() publishes this worker's connections to the presence table and
+    folds in the other workers' rows. Every lookup is a dictionary read.
+
+    Changes are collected per user and flushed as one delta per interval to the agents
+    connected to this worker, so a reconnecting browser doesn't flicker the admin UI.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = {}       # user_id -> [connections, is_agent] on this worker
+        self._remote = {}      # user_id -> [connections, is_agent] on other workers, as of the last sync
+        self._last_seen = {}   # user_id -> datetime
+        self._online_agents = set()
+        self._online_customers = set()
+        self._changed = set()
+        self._announced = set()  # users the agents were last told are online
+        self._worker = None
+        self._synced_at = None   # time.monotonic() of the last successful sync
+
+    @property
+    def worker_id(self):
+        # Resolved per call so workers forked after import still get their own id
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    def _refresh(self, user_id):
+        local = self._local.get(user_id)
+        remote = self._remote.get(user_id)
+        online = bool(local or remote)
+        is_agent = (local or remote or [0, False])[1]
+        self._online_agents.discard(user_id)
+        self._online_customers.discard(user_id)
+        if online:
+            (self._online_agents if is_agent else self._online_customers).add(user_id)
+        self._changed.add(user_id)
+
+    def connect(self, user_id, is_agent):
+        with self._lock:
+            entry = self._local.setdefault(user_id, [0, is_agent])
+            entry[0] += 1
+            entry[1] = is_agent
+            self._last_seen[user_id] = datetime.utcnow()
+            self._refresh(user_id)
+        self.ensure_running()
+
+    def disconnect(self, user_id):
+        with self._lock:
+            entry = self._local.get(user_id)
+            if entry is None:
+                return
+            entry[0] -= 1
+            if entry[0] <= 0:
+                del self._local[user_id]
+            self._last_seen[user_id] = datetime.utcnow()
+            self._refresh(user_id)
+
+    def is_online(self, user_id):
+        return user_id in self._online_customers or user_id in self._online_agents
+
+    def last_seen(self, user_id):
+        return self._last_seen.get(user_id)
+
+    def connections(self, user_id):
+        return sum(entry[0] for entry in (self._local.get(user_id), self._remote.get(user_id)) if entry)
+
+    @property
+    def agents_online(self):
+        return len(self._online_agents)
+
+    @property
+    def customers_online(self):
+        return len(self._online_customers)
+
+    def online_customer_ids(self):
+        with self._lock:
+            return list(self._online_customers)
+
+    def flush(self):
+        """Returns the net change since the last flush, or None if nothing visible changed."""
+        with self._lock:
+            changed, self._changed = self._changed, set()
+            online = [uid for uid in changed if self.is_online(uid) and uid not in self._announced]
+            offline = [uid for uid in changed if not self.is_online(uid) and uid in self._announced]
+            self._announced.update(online)
+            self._announced.difference_update(offline)
+            if not online and not offline:
+                return None
+            return {
+                'online': online,
+                'offline': offline,
+                'agents_online': self.agents_online,
+                'customers_online': self.customers_online
+            }
+
+    def sync(self):
+        """Reconciles with the other workers through the presence table."""
+        worker_id = self.worker_id
+        now = datetime.utcnow()
+        stale_before = now - dt_module.timedelta(seconds=PRESENCE_SYNC_INTERVAL * 3)
+        with self._lock:
+            rows = [{'worker_id': worker_id, 'user_id': uid, 'connections': count, 'is_agent': is_agent,
+                     'last_seen': self._last_seen.get(uid, now), 'heartbeat_at': now}
+                    for uid, (count, is_agent) in self._local.items()]
+
+        with app.app_context():
+            try:
+                # Rows older than three sync intervals belong to workers that have gone away
+                PresenceRecord.query.filter(or_(PresenceRecord.worker_id == worker_id,
+                                                PresenceRecord.heartbeat_at < stale_before)).delete(synchronize_session=False)
+                if rows:
+                    db.session.execute(insert(PresenceRecord), rows)
+                db.session.commit()
+                others = db.session.query(
+                    PresenceRecord.user_id, PresenceRecord.connections, PresenceRecord.is_agent, PresenceRecord.last_seen
+                ).filter(PresenceRecord.worker_id != worker_id).all()
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+
+        remote = {}
+        last_seen = {}
+        for user_id, count, is_agent, seen in others:
+            entry = remote.setdefault(user_id, [0, is_agent])
+            entry[0] += count
+            last_seen[user_id] = max(seen, last_seen.get(user_id, seen))
+        with self._lock:
+            previous, self._remote = self._remote, remote
+            for user_id, seen in last_seen.items():
+                if user_id not in self._last_seen or seen > self._last_seen[user_id]:
+                    self._last_seen[user_id] = seen
+            for user_id in previous.keys() | remote.keys():
+                # Someone who left another worker was last seen no later than now
+                if user_id in previous and user_id not in remote and user_id not in self._local:
+                    self._last_seen[user_id] = now
+                self._refresh(user_id)
+            self._synced_at = time.monotonic()
+
+    def ensure_running(self):
+        if self._worker is None or self._worker.dead:
+            self._worker = gevent.spawn(self._run)
+
+    def ensure_fresh(self):
+        """
+        Syncs inline if the last sync is more than two intervals old, e.g. on a worker that
+        has only just started, so a page rendered from it doesn't show an empty room.
+        """
+        if not SOCKETIO_MESSAGE_QUEUE:
+            return
+        if self._synced_at is None or time.monotonic() - self._synced_at > PRESENCE_SYNC_INTERVAL * 2:
+            try:
+                self.sync()
+            except Exception as e:
+                app.logger.error(f"Presence sync failed: {e}")
+
+    def _run(self):
+        next_sync = time.monotonic()
+        while True:
+            gevent.sleep(PRESENCE_FLUSH_INTERVAL)
+            if SOCKETIO_MESSAGE_QUEUE and time.monotonic() >= next_sync:
+                next_sync = time.monotonic() + PRESENCE_SYNC_INTERVAL
+                try:
+                    self.sync()
+                except Exception as e:
+                    app.logger.error(f"Presence sync failed: {e}")
+            delta = self.flush()
+            if delta:
+                # Every worker computes the same merged view, so each only tells its own agents
+                socketio.emit('presence_update', delta, to='admins', ignore_queue=True)
+
+
+presence = PresenceRegistry()
+
+
+@app.before_request
+def start_presence_sync():
+    """
+    Starts the presence loop in every process that serves requests, not just those holding
+    sockets: a worker that only renders the admin pages still needs the other workers' view.
+    """
+    presence.ensure_running()
+
+
 # --- REBUILT SOCKET.IO EVENT HANDLERS ---
 
 def get_or_create_chat_session(customer_id, agent_id=None):
@@ -424,6 +2021,132 @@ def get_or_create_chat_session(customer_id, agent_id=None):
         db.session.commit()
     return session
 
+def get_chat_history_page(session_id, before=None, limit=CHAT_HISTORY_PAGE_SIZE):
+    """
+    Returns one page of a chat session's messages, newest first, with the sender's role
+    resolved in the same query, plus the cursor for the next (older) page or None.
+    """
+    query = db.session.query(
+        ChatMessage.id, ChatMessage.message_text, ChatMessage.timestamp,
+        Customer.is_admin.label('sender_is_admin')
+    ).join(Customer, ChatMessage.sender_id == Customer.id).filter(ChatMessage.session_id == session_id)
+    if before:
+        timestamp, message_id = before
+        query = query.filter(or_(
+            ChatMessage.timestamp < timestamp,
+            and_(ChatMessage.timestamp == timestamp, ChatMessage.id < message_id)
+        ))
+    rows = query.order_by(ChatMessage.timestamp.desc(), ChatMessage.id.desc()).limit(limit + 1).all()
+    next_cursor = encode_history_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+# --- CHAT GROUP COMMIT ---
+
+class ChatGroupCommitter:
+    """
+    Collects chat message rows from many greenlets and commits them together.
+    A background greenlet drains the queue every `max_delay` seconds or `max_batch`
+    rows, whichever comes first; submit() blocks the caller until its row is durable.
+    """
+    def __init__(self, commit_rows, max_batch=CHAT_GROUP_COMMIT_MAX_BATCH, max_delay=CHAT_GROUP_COMMIT_MAX_DELAY):
+        self.commit_rows = commit_rows
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue = Queue()
+        self._worker = None
+
+    def submit(self, row):
+        if self._worker is None or self._worker.dead:
+            self._worker = gevent.spawn(self._run)
+        result = AsyncResult()
+        self._queue.put((row, result))
+        return result.get()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except Empty:
+                    break
+            try:
+                self.commit_rows([row for row, _ in batch])
+            except Exception as e:
+                for _, result in batch:
+                    result.set_exception(e)
+            else:
+                for row, result in batch:
+                    result.set(row)
+
+
+def update_chat_summaries(db_session, rows):
+    """
+    Folds newly inserted message rows into their sessions' sidebar summary: latest preview,
+    last activity time and the count of customer messages since an agent last replied.
+    Rows carry a `from_agent` flag alongside the ChatMessage columns.
+    """
+    summaries = {}
+    for row in rows:
+        summary = summaries.setdefault(row['session_id'], {'unread': 0, 'reset': False})
+        summary['text'] = row['message_text'][:CHAT_PREVIEW_LENGTH]
+        summary['at'] = row['timestamp']
+        if row['from_agent']:
+            summary['unread'], summary['reset'] = 0, True
+        else:
+            summary['unread'] += 1
+
+    for session_id, summary in summaries.items():
+        unread = summary['unread'] if summary['reset'] else ChatSession.unread_for_agents + summary['unread']
+        db_session.execute(
+            update(ChatSession).where(ChatSession.id == session_id).values(
+                last_message_text=summary['text'],
+                last_message_at=summary['at'],
+                unread_for_agents=unread
+            ).execution_options(synchronize_session=False)
+        )
+
+
+def _insert_chat_rows(db_session, rows):
+    db_session.execute(insert(ChatMessage), [{k: v for k, v in row.items() if k != 'from_agent'} for row in rows])
+    update_chat_summaries(db_session, rows)
+
+
+def _commit_chat_rows(rows):
+    with app.app_context():
+        try:
+            _insert_chat_rows(db.session, rows)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+
+chat_committer = ChatGroupCommitter(_commit_chat_rows)
+
+
+def save_chat_message(session_id, sender_id, message_text, from_agent=False):
+    """
+    Persists a chat message and returns its timestamp once it is durable, either with
+    its own commit or, when CHAT_GROUP_COMMIT is on, as part of a group commit.
+    """
+    row = {'session_id': session_id, 'sender_id': sender_id, 'message_text': message_text,
+           'timestamp': datetime.utcnow(), 'from_agent': from_agent}
+    if CHAT_GROUP_COMMIT:
+        # End this request's transaction first: a parked handler must not hold a pooled
+        # connection, or a burst larger than the pool starves the committer itself.
+        db.session.commit()
+        return chat_committer.submit(row)['timestamp']
+
+    _insert_chat_rows(db.session, [row])
+    db.session.commit()
+    return row['timestamp']
+
+
 @socketio.on('connect')
 @login_required
 def handle_connect():
@@ -431,6 +2154,8 @@ def handle_connect():
     join_room(str(current_user.id))
     if current_user.is_admin:
         join_room('admins')
+    pin_socket_identity(request.sid, current_user)
+    presence.connect(current_user.id, current_user.is_admin)
     print(f"SocketIO Client connected: {current_user.username} in rooms {list(socketio.server.rooms(request.sid))}")
 
 @socketio.on('disconnect')
@@ -438,6 +2163,8 @@ def handle_connect():
 def handle_disconnect():
     """Handles socket disconnections."""
     print(f"SocketIO Client disconnected: {current_user.username}")
+    presence.disconnect(current_user.id)
+    unpin_socket_identity(request.sid)
 
 @socketio.on('send_message')
 @login_required
@@ -447,20 +2174,23 @@ def handle_send_message(data):
     if not message_text or len(message_text) > 2000:
         return
 
-    session = get_or_create_chat_session(customer_id=current_user.id)
-    new_message = ChatMessage(session_id=session.id, sender_id=current_user.id, message_text=message_text)
-    db.session.add(new_message)
-    db.session.commit()
+    # Read the identity up front; the commits below expire current_user
+    customer_id = current_user.id
+    customer_name = current_user.username
+
+    session = get_or_create_chat_session(customer_id=customer_id)
+    session_id = session.id
+    timestamp = save_chat_message(session_id, customer_id, message_text)
     
-    # Notify all online agents in the 'admins' room.
+    # Notify all online agents in the 'admins' room, only once the message is committed.
     emit('receive_message', {
-        'message': new_message.message_text,
+        'message': message_text,
         'sender_type': 'user',
-        'session_id': session.id,
-        'timestamp': new_message.timestamp.strftime('%I:%M %p'),
+        'session_id': session_id,
+        'timestamp': timestamp.strftime('%I:%M %p'),
         # Add customer info so the admin UI can create a new conversation item if needed
-        'customer_id': current_user.id,
-        'customer_name': current_user.username
+        'customer_id': customer_id,
+        'customer_name': customer_name
     }, to='admins')
 
 @socketio.on('agent_send_message')
@@ -475,28 +2205,29 @@ def handle_agent_send_message(data):
     if not customer_id or not message_text or len(message_text) > 2000:
         return
 
-    session = get_or_create_chat_session(customer_id=customer_id, agent_id=current_user.id)
-    new_message = ChatMessage(session_id=session.id, sender_id=current_user.id, message_text=message_text)
-    db.session.add(new_message)
-    db.session.commit()
+    agent_id = current_user.id
+    session = get_or_create_chat_session(customer_id=customer_id, agent_id=agent_id)
+    session_id = session.id
+    timestamp = save_chat_message(session_id, agent_id, message_text, from_agent=True)
 
     # Emit the message directly to the customer's private room.
     room = str(customer_id)
     message_payload = {
-        'message': new_message.message_text,
+        'message': message_text,
         'sender_type': 'agent',
-        'session_id': session.id,
-        'timestamp': new_message.timestamp.strftime('%I:%M %p')
+        'session_id': session_id,
+        'timestamp': timestamp.strftime('%I:%M %p')
     }
     emit('receive_message', message_payload, to=room)
-    print(f"Admin {current_user.id} sending message to customer {customer_id} in room {room}: {message_payload}")
+    print(f"Admin {agent_id} sending message to customer {customer_id} in room {room}: {message_payload}")
 
 @socketio.on('request_history')
 @login_required
 def handle_request_history(data={}):
     """
     Handles a request for chat history from either a customer or an agent.
-    Agents must provide a session_id; customers do not.
+    Agents must provide a session_id; customers do not. Returns the latest page
+    of messages; pass the previous page's next_cursor as `before` to load older ones.
     """
     session = None
     if current_user.is_admin:
@@ -509,15 +2240,32 @@ def handle_request_history(data={}):
     if not session:
         return
 
-    messages = ChatMessage.query.filter_by(session_id=session.id).order_by(ChatMessage.timestamp.asc()).all()
+    before = None
+    if data.get('before'):
+        try:
+            before = decode_history_cursor(data['before'])
+        except ValueError:
+            return
+
+    messages, next_cursor = get_chat_history_page(session.id, before=before)
+
+    # An agent opening the conversation has now seen everything in it
+    if current_user.is_admin and before is None and session.unread_for_agents:
+        session.unread_for_agents = 0
+        db.session.commit()
     history = [{
         'message_text': msg.message_text,
-        'sender_type': 'agent' if msg.sender.is_admin else 'user',
+        'sender_type': 'agent' if msg.sender_is_admin else 'user',
         'timestamp': msg.timestamp.strftime('%I:%M %p')
-    } for msg in messages]
+    } for msg in reversed(messages)]
 
     # Send history only to the specific client that requested it.
-    emit('chat_history', {'history': history}, to=request.sid)
+    emit('chat_history', {
+        'session_id': session.id,
+        'history': history,
+        'next_cursor': next_cursor,
+        'older': before is not None
+    }, to=request.sid)
 
 # --- CORE BANKING ROUTES ---
 
@@ -540,7 +2288,7 @@ def terms_of_service():
 def signup():
     form = SignupForm()
     if form.validate_on_submit():
-        hashed_password = generate_password_hash(form.password.data, method='pbkdf2:sha256')
+        hashed_password = hash_password(form.password.data)
         new_customer = Customer(username=form.username.data, password_hash=hashed_password)
         db.session.add(new_customer)
         # Create default accounts for the new customer
@@ -558,7 +2306,7 @@ def login():
     form = LoginForm()
     if form.validate_on_submit():
         customer = Customer.query.filter_by(username=form.username.data).first()
-        if customer and check_password_hash(customer.password_hash, form.password.data):
+        if customer and verify_password(customer.password_hash, form.password.data):
 
             login_user(customer)
             # On successful login, redirect to the dashboard. The 'next' page logic can be added later if needed.
@@ -585,8 +2333,8 @@ def dashboard():
     # Calculate total balance. Summing Numeric types returns a Decimal, which is perfect.
     total_balance = db.session.query(func.sum(Account.balance)).filter_by(customer_id=current_user.id).scalar() or 0.0
 
-    # Get the 10 most recent transactions for the user
-    recent_transactions = Transaction.query.filter_by(customer_id=current_user.id).order_by(Transaction.timestamp.desc()).limit(10).all()
+    # Get the first page of the user's transaction history; older pages load via /api/transactions
+    recent_transactions, history_cursor = get_transaction_page(current_user.id)
     
     # Prepare data for the template
     accounts_for_template = [
@@ -604,6 +2352,7 @@ def dashboard():
                            accounts=accounts_for_template,
                            total_balance=total_balance,
                            recent_transactions=recent_transactions,
+                           history_cursor=history_cursor,
                            is_deactivated=not current_user._is_active)
 
 
@@ -614,7 +2363,7 @@ def verify_recipient():
     if not account_number or len(account_number) != 10:
         return jsonify({'error': 'Invalid account number format.'}), 400
     
-    recipient = Customer.query.filter_by(account_number=account_number).first()
+    recipient = resolve_recipient(account_number)
 
     if not recipient:
         return jsonify({'error': 'Account not found.'}), 404
@@ -623,12 +2372,7 @@ def verify_recipient():
         return jsonify({'error': 'You cannot send funds to yourself.'}), 400
 
     # Return a partial name for privacy, e.g., "John D."
-    username_parts = recipient.username.split()
-    masked_name = username_parts[0]
-    if len(username_parts) > 1:
-        masked_name += f" {username_parts[-1][0]}."
-
-    return jsonify({'recipient_name': masked_name})
+    return jsonify({'recipient_name': recipient.masked_name})
 
 
 @app.route('/transfer/confirm', methods=['GET', 'POST'])
@@ -641,44 +2385,69 @@ def transfer_confirm():
 
     if request.method == 'POST':
         # --- EXECUTE THE TRANSFER ---
-        from_account = Account.query.get(transfer_details['from_account_id'])
-        amount = decimal.Decimal(transfer_details['amount'])
-
-        # Final check for sufficient funds to prevent race conditions
-        if decimal.Decimal(from_account.balance) < amount:
-            flash('Insufficient funds. The transfer could not be completed.', 'error')
+        accounts = get_account_snapshot()
+        from_account = accounts.get(transfer_details['from_account_id'])
+        if not from_account or (transfer_details['type'] == 'internal' and transfer_details['to_account_id'] not in accounts):
             session.pop('transfer_details', None)
+            flash('That account is no longer available. Please start again.', 'error')
             return redirect(url_for('transfer'))
-        
-        from_account.balance -= amount
+        amount = decimal.Decimal(transfer_details['amount'])
 
         # Log the "send" transaction for the current user
         send_notes = f"Memo: {transfer_details['memo'] if transfer_details['memo'] else 'None'}"
 
         if transfer_details['type'] == 'internal':
-            to_account = Account.query.get(transfer_details['to_account_id'])
-            to_account.balance += amount
+            to_account = accounts[transfer_details['to_account_id']]
+            to_account_id, to_account_type = to_account.id, to_account.account_type
             send_notes = f"To {to_account.account_type}. " + send_notes
-            # Log the "receive" transaction for the current user
-            receive_txn = Transaction(type='receive', account_type=to_account.account_type, amount=amount, notes=f"From {from_account.account_type}.", owner=current_user)
-            db.session.add(receive_txn)
+            receive_customer_id, receive_notes = current_user.id, f"From {from_account.account_type}."
         else: # External transfer
-            recipient = Customer.query.get(transfer_details['recipient_id'])
+            account_number = transfer_details['recipient_account_number']
+            recipient = resolve_recipient(account_number)
+            if not recipient or recipient.id != transfer_details['recipient_id']:
+                session.pop('transfer_details', None)
+                flash('The recipient account is no longer available. Please start again.', 'error')
+                return redirect(url_for('transfer'))
             # For simplicity, we deposit into the recipient's Checking account.
             # A real bank would have more complex logic here.
-            recipient_checking = Account.query.filter_by(owner=recipient, account_type='Checking').first()
-            if not recipient_checking:
-                # If they don't have one, create it.
-                recipient_checking = Account(account_type='Checking', balance=0, owner=recipient)
-                db.session.add(recipient_checking)
-
-            recipient_checking.balance += amount
-            send_notes = f"To {recipient.username} ({recipient.account_number[-4:]}). " + send_notes
-            # Log the "receive" transaction for the recipient
-            receive_txn = Transaction(type='receive', account_type=recipient_checking.account_type, amount=amount, notes=f"From {current_user.username}.", owner=recipient)
-            db.session.add(receive_txn)
-
-        send_txn = Transaction(type='send', account_type=from_account.account_type, amount=amount, notes=send_notes, owner=current_user)
+            # The cached recipient may predate an account opened elsewhere, so the account is looked up fresh.
+            (to_account_id, opened), to_account_type = checking_account_for_credit(db.session, recipient.id), 'Checking'
+            if to_account_id is None:
+                db.session.rollback()
+                session.pop('transfer_details', None)
+                invalidate_recipient(account_number)
+                flash('The recipient account is no longer available. Please start again.', 'error')
+                return redirect(url_for('transfer'))
+            if opened or to_account_id != recipient.checking_account_id:
+                invalidate_recipient(account_number)
+
+            send_notes = f"To {recipient.username} ({account_number[-4:]}). " + send_notes
+            receive_customer_id, receive_notes = recipient.id, f"From {current_user.username}."
+
+        # The funds check is part of the debit itself, so concurrent transfers can't overdraw;
+        # the credit re-checks the recipient, which may have come from another worker's stale cache
+        recipient_id = receive_customer_id if transfer_details['type'] == 'external' else None
+        if not move_funds(db.session, from_account.id, to_account_id, amount, owner_id=current_user.id, recipient_id=recipient_id):
+            db.session.rollback()
+            session.pop('transfer_details', None)
+            available = db.session.scalar(db.select(Account.balance).where(
+                Account.id == from_account.id, Account.customer_id == current_user.id))
+            if available is None or available < amount:
+                flash('Insufficient funds. The transfer could not be completed.', 'error')
+            elif recipient_id is not None:
+                # The debit would have gone through, so it was the credit side that is gone
+                invalidate_recipient(account_number)
+                flash('The recipient account is no longer available. Please start again.', 'error')
+            else:
+                flash('That account is no longer available. Please start again.', 'error')
+            return redirect(url_for('transfer'))
+
+        # Log the "receive" transaction for the recipient and the "send" one for the current user
+        # Both legs of a move between the user's own accounts are tagged, so spending and cash flow can leave them out
+        category = INTERNAL_TRANSFER_CATEGORY if transfer_details['type'] == 'internal' else 'Uncategorized'
+        receive_txn = Transaction(type='receive', account_type=to_account_type, amount=amount, notes=receive_notes, customer_id=receive_customer_id, category=category)
+        db.session.add(receive_txn)
+        send_txn = Transaction(type='send', account_type=from_account.account_type, amount=amount, notes=send_notes, owner=current_user, category=category)
         db.session.add(send_txn)
         
         db.session.commit()
@@ -713,7 +2482,7 @@ def transfer():
                 flash('Recipient account number is required for external transfers.', 'error')
                 is_valid = False
             else:
-                recipient = Customer.query.filter_by(account_number=recipient_num).first()
+                recipient = resolve_recipient(recipient_num)
                 if not recipient:
                     flash('Recipient account number not found.', 'error')
                     is_valid = False
@@ -732,24 +2501,171 @@ def transfer():
             'amount': str(form.amount.data), # Store as string for precision
             'memo': form.memo.data
         }
-        from_account = Account.query.get(form.from_account.data)
+        accounts = get_account_snapshot()
+        from_account = accounts[form.from_account.data]
         transfer_details['from_account_name'] = from_account.account_type.title()
 
         if form.transfer_type.data == 'internal':
-            to_account = Account.query.get(form.to_account_internal.data)
+            to_account = accounts[form.to_account_internal.data]
             transfer_details['to_account_id'] = to_account.id
             transfer_details['to_account_name'] = to_account.account_type.title()
         else: # External
-            recipient = Customer.query.filter_by(account_number=form.recipient_account_number.data).first()
+            recipient = resolve_recipient(form.recipient_account_number.data)
             transfer_details['recipient_id'] = recipient.id
             transfer_details['recipient_name'] = recipient.username
-            transfer_details['recipient_account_number'] = recipient.account_number
+            transfer_details['recipient_account_number'] = form.recipient_account_number.data
 
         session['transfer_details'] = transfer_details
         return redirect(url_for('transfer_confirm'))
 
     return render_template('banking/transfer.html', form=form)
 
+@app.route('/api/transfers/batch', methods=['POST'])
+@login_required
+def batch_transfer():
+    """
+    Executes many external transfers in a single database transaction.
+    Expects {"transfers": [{"from_account_id", "recipient_account_number", "amount", "memo"}, ...]}
+    and returns a result per item; items that fail validation or funds checks are skipped.
+    """
+    payload = request.get_json(silent=True) or {}
+    items = payload.get('transfers')
+    if not isinstance(items, list) or not items:
+        return jsonify({'error': 'Request must include a non-empty "transfers" list.'}), 400
+    if len(items) > MAX_BATCH_TRANSFERS:
+        return jsonify({'error': f'A batch may contain at most {MAX_BATCH_TRANSFERS} transfers.'}), 400
+
+    results = [None] * len(items)
+    sender_id = current_user.id
+    sender_name = current_user.username
+    own_account_types = {a.id: a.account_type for a in get_account_snapshot().values()}
+
+    # --- VALIDATE ITEMS ---
+    parsed = []
+    for index, item in enumerate(items):
+        item = item if isinstance(item, dict) else {}
+        account_number = str(item.get('recipient_account_number') or '')
+        try:
+            amount = decimal.Decimal(str(item.get('amount'))).quantize(decimal.Decimal('0.01'))
+        except (decimal.InvalidOperation, ValueError):
+            amount = None
+        from_account_id = item.get('from_account_id')
+        memo = item.get('memo')
+        # bool is an int subclass, so true/false would otherwise pass as account ids 1 and 0
+        if isinstance(from_account_id, bool) or not isinstance(from_account_id, int) or from_account_id not in own_account_types:
+            results[index] = {'index': index, 'status': 'failed', 'error': 'Invalid source account.'}
+        elif len(account_number) != 10:
+            results[index] = {'index': index, 'status': 'failed', 'error': 'Invalid account number format.'}
+        elif amount is None or not amount.is_finite() or amount <= 0:
+            results[index] = {'index': index, 'status': 'failed', 'error': 'Transfer amount must be positive.'}
+        elif memo is not None and not isinstance(memo, str):
+            results[index] = {'index': index, 'status': 'failed', 'error': 'Memo must be text.'}
+        else:
+            parsed.append((index, from_account_id, account_number, amount, (memo or '')[:100]))
+
+    # --- RESOLVE ALL RECIPIENTS IN ONE QUERY ---
+    recipient_numbers = {p[2] for p in parsed}
+    recipients = {}
+    if recipient_numbers:
+        rows = db.session.query(Customer.id, Customer.username, Customer.account_number, func.min(Account.id)).outerjoin(
+            Account, and_(Account.customer_id == Customer.id, Account.account_type == 'Checking')
+        ).filter(Customer.account_number.in_(recipient_numbers)).group_by(Customer.id).all()
+        recipients = {row[2]: row for row in rows}
+
+    # Lock every source account in id order and read fresh balances
+    balances = dict(db.session.query(Account.id, Account.balance).filter(
+        Account.id.in_({p[1] for p in parsed})
+    ).order_by(Account.id).with_for_update().all()) if parsed else {}
+
+    # --- AGGREGATE PER SOURCE ACCOUNT ---
+    accepted = {}
+    for index, from_account_id, account_number, amount, memo in parsed:
+        recipient = recipients.get(account_number)
+        if not recipient:
+            results[index] = {'index': index, 'status': 'failed', 'error': 'Recipient account number not found.'}
+        elif recipient[0] == sender_id:
+            results[index] = {'index': index, 'status': 'failed', 'error': 'You cannot send funds to yourself.'}
+        elif decimal.Decimal(balances[from_account_id]) < amount:
+            results[index] = {'index': index, 'status': 'failed', 'error': 'Insufficient funds.'}
+        else:
+            balances[from_account_id] = decimal.Decimal(balances[from_account_id]) - amount
+            accepted.setdefault(from_account_id, []).append((index, recipient, amount, memo))
+
+    # One conditional debit per source account; a source whose balance moved underneath us fails as a whole
+    for from_account_id in sorted(accepted):
+        total = sum(entry[2] for entry in accepted[from_account_id])
+        debited = db.session.execute(
+            update(Account).where(Account.id == from_account_id, Account.balance >= total)
+            .values(balance=Account.balance - total).execution_options(synchronize_session=False)
+        ).rowcount == 1
+        if not debited:
+            for entry in accepted.pop(from_account_id):
+                results[entry[0]] = {'index': entry[0], 'status': 'failed', 'error': 'Insufficient funds.'}
+
+    # Recipients without a Checking account get one, as in the single-transfer flow, but only
+    # once a transfer to them is certain to go through
+    missing = {entry[1][2]: entry[1] for entries in accepted.values() for entry in entries if entry[1][3] is None}
+    if missing:
+        new_accounts = {number: Account(account_type='Checking', balance=0, customer_id=row[0]) for number, row in missing.items()}
+        db.session.add_all(new_accounts.values())
+        db.session.flush()
+        # Cached recipients still say these customers have no Checking account
+        for number in new_accounts:
+            invalidate_recipient(number)
+        for entries in accepted.values():
+            for i, (index, recipient, amount, memo) in enumerate(entries):
+                if recipient[2] in new_accounts:
+                    entries[i] = (index, recipient[:3] + (new_accounts[recipient[2]].id,), amount, memo)
+
+    # --- APPLY CREDITS AND LOG TRANSACTIONS ---
+    credits = {}
+    transaction_rows = []
+    now = dt_module.datetime.utcnow()
+    for from_account_id, entries in accepted.items():
+        for index, (recipient_id, recipient_name, account_number, checking_id), amount, memo in entries:
+            credits[checking_id] = credits.get(checking_id, 0) + amount
+            transaction_rows.append({
+                'type': 'send', 'account_type': own_account_types[from_account_id], 'amount': amount,
+                'notes': f"To {recipient_name} ({account_number[-4:]}). Memo: {memo if memo else 'None'}",
+                'customer_id': sender_id, 'timestamp': now
+            })
+            transaction_rows.append({
+                'type': 'receive', 'account_type': 'Checking', 'amount': amount,
+                'notes': f"From {sender_name}.", 'customer_id': recipient_id, 'timestamp': now
+            })
+            results[index] = {'index': index, 'status': 'completed', 'recipient_account_number': account_number, 'amount': str(amount)}
+
+    if credits:
+        credited = db.session.execute(
+            update(Account).where(Account.id.in_(credits.keys()))
+            .values(balance=Account.balance + case(credits, value=Account.id))
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if credited != len(credits):
+            # A recipient account disappeared since it was looked up; the debits must not stand alone
+            db.session.rollback()
+            return jsonify({'error': 'A recipient account changed during the transfer. Nothing was sent; please retry.'}), 409
+        db.session.execute(insert(Transaction), transaction_rows)
+        # Core inserts bypass the flush hooks, so roll the new spending up explicitly
+        spending = {}
+        for row in transaction_rows:
+            if is_spending(row['type'], None):
+                add_spending(spending, row['customer_id'], row['timestamp'], None, row['amount'])
+        apply_spending_deltas(db.session.connection(), spending)
+    db.session.commit()
+
+    # Core inserts bypass the flush hooks, so refresh the affected notification feeds explicitly
+    for customer_id in {row['customer_id'] for row in transaction_rows}:
+        invalidate_notification_feed(customer_id)
+    # Recipients get their credit live; the sender has this response
+    push_notifications(
+        (row['customer_id'], notification_delta(None, row['type'], row['notes'], row['amount'], row['account_type'], row['timestamp'], 'completed'))
+        for row in transaction_rows if row['type'] == 'receive'
+    )
+
+    completed = sum(1 for r in results if r['status'] == 'completed')
+    return jsonify({'completed': completed, 'failed': len(results) - completed, 'results': results})
+
 @app.route('/update_profile', methods=['POST'])
 @login_required
 def update_profile():
@@ -768,6 +2684,8 @@ def update_profile():
         current_user.zip_code = form.zip_code.data
         
         db.session.commit()
+        invalidate_identity(current_user.id)
+        invalidate_recipient(current_user.account_number)
         flash('Your profile has been updated successfully.', 'success')
     else:
         for field, errors in form.errors.items():
@@ -780,13 +2698,13 @@ def update_profile():
 @login_required
 def mark_notifications_as_read():
     try:
-        # Mark all unread transactions/notifications for the user as read
-        Transaction.query.filter_by(
-            customer_id=current_user.id, 
-            is_read=False
-        ).update({'is_read': True})
-        
+        # One row: move the customer's watermark instead of flagging every transaction
+        db.session.execute(
+            update(Customer).where(Customer.id == current_user.id).values(notifications_read_at=datetime.utcnow())
+        )
         db.session.commit()
+        # Bulk updates bypass the flush hooks, so drop the cached feed explicitly
+        invalidate_notification_feed(current_user.id)
         return jsonify({'success': True, 'message': 'Notifications marked as read.'})
     except Exception as e:
         db.session.rollback()
@@ -797,17 +2715,88 @@ def mark_notifications_as_read():
 @app.route('/api/spending-analytics')
 @login_required
 def spending_analytics():
-    # Per user request, this feature is disabled for all users for now.
-    # Always return empty data.
+    """Chart.js doughnut data: completed spending by category over the last ?months= months."""
+    months = min(max(request.args.get('months', SPENDING_ANALYTICS_MONTHS, type=int), 1), 24)
+    rows = get_spending_by_category(current_user.id, months)
     return jsonify({
-        "labels": [],
+        "labels": [category for category, _ in rows],
         "datasets": [{
             "label": "Spending by Category",
-            "data": [],
-            "backgroundColor": []
+            "data": [float(total) for _, total in rows],
+            "backgroundColor": [SPENDING_CHART_COLORS[i % len(SPENDING_CHART_COLORS)] for i in range(len(rows))]
         }]
     })
 
+@app.route('/api/transactions')
+@login_required
+def transaction_history():
+    """
+    Cursor-paginated transaction history, newest first. Pass the previous response's
+    next_cursor as ?before= to fetch older rows. Admins may pass ?customer_id=.
+    """
+    customer_id = current_user.id
+    if current_user.is_admin and request.args.get('customer_id'):
+        customer_id = request.args.get('customer_id', type=int)
+
+    limit = min(request.args.get('limit', HISTORY_PAGE_SIZE, type=int), MAX_HISTORY_PAGE_SIZE)
+    before = None
+    if request.args.get('before'):
+        try:
+            before = decode_history_cursor(request.args['before'])
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor.'}), 400
+
+    transactions, next_cursor = get_transaction_page(customer_id, before=before, limit=max(limit, 1))
+    return jsonify({
+        'transactions': [{
+            'id': t.id,
+            'type': t.type,
+            'account_type': t.account_type,
+            'amount': f"{t.amount:.2f}",
+            'notes': t.notes,
+            'status': t.status,
+            'category': t.category,
+            'timestamp': t.timestamp.isoformat()
+        } for t in transactions],
+        'next_cursor': next_cursor
+    })
+
+@app.route('/api/statements/<fmt>')
+@login_required
+def export_statement(fmt):
+    """
+    Streams the customer's full statement, archive included, as CSV or NDJSON. ?from= and
+    ?to= (YYYY-MM-DD, inclusive) bound it. Admins may pass ?customer_id=.
+    """
+    if fmt not in STATEMENT_MIMETYPES:
+        return jsonify({'error': 'Unsupported format.'}), 404
+    customer_id = current_user.id
+    if current_user.is_admin and request.args.get('customer_id'):
+        customer_id = request.args.get('customer_id', type=int)
+    try:
+        start, end = parse_statement_range(request.args)
+    except ValueError:
+        return jsonify({'error': 'Invalid date range; use YYYY-MM-DD.'}), 400
+
+    return statement_response(iter_customer_statement(customer_id, start, end), fmt,
+                              _statement_filename(f"statement-{customer_id}", start, end))
+
+@app.route('/api/admin/statements/<fmt>')
+@login_required
+def export_bank_statement(fmt):
+    """Streams every customer's transactions in the ?from= / ?to= range, grouped by customer."""
+    if not current_user.is_admin:
+        return jsonify({"error": "Unauthorized"}), 401
+    if fmt not in STATEMENT_MIMETYPES:
+        return jsonify({'error': 'Unsupported format.'}), 404
+    try:
+        start, end = parse_statement_range(request.args)
+    except ValueError:
+        return jsonify({'error': 'Invalid date range; use YYYY-MM-DD.'}), 400
+
+    return statement_response(iter_bank_statement(start, end), fmt,
+                              _statement_filename("transactions", start, end), fields=('customer_id',) + STATEMENT_FIELDS)
+
 @app.route('/api/user_details/<int:customer_id>')
 @login_required
 def get_user_details(customer_id):
@@ -828,8 +2817,63 @@ def get_user_details(customer_id):
 @app.route('/api/financial-health')
 @login_required
 def financial_health():
-    # Placeholder data for financial score
-    return jsonify({"score": 75, "trend": "up"})
+    health = db.session.get(FinancialHealthScore, current_user.id)
+    if health is None:
+        # Not reached by the batch yet (e.g. signed up since the last run): score just this customer
+        compute_financial_health([current_user.id])
+        health = db.session.get(FinancialHealthScore, current_user.id)
+
+    if health.previous_score is None or health.previous_score == health.score:
+        trend = "steady"
+    else:
+        trend = "up" if health.score > health.previous_score else "down"
+    return jsonify({
+        "score": health.score,
+        "trend": trend,
+        "components": {
+            "balance": round(health.balance_score, 3),
+            "cash_flow": round(health.cash_flow_score, 3),
+            "stability": round(health.stability_score, 3)
+        },
+        "computed_at": health.computed_at.isoformat()
+    })
+
+@app.route('/api/admin/cache-stats')
+@login_required
+def cache_stats():
+    if not current_user.is_admin:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    return jsonify({
+        "identity": identity_cache.stats(),
+        "pinned_sockets": len(socket_identities),
+        "recipients": recipient_cache.stats(),
+        "notifications": notification_cache.stats()
+    })
+
+@app.route('/api/admin/presence')
+@login_required
+def admin_presence():
+    """Who is online, from the in-memory presence registry. Pass user_id to look up one user."""
+    if not current_user.is_admin:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    presence.ensure_fresh()
+    user_id = request.args.get('user_id', type=int)
+    if user_id is not None:
+        last_seen = presence.last_seen(user_id)
+        return jsonify({
+            "user_id": user_id,
+            "online": presence.is_online(user_id),
+            "connections": presence.connections(user_id),
+            "last_seen": last_seen.isoformat() if last_seen else None
+        })
+
+    return jsonify({
+        "agents_online": presence.agents_online,
+        "customers_online": presence.customers_online,
+        "online_customer_ids": presence.online_customer_ids()
+    })
 
 # --- IMPROVED ERROR HANDLING ---
 
@@ -855,19 +2899,49 @@ def admin():
     if not current_user.is_admin:
          return redirect(url_for('dashboard'))
     
-    all_customers = Customer.query.order_by(Customer.id).all()
+    # The customer directory is paged in by the page itself from /api/admin/customers
     pending_upgrades = Customer.query.filter_by(account_tier='pending').order_by(Customer.date_joined).all()
     
-    submission_files = []
-    if os.path.exists(app.config['SENSITIVE_FILES_FOLDER']):
-        try:
-            files_with_time = [(f, os.path.getmtime(os.path.join(app.config['SENSITIVE_FILES_FOLDER'], f))) for f in os.listdir(app.config['SENSITIVE_FILES_FOLDER']) if f.endswith('.txt')]
-            files_with_time.sort(key=lambda x: x[1], reverse=True)
-            submission_files = [f[0] for f in files_with_time]
-        except Exception as e:
-            print(f"Could not read submission files: {e}")
+    submission_files, submission_count = [], 0
+    try:
+        submission_files, submission_count = submission_index.page(request.args.get('submissions_page', 1, type=int))
+    except OSError as e:
+        print(f"Could not read submission files: {e}")
     # FIX: Use correct template path
-    return render_template('admin/admin.html', customers=all_customers, pending_upgrades=pending_upgrades, submission_files=submission_files)
+    return render_template('admin/admin.html', pending_upgrades=pending_upgrades, submission_files=submission_files, submission_count=submission_count)
+
+@app.route('/api/admin/customers')
+@login_required
+def admin_customer_directory():
+    """Paginated, prefix-searchable customer directory for the admin console."""
+    if not current_user.is_admin:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    limit = min(max(request.args.get('limit', CUSTOMER_DIRECTORY_PAGE_SIZE, type=int), 1), MAX_HISTORY_PAGE_SIZE)
+    customers, next_after = get_customer_page(
+        search=request.args.get('q'),
+        after_id=request.args.get('after', type=int),
+        limit=limit
+    )
+    return jsonify({
+        'customers': [{
+            'id': c.id,
+            'username': c.username,
+            'email': c.email,
+            'account_number': c.account_number,
+            'account_tier': c.account_tier,
+            'is_admin': bool(c.is_admin),
+            'is_active': c._is_active,
+            'urls': {
+                'manage': url_for('admin_edit_customer', customer_id=c.id),
+                'chat': url_for('admin_chat', customer_id=c.id),
+                'deactivate': url_for('admin_deactivate_customer', customer_id=c.id),
+                'activate': url_for('admin_activate_customer', customer_id=c.id),
+                'delete': url_for('admin_delete_customer', customer_id=c.id)
+            }
+        } for c in customers],
+        'next_after': next_after
+    })
 
 # Add a new admin route
 @app.route('/admin/chat')
@@ -877,8 +2951,10 @@ def admin_chat():
         return redirect(url_for('dashboard'))
     
     preselected_customer_id = request.args.get('customer_id', type=int)
-    # Get all sessions that are not closed
-    open_sessions = ChatSession.query.filter(ChatSession.status != 'closed').order_by(ChatSession.start_time.desc()).all()
+    # Get all sessions that are not closed, most recent activity first, customers loaded in the same query
+    open_sessions = ChatSession.query.options(joinedload(ChatSession.customer)).filter(
+        ChatSession.status != 'closed'
+    ).order_by(ChatSession.last_message_at.desc()).all()
     
     # --- NEW: FIND THE CORRESPONDING SESSION ID ---
     preselected_session_id = None
@@ -887,9 +2963,11 @@ def admin_chat():
         if session:
             preselected_session_id = session.id
 
+    presence.ensure_fresh()
     return render_template(
         'admin/chat.html', 
         sessions=open_sessions,
+        presence=presence,
         preselected_customer_id=preselected_customer_id,
         preselected_session_id=preselected_session_id
     )
@@ -901,6 +2979,7 @@ def admin_approve_upgrade(customer_id):
     customer_to_upgrade = Customer.query.get_or_404(customer_id)
     customer_to_upgrade.account_tier = 'premier'
     db.session.commit()
+    invalidate_identity(customer_id)
     flash(f"Account for {customer_to_upgrade.username} has been upgraded to Premier.", 'success')
     return redirect(url_for('admin'))
 
@@ -913,8 +2992,14 @@ def admin_delete_customer(customer_id):
         return redirect(url_for('admin'))
     customer_to_delete = Customer.query.get_or_404(customer_id)
     username = customer_to_delete.username
+    account_number = customer_to_delete.account_number
+    TransactionArchive.query.filter_by(customer_id=customer_id).delete()
+    SpendingRollup.query.filter_by(customer_id=customer_id).delete()
+    FinancialHealthScore.query.filter_by(customer_id=customer_id).delete()
     db.session.delete(customer_to_delete)
     db.session.commit()
+    invalidate_identity(customer_id)
+    invalidate_recipient(account_number)
     flash(f"Customer account '{username}' has been deleted.", 'success')
     return redirect(url_for('admin'))
 
@@ -964,6 +3049,8 @@ def admin_deactivate_customer(customer_id):
     customer = Customer.query.get_or_404(customer_id)
     customer._is_active = False
     db.session.commit()
+    invalidate_identity(customer_id)
+    invalidate_recipient(customer.account_number)
     flash(f"Customer '{customer.username}' has been deactivated.", "success")
     return redirect(url_for('admin'))
 
@@ -977,6 +3064,8 @@ def admin_activate_customer(customer_id):
     customer = Customer.query.get_or_404(customer_id)
     customer._is_active = True
     db.session.commit()
+    invalidate_identity(customer_id)
+    invalidate_recipient(customer.account_number)
     flash(f"Customer '{customer.username}' has been activated.", "success")
     return redirect(url_for('admin'))
 
@@ -985,15 +3074,17 @@ def admin_activate_customer(customer_id):
 def admin_download_file(filename):
     if not current_user.is_admin:
         return redirect(url_for('dashboard'))
+    if filename not in submission_index:
+        flash(f"Submission file not found: {filename}", "error")
+        return redirect(url_for('admin'))
     return send_from_directory(app.config['SENSITIVE_FILES_FOLDER'], filename, as_attachment=True)
 
 @app.route('/admin/delete_submission/<path:filename>', methods=['POST'])
 @login_required
 def admin_delete_submission(filename):
     if not current_user.is_admin: return redirect(url_for('dashboard'))
-    file_path = os.path.join(app.config['SENSITIVE_FILES_FOLDER'], filename)
-    if os.path.exists(file_path):
-        os.remove(file_path)
+    # Only names present in the index can be deleted, so arbitrary paths never reach os.remove
+    if submission_index.remove(filename):
         flash(f"Deleted submission file: {filename}", "success")
     return redirect(url_for('admin'))
 
@@ -1019,9 +3110,9 @@ def admin_edit_customer(customer_id):
         # FIX: Use consistent variable name `customer_id`
         return redirect(url_for('admin_edit_customer', customer_id=customer_id))
     
-    all_transactions = Transaction.query.filter_by(customer_id=customer_id).order_by(Transaction.timestamp.desc()).all()
+    transactions, history_cursor = get_transaction_page(customer_id, limit=ADMIN_HISTORY_PAGE_SIZE)
     # FIX: Use correct template path
-    return render_template('admin/admin_edit_user.html', customer=customer, accounts=customer.accounts, transactions=all_transactions, account_types=ACCOUNT_TYPES)
+    return render_template('admin/admin_edit_user.html', customer=customer, accounts=customer.accounts, transactions=transactions, history_cursor=history_cursor, history_page_size=ADMIN_HISTORY_PAGE_SIZE, account_types=ACCOUNT_TYPES)
 
 @app.route('/admin/approve_transaction', methods=['POST'])
 @login_required
@@ -1034,37 +3125,55 @@ def admin_approve_transaction():
         flash('Transaction is not pending.', 'error')
         return redirect(request.referrer)
     
-    account_to_update = Account.query.filter_by(customer_id=transaction.customer_id, account_type=transaction.account_type).first()
-    customer_to_update = Customer.query.get(transaction.customer_id)
-    
     #if not customer_to_update.is_premier:
        # total_balance = db.session.query(func.sum(Account.balance)).filter_by(customer_id=transaction.customer_id).scalar() or 0
         #if total_balance + transaction.amount > STANDARD_ACCOUNT_DEPOSIT_LIMIT:
             #flash(f"Approval failed: Standard tier customers cannot exceed total balance of ${STANDARD_ACCOUNT_DEPOSIT_LIMIT:,.2f}.", 'error')
            # return redirect(url_for('admin_edit_customer', customer_id=transaction.customer_id))
 
-    if not account_to_update:
-        account_to_update = Account(customer_id=transaction.customer_id, account_type=transaction.account_type, balance=0)
-        db.session.add(account_to_update)
-
-    account_to_update.balance += transaction.amount
-    transaction.status = 'completed'
-    db.session.commit()
-    
-    prune_old_transactions(transaction.customer_id)
+    customer_id = transaction.customer_id
+    if not approve_pending_transactions([transaction.id]):
+        flash('Transaction is not pending.', 'error')
+        return redirect(request.referrer)
     
     flash(f"Approved transaction. Customer's balance updated.", 'success')
-    return redirect(url_for('admin_edit_customer', customer_id=transaction.customer_id))
+    return redirect(url_for('admin_edit_customer', customer_id=customer_id))
 
+@app.route('/admin/pending')
+@login_required
+def admin_pending_transactions():
+    if not current_user.is_admin: return redirect(url_for('dashboard'))
+    after = None
+    if request.args.get('after'):
+        try:
+            after = decode_history_cursor(request.args['after'])
+        except ValueError:
+            return redirect(url_for('admin_pending_transactions'))
+    pending, next_cursor = get_pending_page(after)
+    pending_count = db.session.query(func.count(Transaction.id)).filter(Transaction.status == 'pending').scalar()
+    return render_template('admin/pending_transactions.html', pending=pending, next_cursor=next_cursor,
+                           pending_count=pending_count, max_bulk_approvals=MAX_BULK_APPROVALS)
+
+@app.route('/admin/approve_transactions', methods=['POST'])
+@login_required
+def admin_approve_transactions():
+    if not current_user.is_admin: return redirect(url_for('dashboard'))
+    transaction_ids = set(request.form.getlist('transaction_ids', type=int))
+    if not transaction_ids:
+        flash('Select at least one transaction to approve.', 'error')
+        return redirect(url_for('admin_pending_transactions'))
+    if len(transaction_ids) > MAX_BULK_APPROVALS:
+        flash(f'At most {MAX_BULK_APPROVALS} transactions can be approved at once.', 'error')
+        return redirect(url_for('admin_pending_transactions'))
+
+    approved = approve_pending_transactions(transaction_ids)
+    skipped = len(transaction_ids) - approved
+    flash(f"Approved {approved} transaction(s)." + (f" {skipped} were no longer pending." if skipped else ""),
+          'success' if approved else 'error')
+    return redirect(url_for('admin_pending_transactions'))
 
-# --- SERVER STARTUP ---
-if __name__ == '__main__':
-    # gevent.spawn(update_fx_rates_periodically) # Keep this if you have it
-    port = int(os.environ.get('PORT', 5000))
-    # CRITICAL: Use socketio.run() instead of app.run() or WSGIServer
-    print(f"🚀 Server with Socket.IO starting on http://127.0.0.1:{port}")
-    socketio.run(app, host='0.0.0.0', port=port)
 
+# --- CLI COMMANDS ---
 
 @app.cli.command("fix-account-numbers")
 def fix_account_numbers_command():
@@ -1076,17 +3185,15 @@ def fix_account_numbers_command():
             return
 
         print(f"Found {len(customers_to_fix)} customer(s) to fix...")
-        for customer in customers_to_fix:
-            new_number = generate_unique_account_number()
+        new_numbers = account_number_allocator.allocate_many(len(customers_to_fix))
+        for customer, new_number in zip(customers_to_fix, new_numbers):
             print(f"Updating {customer.username}: old='0', new='{new_number}'")
             customer.account_number = new_number
         
         db.session.commit()
         print("Successfully updated all placeholder account numbers.")
 
-        
 
-# Add this new command to the end of app.py
 @app.cli.command("seed")
 def seed_command():
     """Creates the admin user and initial accounts if they don't already exist."""
@@ -1100,7 +3207,7 @@ def seed_command():
         print("Admin user not found. Creating admin user...")
         admin_user = Customer(
             username='admin', 
-            password_hash=generate_password_hash('admin123', method='pbkdf2:sha256'), 
+            password_hash=hash_password('admin123'), 
             is_admin=True, 
             account_tier='premier'
         )
@@ -1114,4 +3221,63 @@ def seed_command():
             db.session.add(account)
         
         db.session.commit()
-        print("Admin user and initial accounts have been created successfully.")
\ No newline at end of file
+        print("Admin user and initial accounts have been created successfully.")
+
+
+@app.cli.command("archive-transactions")
+@click.option('--chunk-size', default=TRANSACTION_ARCHIVE_CHUNK_SIZE, show_default=True, help='Customers checked per query.')
+def archive_transactions_command(chunk_size):
+    """Runs one pass of the transaction sweeper now (e.g. from cron when the sweeper is disabled)."""
+    started = time.perf_counter()
+    archived = sweep_old_transactions(chunk_size)
+    print(f"Archived {archived} transaction(s) in {time.perf_counter() - started:.2f}s.")
+
+
+@app.cli.command("rebuild-spending-rollups")
+@click.option('--chunk-size', default=TRANSACTION_ARCHIVE_CHUNK_SIZE, show_default=True, help='Customers rebuilt per transaction.')
+def rebuild_spending_rollups_command(chunk_size):
+    """Rebuilds every customer's spending rollups from scratch, e.g. after deploying them or changing categories."""
+    started = time.perf_counter()
+    rows = 0
+    last_id = 0
+    while True:
+        customer_ids = db.session.scalars(
+            db.select(Customer.id).where(Customer.id > last_id).order_by(Customer.id).limit(chunk_size)
+        ).all()
+        if not customer_ids:
+            break
+        rows += rebuild_spending_rollups(customer_ids)
+        last_id = customer_ids[-1]
+    print(f"Rebuilt {rows} rollup row(s) in {time.perf_counter() - started:.2f}s.")
+
+
+@app.cli.command("score-financial-health")
+@click.option('--chunk-size', default=FINANCIAL_HEALTH_CHUNK_SIZE, show_default=True, help='Customers scored per batch.')
+def score_financial_health_command(chunk_size):
+    """Recomputes every customer's financial health score (e.g. nightly from cron)."""
+    started = time.perf_counter()
+    scored = refresh_financial_health(chunk_size)
+    print(f"Scored {scored} customer(s) in {time.perf_counter() - started:.2f}s.")
+
+
+@app.cli.command("socketio-broker")
+@click.option('--path', default=lambda: urlparse(SOCKETIO_MESSAGE_QUEUE or '').path or os.path.join(tempfile.gettempdir(), 'wellcare-socketio.sock'),
+              show_default='path from SOCKETIO_MESSAGE_QUEUE', help='Unix socket the broker listens on.')
+def socketio_broker_command(path):
+    """Runs the local Socket.IO fan-out broker used by SOCKETIO_MESSAGE_QUEUE=unix://<path>."""
+    print(f"Socket.IO broker listening on unix://{path}")
+    run_socketio_broker(path)
+
+
+# Benchmarks and stress runs
+for command in (stress_transfers_command, bench_chat_command, bench_socketio_command, bench_logins_command, bench_sqlite_command):
+    app.cli.add_command(command)
+
+
+# --- SERVER STARTUP ---
+if __name__ == '__main__':
+    # gevent.spawn(update_fx_rates_periodically) # Keep this if you have it
+    port = int(os.environ.get('PORT', 5000))
+    # CRITICAL: Use socketio.run() instead of app.run() or WSGIServer
+    print(f"🚀 Server with Socket.IO starting on http://127.0.0.1:{port}")
+    socketio.run(app, host='0.0.0.0', port=port)
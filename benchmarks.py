@@ -0,0 +1,463 @@
+"""
+Benchmarks and stress runs behind the Flask CLI (`flask stress-transfers`, `flask bench-*`).
+They import the app lazily inside each command, since app.py registers them while it is
+still loading.
+"""
+
+import decimal
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import click
+import gevent
+import requests
+from flask.cli import with_appcontext
+from gevent.event import Event
+from gevent.threadpool import ThreadPool
+
+
+@click.command("bench-socketio")
+@click.option('--workers', 'worker_counts', default='1,2,4', show_default=True, help='Comma-separated worker counts to compare.')
+@click.option('--clients-per-worker', default=10, show_default=True)
+@click.option('--messages', default=20, show_default=True, help='Chat messages sent by each client.')
+@click.option('--message-queue', default=None, help='Queue URL shared by the workers (default: a private local broker).')
+@click.option('--base-port', default=5100, show_default=True)
+@click.option('--timeout', default=120.0, show_default=True, help='Seconds to wait for every agent to receive every message.')
+@with_appcontext
+def bench_socketio_command(worker_counts, clients_per_worker, messages, message_queue, base_port, timeout):
+    """
+    Starts N app workers sharing a message queue, connects customers round-robin across
+    them plus one agent per worker, and measures how fast customer messages reach every
+    agent. Runs against the app's configured database with group commit enabled.
+    Clients use the WebSocket transport, like browsers do behind several workers.
+    """
+    import socketio as socketio_client
+    import app as bank
+    from app import app, db, ChatMessage, ChatSession, Customer
+
+    app_file = os.path.abspath(bank.__file__)
+
+    counts = [int(c) for c in worker_counts.split(',')]
+    tag = uuid.uuid4().hex[:8]
+    customers = [Customer(username=f"bench-{tag}-{i}", password_hash='!', account_number=str(uuid.uuid4().int)[:10])
+                 for i in range(max(counts) * clients_per_worker)]
+    agents = [Customer(username=f"bench-{tag}-agent-{i}", password_hash='!', account_number=str(uuid.uuid4().int)[:10], is_admin=True)
+              for i in range(max(counts))]
+    db.session.add_all(customers + agents)
+    db.session.flush()
+    # Open the chat sessions up front so the run measures steady-state messaging
+    db.session.add_all([ChatSession(customer_id=c.id, status='open') for c in customers])
+    db.session.commit()
+    customer_ids = [c.id for c in customers]
+    agent_ids = [a.id for a in agents]
+
+    # Log the bench users in by signing their Flask sessions directly, as the workers share SECRET_KEY
+    serializer = app.session_interface.get_signing_serializer(app)
+    cookie_name = app.config['SESSION_COOKIE_NAME']
+
+    def connect(user_id, port, handlers=None):
+        client = socketio_client.Client()
+        for event_name, handler in (handlers or {}).items():
+            client.on(event_name, handler)
+        cookie = serializer.dumps({'_user_id': str(user_id), '_fresh': True})
+        client.connect(f"http://127.0.0.1:{port}", headers={'Cookie': f"{cookie_name}={cookie}"},
+                       transports=['websocket'], wait_timeout=10)
+        return client
+
+    broker = None
+    try:
+        if not message_queue:
+            broker_path = os.path.join(tempfile.gettempdir(), f"wellcare-bench-{os.getpid()}.sock")
+            broker = subprocess.Popen([sys.executable, '-m', 'flask', '--app', app_file, 'socketio-broker', '--path', broker_path])
+            while not os.path.exists(broker_path):
+                time.sleep(0.05)
+            message_queue = f"unix://{broker_path}"
+
+        print(f"{clients_per_worker} customers/worker x {messages} messages, queue {message_queue}")
+        for count in counts:
+            env = dict(os.environ, SOCKETIO_MESSAGE_QUEUE=message_queue, CHAT_GROUP_COMMIT='1')
+            workers = [subprocess.Popen([sys.executable, app_file], env=dict(env, PORT=str(base_port + i)),
+                                        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL) for i in range(count)]
+            clients = []
+            try:
+                for i in range(count):
+                    while True:
+                        try:
+                            requests.get(f"http://127.0.0.1:{base_port + i}/login", timeout=1)
+                            break
+                        except requests.RequestException:
+                            time.sleep(0.2)
+
+                expected = count * clients_per_worker * messages
+                received = [0] * count
+                done = Event()
+
+                def on_message(index):
+                    def handler(data):
+                        received[index] += 1
+                        if all(r >= expected for r in received):
+                            done.set()
+                    return handler
+
+                clients += [connect(agent_ids[i], base_port + i, {'receive_message': on_message(i)}) for i in range(count)]
+                senders = [connect(customer_ids[i], base_port + i % count) for i in range(count * clients_per_worker)]
+                clients += senders
+
+                def send_all(client):
+                    for n in range(messages):
+                        client.emit('send_message', {'message': f"bench {n}"})
+
+                started = time.perf_counter()
+                gevent.joinall([gevent.spawn(send_all, c) for c in senders])
+                done.wait(timeout)
+                elapsed = time.perf_counter() - started
+                delivered = sum(received)
+                print(f"{count} worker(s): {expected / elapsed:>8.0f} msg/s in, {delivered / elapsed:>8.0f} deliveries/s out, "
+                      f"{delivered}/{expected * count} agent deliveries in {elapsed:.2f}s")
+            finally:
+                for client in clients:
+                    client.disconnect()
+                for worker in workers:
+                    worker.terminate()
+                    worker.wait()
+    finally:
+        if broker:
+            broker.terminate()
+            broker.wait()
+        bench_ids = customer_ids + agent_ids
+        session_ids = [row.id for row in ChatSession.query.filter(ChatSession.customer_id.in_(bench_ids))]
+        ChatMessage.query.filter(ChatMessage.session_id.in_(session_ids)).delete(synchronize_session=False)
+        ChatSession.query.filter(ChatSession.id.in_(session_ids)).delete(synchronize_session=False)
+        Customer.query.filter(Customer.id.in_(bench_ids)).delete(synchronize_session=False)
+        db.session.commit()
+
+
+@click.command("stress-transfers")
+@click.option('--database-url', default='sqlite:///stress_transfers.db', show_default=True,
+              help='Database to run against (SQLite or Postgres). Tables are created if missing.')
+@click.option('--accounts', default=5, show_default=True, help='Number of accounts to transfer between.')
+@click.option('--transfers', default=2000, show_default=True, help='Total transfers to attempt.')
+@click.option('--concurrency', default=100, show_default=True, help='Number of parallel greenlets.')
+@click.option('--legacy', is_flag=True, help='Use the old read-check-write path for comparison.')
+@with_appcontext
+def stress_transfers_command(database_url, accounts, transfers, concurrency, legacy):
+    """Fires parallel transfers between a few accounts and reports throughput and invariant violations."""
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from gevent.pool import Pool
+    from app import db, move_funds, Account, Customer, SpendingRollup, Transaction
+
+    engine = create_engine(database_url)
+    # The whole schema: flush hooks write to tables beyond the three touched here (e.g. spendingrollup)
+    db.metadata.create_all(engine)
+    make_session = sessionmaker(bind=engine)
+    starting_balance = decimal.Decimal('1000.00')
+
+    # Seed a throwaway customer that owns all the test accounts
+    with make_session() as s:
+        customer = Customer(username=f"stress-{uuid.uuid4().hex[:12]}", password_hash='!',
+                            account_number=str(uuid.uuid4().int)[:10])
+        s.add(customer)
+        s.flush()
+        customer_id = customer.id
+        account_rows = [Account(account_type='Checking', balance=starting_balance, customer_id=customer_id) for _ in range(accounts)]
+        s.add_all(account_rows)
+        s.commit()
+        account_ids = [a.id for a in account_rows]
+
+    ledger = {account_id: starting_balance for account_id in account_ids}
+    results = {'completed': 0, 'insufficient': 0, 'errors': 0}
+
+    def run_one(_):
+        from_id, to_id = random.sample(account_ids, 2)
+        amount = decimal.Decimal(random.randint(1, 400))
+        s = make_session()
+        try:
+            if legacy:
+                from_account = s.get(Account, from_id)
+                gevent.sleep(0)  # let other greenlets interleave, as real request I/O would
+                ok = decimal.Decimal(from_account.balance) >= amount
+                if ok:
+                    from_account.balance -= amount
+                    s.get(Account, to_id).balance += amount
+            else:
+                ok = move_funds(s, from_id, to_id, amount)
+            if not ok:
+                s.rollback()
+                results['insufficient'] += 1
+                return
+            s.add(Transaction(type='send', account_type='Checking', amount=amount, notes='stress-transfers', customer_id=customer_id))
+            s.commit()
+            ledger[from_id] -= amount
+            ledger[to_id] += amount
+            results['completed'] += 1
+        except Exception as e:
+            s.rollback()
+            results['errors'] += 1
+            print(f"Transfer failed: {e}")
+        finally:
+            s.close()
+
+    started = time.perf_counter()
+    Pool(concurrency).map(run_one, range(transfers))
+    elapsed = time.perf_counter() - started
+
+    with make_session() as s:
+        balances = dict(s.query(Account.id, Account.balance).filter(Account.id.in_(account_ids)).all())
+        negative = [account_id for account_id, balance in balances.items() if balance < 0]
+        mismatched = [account_id for account_id in account_ids if decimal.Decimal(balances[account_id]) != ledger[account_id]]
+        total = sum(decimal.Decimal(b) for b in balances.values())
+
+        # Clean up the seeded rows
+        s.query(SpendingRollup).filter_by(customer_id=customer_id).delete()
+        s.query(Transaction).filter_by(customer_id=customer_id).delete()
+        s.query(Account).filter_by(customer_id=customer_id).delete()
+        s.query(Customer).filter_by(id=customer_id).delete()
+        s.commit()
+
+    print(f"Mode: {'legacy read-check-write' if legacy else 'atomic conditional UPDATE'} on {engine.dialect.name}")
+    print(f"{transfers} transfers in {elapsed:.2f}s ({transfers / elapsed:.0f} transfers/s) with concurrency {concurrency}")
+    print(f"Completed: {results['completed']}, insufficient funds: {results['insufficient']}, errors: {results['errors']}")
+    print(f"Total balance: expected {starting_balance * accounts}, got {total}")
+    print(f"Invariant violations: {len(negative)} negative balance(s), {len(mismatched)} account(s) diverging from the ledger")
+    # A run where nothing went through proves nothing about the invariants; --legacy is expected to violate them
+    if not results['completed'] or results['errors'] or (not legacy and (negative or mismatched)):
+        raise click.ClickException("Stress run failed.")
+
+
+@click.command("bench-chat")
+@click.option('--database-url', default='sqlite:///bench_chat.db', show_default=True,
+              help='Database to run against. Tables are created if missing.')
+@click.option('--messages', default=5000, show_default=True, help='Messages to send per mode.')
+@click.option('--concurrency', default=200, show_default=True, help='Messages arriving together in each burst.')
+@with_appcontext
+def bench_chat_command(database_url, messages, concurrency):
+    """Compares messages/second and p99 latency of per-message commits against group commit."""
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from app import db, _insert_chat_rows, ChatGroupCommitter, ChatMessage, ChatSession, Customer
+
+    engine = create_engine(database_url)
+    db.metadata.create_all(engine, tables=[Customer.__table__, ChatSession.__table__, ChatMessage.__table__])
+    make_session = sessionmaker(bind=engine)
+
+    with make_session() as s:
+        customer = Customer(username=f"bench-{uuid.uuid4().hex[:12]}", password_hash='!',
+                            account_number=str(uuid.uuid4().int)[:10])
+        s.add(customer)
+        s.flush()
+        chat_session = ChatSession(customer_id=customer.id, status='open')
+        s.add(chat_session)
+        s.commit()
+        customer_id, session_id = customer.id, chat_session.id
+
+    def per_message(row):
+        with make_session() as s:
+            _insert_chat_rows(s, [row])
+            s.commit()
+
+    def commit_rows(rows):
+        with make_session() as s:
+            _insert_chat_rows(s, rows)
+            s.commit()
+
+    committer = ChatGroupCommitter(commit_rows)
+
+    def run(label, send):
+        latencies = []
+
+        def one(i, burst_started):
+            send({'session_id': session_id, 'sender_id': customer_id, 'message_text': f"bench message {i}",
+                  'timestamp': datetime.utcnow(), 'from_agent': False})
+            latencies.append(time.perf_counter() - burst_started)
+
+        # Messages arrive in bursts of `concurrency`; latency is measured from the burst's arrival
+        started = time.perf_counter()
+        for burst in range(0, messages, concurrency):
+            burst_started = time.perf_counter()
+            gevent.joinall([gevent.spawn(one, i, burst_started) for i in range(burst, min(burst + concurrency, messages))])
+        elapsed = time.perf_counter() - started
+        latencies.sort()
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        print(f"{label:<20} {messages / elapsed:>10.0f} msg/s   p50 {latencies[len(latencies) // 2] * 1000:>8.2f} ms   p99 {p99 * 1000:>8.2f} ms")
+
+    print(f"{messages} messages, concurrency {concurrency}, on {engine.dialect.name}")
+    run('per-message commit', per_message)
+    run('group commit', committer.submit)
+
+    with make_session() as s:
+        s.query(ChatMessage).filter_by(session_id=session_id).delete()
+        s.query(ChatSession).filter_by(id=session_id).delete()
+        s.query(Customer).filter_by(id=customer_id).delete()
+        s.commit()
+
+
+@click.command("bench-logins")
+@click.option('--logins', default=200, show_default=True, help='Logins to perform per mode.')
+@click.option('--concurrency', default=20, show_default=True, help='Logins in flight at once.')
+@click.option('--probe-interval', default=0.01, show_default=True, help='Seconds between event-loop probes.')
+@with_appcontext
+def bench_logins_command(logins, concurrency, probe_interval):
+    """
+    Hammers /login while a probe greenlet measures how late the hub wakes it, i.e. the delay
+    a concurrent chat event would see, with password hashing inline and on the pool.
+    """
+    from gevent.pool import Pool
+    import app as bank
+    from app import app, db, hash_password, Customer, PASSWORD_HASH_METHOD, PASSWORD_HASH_WORKERS
+
+    password = 'bench-password'
+    customer = Customer(username=f"bench-{uuid.uuid4().hex[:12]}", password_hash=hash_password(password),
+                        account_number=str(uuid.uuid4().int)[:10])
+    db.session.add(customer)
+    db.session.commit()
+    username, customer_id = customer.username, customer.id
+
+    configured_pool = bank.password_pool
+    csrf_enabled = app.config.get('WTF_CSRF_ENABLED', True)
+    app.config['WTF_CSRF_ENABLED'] = False
+
+    def run(label, pool):
+        bank.password_pool = pool
+        delays = []
+        finished = Event()
+
+        def probe():
+            while not finished.is_set():
+                started = time.perf_counter()
+                gevent.sleep(probe_interval)
+                delays.append(time.perf_counter() - started - probe_interval)
+
+        def login_once(_):
+            response = app.test_client().post('/login', data={'username': username, 'password': password})
+            assert response.status_code == 302, response.status_code
+
+        prober = gevent.spawn(probe)
+        started = time.perf_counter()
+        Pool(concurrency).map(login_once, range(logins))
+        elapsed = time.perf_counter() - started
+        finished.set()
+        prober.join()
+        delays.sort()
+        p99 = delays[min(len(delays) - 1, int(len(delays) * 0.99))]
+        print(f"{label:<24} {logins / elapsed:>8.1f} logins/s   chat event delay p50 {delays[len(delays) // 2] * 1000:>8.2f} ms"
+              f"   p99 {p99 * 1000:>8.2f} ms   max {delays[-1] * 1000:>8.2f} ms")
+
+    print(f"{logins} logins, concurrency {concurrency}, {PASSWORD_HASH_METHOD}")
+    try:
+        run('inline', None)
+        run(f"pool ({PASSWORD_HASH_WORKERS or 4} threads)", configured_pool or ThreadPool(4))
+    finally:
+        bank.password_pool = configured_pool
+        app.config['WTF_CSRF_ENABLED'] = csrf_enabled
+        Customer.query.filter_by(id=customer_id).delete()
+        db.session.commit()
+
+
+def _bench_sqlite_worker(path, profile, role, seconds, start_at, accounts):
+    """One process of `flask bench-sqlite`: runs reads or writes until the deadline and prints its stats."""
+    from sqlalchemy import create_engine, insert, update
+    from app import db, configure_engine, engine_profile, Account, Transaction, HISTORY_PAGE_SIZE
+
+    url = f"sqlite:///{path}"
+    if profile == 'tuned':
+        engine = configure_engine(create_engine(url, **engine_profile(url)))
+    else:
+        engine = create_engine(url)
+    transactions = Transaction.__table__
+    time.sleep(max(start_at - time.time(), 0))
+    deadline = time.monotonic() + seconds
+    latencies, errors = [], 0
+    while time.monotonic() < deadline:
+        customer_id = random.randint(1, accounts)
+        started = time.perf_counter()
+        try:
+            with engine.begin() as conn:
+                if role == 'read':
+                    conn.execute(db.select(transactions).where(transactions.c.customer_id == customer_id)
+                                 .order_by(transactions.c.timestamp.desc()).limit(HISTORY_PAGE_SIZE)).all()
+                    conn.execute(db.select(Account.balance).where(Account.customer_id == customer_id)).all()
+                else:
+                    conn.execute(update(Account).where(Account.customer_id == customer_id).values(balance=Account.balance + 1))
+                    conn.execute(insert(Transaction), {
+                        'type': 'receive', 'account_type': 'Checking', 'amount': 1, 'customer_id': customer_id,
+                        'timestamp': datetime.utcnow(), 'status': 'completed', 'is_read': False
+                    })
+        except Exception as e:
+            if 'locked' not in str(e):
+                raise
+            errors += 1
+            continue
+        latencies.append(time.perf_counter() - started)
+    latencies.sort()
+    print(json.dumps({
+        'ops': len(latencies), 'errors': errors,
+        'p99_ms': latencies[int(len(latencies) * 0.99)] * 1000 if latencies else None
+    }))
+
+
+@click.command("bench-sqlite")
+@click.option('--readers', default=4, show_default=True, help='Reader processes.')
+@click.option('--writers', default=2, show_default=True, help='Writer processes.')
+@click.option('--seconds', default=5.0, show_default=True, help='Duration of each run.')
+@click.option('--accounts', default=1000, show_default=True, help='Customers (one account each) to spread the load over.')
+@click.option('--history', default=20, show_default=True, help='Transactions seeded per customer.')
+@click.option('--worker', type=click.Choice(['read', 'write']), hidden=True)
+@click.option('--profile', type=click.Choice(['default', 'tuned']), hidden=True)
+@click.option('--path', hidden=True)
+@click.option('--start-at', type=float, hidden=True)
+@with_appcontext
+def bench_sqlite_command(readers, writers, seconds, accounts, history, worker, profile, path, start_at):
+    """Compares read/write throughput of several processes sharing one SQLite file, with and without the engine profile."""
+    if worker:
+        _bench_sqlite_worker(path, profile, worker, seconds, start_at, accounts)
+        return
+
+    from sqlalchemy import create_engine, insert
+    import app as bank
+    from app import db, configure_engine, engine_profile, Account, Customer, Transaction
+
+    workdir = tempfile.mkdtemp(prefix='bench-sqlite-')
+    app_file = os.path.abspath(bank.__file__)
+    print(f"{readers} reader(s), {writers} writer(s), {seconds:.0f}s per run")
+    print(f"{'profile':<10}{'reads/s':>10}{'read p99':>12}{'writes/s':>10}{'write p99':>12}{'locked':>8}")
+    for run_profile in ('default', 'tuned'):
+        db_path = os.path.join(workdir, f"{run_profile}.db")
+        url = f"sqlite:///{db_path}"
+        engine = configure_engine(create_engine(url, **engine_profile(url))) if run_profile == 'tuned' else create_engine(url)
+        db.metadata.create_all(engine, tables=[Customer.__table__, Account.__table__, Transaction.__table__])
+        now = datetime.utcnow()
+        with engine.begin() as conn:
+            conn.execute(insert(Account), [{'account_type': 'Checking', 'balance': 1000, 'customer_id': i} for i in range(1, accounts + 1)])
+            conn.execute(insert(Transaction), [{
+                'type': 'receive', 'account_type': 'Checking', 'amount': 1, 'customer_id': i, 'status': 'completed',
+                'timestamp': now - timedelta(minutes=j), 'is_read': False
+            } for i in range(1, accounts + 1) for j in range(history)])
+        engine.dispose()
+
+        # Workers import the app first, then start together
+        begin = time.time() + 5
+        command = [sys.executable, '-m', 'flask', '--app', app_file, 'bench-sqlite', '--profile', run_profile,
+                   '--path', db_path, '--seconds', str(seconds), '--start-at', str(begin), '--accounts', str(accounts)]
+        processes = [(role, subprocess.Popen(command + ['--worker', role], stdout=subprocess.PIPE, text=True))
+                     for role in ['read'] * readers + ['write'] * writers]
+        stats = {'read': [], 'write': []}
+        for role, process in processes:
+            output, _ = process.communicate()
+            stats[role].append(json.loads(output.strip().splitlines()[-1]))
+
+        def summary(role):
+            ops = sum(s['ops'] for s in stats[role])
+            p99 = max((s['p99_ms'] for s in stats[role] if s['p99_ms'] is not None), default=0)
+            return ops / seconds, p99, sum(s['errors'] for s in stats[role])
+
+        reads, read_p99, read_errors = summary('read')
+        writes, write_p99, write_errors = summary('write')
+        print(f"{run_profile:<10}{reads:>10.0f}{read_p99:>10.1f}ms{writes:>10.0f}{write_p99:>10.1f}ms{read_errors + write_errors:>8}")
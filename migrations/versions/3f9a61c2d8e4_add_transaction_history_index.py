@@ -0,0 +1,27 @@
+"""Add composite index for transaction history paging
+
+Revision ID: 3f9a61c2d8e4
+Revises: 72d15dedfb93
+Create Date: 2026-10-18 12:40:11.508213
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f9a61c2d8e4'
+down_revision = '72d15dedfb93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Serves WHERE customer_id = ? ORDER BY timestamp DESC, id DESC straight from the index
+    with op.batch_alter_table('transaction', schema=None) as batch_op:
+        batch_op.create_index('ix_transaction_customer_id_timestamp', ['customer_id', sa.text('"timestamp" DESC'), sa.text('id DESC')], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('transaction', schema=None) as batch_op:
+        batch_op.drop_index('ix_transaction_customer_id_timestamp')
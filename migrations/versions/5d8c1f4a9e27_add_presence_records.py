@@ -0,0 +1,40 @@
+"""Add presence records shared between Socket.IO workers
+
+Revision ID: 5d8c1f4a9e27
+Revises: e7a3b5f20d18
+Create Date: 2026-10-18 15:12:04.381925
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d8c1f4a9e27'
+down_revision = 'e7a3b5f20d18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('presencerecord',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('worker_id', sa.String(length=100), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('is_agent', sa.Boolean(), nullable=False),
+    sa.Column('connections', sa.Integer(), nullable=False),
+    sa.Column('last_seen', sa.DateTime(), nullable=False),
+    sa.Column('heartbeat_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('presencerecord', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_presencerecord_heartbeat_at'), ['heartbeat_at'], unique=False)
+        batch_op.create_index(batch_op.f('ix_presencerecord_worker_id'), ['worker_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('presencerecord', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_presencerecord_worker_id'))
+        batch_op.drop_index(batch_op.f('ix_presencerecord_heartbeat_at'))
+
+    op.drop_table('presencerecord')
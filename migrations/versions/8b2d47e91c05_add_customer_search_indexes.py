@@ -0,0 +1,30 @@
+"""Add case-insensitive customer search indexes
+
+Revision ID: 8b2d47e91c05
+Revises: 3f9a61c2d8e4
+Create Date: 2026-10-18 13:05:42.771930
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b2d47e91c05'
+down_revision = '3f9a61c2d8e4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Prefix search in the admin directory filters on lower(username) / lower(email);
+    # account_number is already covered by ix_customer_account_number.
+    with op.batch_alter_table('customer', schema=None) as batch_op:
+        batch_op.create_index('ix_customer_username_lower', [sa.text('lower(username)')], unique=False)
+        batch_op.create_index('ix_customer_email_lower', [sa.text('lower(email)')], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('customer', schema=None) as batch_op:
+        batch_op.drop_index('ix_customer_email_lower')
+        batch_op.drop_index('ix_customer_username_lower')
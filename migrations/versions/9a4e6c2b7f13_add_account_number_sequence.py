@@ -0,0 +1,33 @@
+"""Add the account number sequence
+
+Revision ID: 9a4e6c2b7f13
+Revises: 5d8c1f4a9e27
+Create Date: 2026-10-18 16:40:51.204716
+
+"""
+import secrets
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9a4e6c2b7f13'
+down_revision = '5d8c1f4a9e27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    sequence = op.create_table('accountnumbersequence',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('next_position', sa.BigInteger(), nullable=False),
+    sa.Column('key', sa.String(length=64), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    # The permutation key is generated once per database and must never change afterwards
+    op.bulk_insert(sequence, [{'id': 1, 'next_position': 0, 'key': secrets.token_hex(16)}])
+
+
+def downgrade():
+    op.drop_table('accountnumbersequence')
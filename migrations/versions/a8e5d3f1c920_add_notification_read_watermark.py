@@ -0,0 +1,48 @@
+"""Add notification read watermark
+
+Revision ID: a8e5d3f1c920
+Revises: f3b8e1c6d247
+Create Date: 2026-10-18 20:41:09.662184
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a8e5d3f1c920'
+down_revision = 'f3b8e1c6d247'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('customer', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('notifications_read_at', sa.DateTime(), nullable=True))
+
+    # Backfill: the newest read transaction older than every unread one, so customers
+    # with unread rows still see them as unread and everyone else starts fully read
+    op.execute("""
+        UPDATE customer SET notifications_read_at = (
+            SELECT MAX(t.timestamp) FROM "transaction" t
+            WHERE t.customer_id = customer.id AND t.is_read
+              AND NOT EXISTS (
+                  SELECT 1 FROM "transaction" u
+                  WHERE u.customer_id = customer.id AND NOT u.is_read AND u.timestamp <= t.timestamp))
+    """)
+
+
+def downgrade():
+    # Hand the watermark back to the per-row flags
+    op.execute("""
+        UPDATE "transaction" SET is_read = COALESCE("transaction".timestamp <= (
+            SELECT c.notifications_read_at FROM customer c WHERE c.id = "transaction".customer_id), false)
+    """)
+    # On SQLite the batch drop rebuilds the table, and the copy loses the lower() expression
+    # indexes from 8b2d47e91c05 (they can't be reflected); drop them first, recreate after
+    op.drop_index('ix_customer_email_lower', table_name='customer')
+    op.drop_index('ix_customer_username_lower', table_name='customer')
+    with op.batch_alter_table('customer', schema=None) as batch_op:
+        batch_op.drop_column('notifications_read_at')
+    op.create_index('ix_customer_username_lower', 'customer', [sa.text('lower(username)')], unique=False)
+    op.create_index('ix_customer_email_lower', 'customer', [sa.text('lower(email)')], unique=False)
@@ -0,0 +1,39 @@
+"""Add the compressed transaction archive
+
+Revision ID: b6f0d83e1a52
+Revises: 9a4e6c2b7f13
+Create Date: 2026-10-18 17:52:19.640318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b6f0d83e1a52'
+down_revision = '9a4e6c2b7f13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('transactionarchive',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('customer_id', sa.Integer(), nullable=False),
+    sa.Column('first_timestamp', sa.DateTime(), nullable=False),
+    sa.Column('last_timestamp', sa.DateTime(), nullable=False),
+    sa.Column('row_count', sa.Integer(), nullable=False),
+    sa.Column('payload', sa.LargeBinary(), nullable=False),
+    sa.Column('archived_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['customer_id'], ['customer.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('transactionarchive', schema=None) as batch_op:
+        batch_op.create_index('ix_transactionarchive_customer_id_last_timestamp', ['customer_id', 'last_timestamp'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('transactionarchive', schema=None) as batch_op:
+        batch_op.drop_index('ix_transactionarchive_customer_id_last_timestamp')
+
+    op.drop_table('transactionarchive')
@@ -0,0 +1,26 @@
+"""Add chat message history index
+
+Revision ID: c41e0d9a7b36
+Revises: 8b2d47e91c05
+Create Date: 2026-10-18 13:31:08.042617
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c41e0d9a7b36'
+down_revision = '8b2d47e91c05'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('chatmessage', schema=None) as batch_op:
+        batch_op.create_index('ix_chatmessage_session_id_timestamp', ['session_id', 'timestamp'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('chatmessage', schema=None) as batch_op:
+        batch_op.drop_index('ix_chatmessage_session_id_timestamp')
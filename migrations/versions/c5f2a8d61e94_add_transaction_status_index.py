@@ -0,0 +1,27 @@
+"""Add transaction status index for the approval queue
+
+Revision ID: c5f2a8d61e94
+Revises: a8e5d3f1c920
+Create Date: 2026-10-18 21:24:37.184620
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5f2a8d61e94'
+down_revision = 'a8e5d3f1c920'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Serves WHERE status = 'pending' ORDER BY timestamp, id without scanning completed history
+    with op.batch_alter_table('transaction', schema=None) as batch_op:
+        batch_op.create_index('ix_transaction_status_timestamp', ['status', 'timestamp', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('transaction', schema=None) as batch_op:
+        batch_op.drop_index('ix_transaction_status_timestamp')
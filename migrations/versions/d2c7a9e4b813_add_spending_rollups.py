@@ -0,0 +1,37 @@
+"""Add spending rollups
+
+Revision ID: d2c7a9e4b813
+Revises: b6f0d83e1a52
+Create Date: 2026-10-18 19:05:37.118402
+
+Existing history is rolled up by `flask rebuild-spending-rollups`, which also
+reads the compressed archive.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2c7a9e4b813'
+down_revision = 'b6f0d83e1a52'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('spendingrollup',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('customer_id', sa.Integer(), nullable=False),
+    sa.Column('month', sa.String(length=7), nullable=False),
+    sa.Column('category', sa.String(length=50), nullable=False),
+    sa.Column('total', sa.Numeric(precision=12, scale=2), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['customer_id'], ['customer.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('customer_id', 'month', 'category', name='uq_spendingrollup_customer_month_category')
+    )
+
+
+def downgrade():
+    op.drop_table('spendingrollup')
@@ -0,0 +1,44 @@
+"""Add denormalized chat session summaries
+
+Revision ID: e7a3b5f20d18
+Revises: c41e0d9a7b36
+Create Date: 2026-10-18 13:58:26.913504
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7a3b5f20d18'
+down_revision = 'c41e0d9a7b36'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('chatsession', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('last_message_text', sa.String(length=200), nullable=True))
+        batch_op.add_column(sa.Column('last_message_at', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('unread_for_agents', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.create_index(batch_op.f('ix_chatsession_last_message_at'), ['last_message_at'], unique=False)
+
+    # Backfill from existing messages; sessions without any fall back to their start time
+    op.execute("""
+        UPDATE chatsession SET
+            last_message_at = COALESCE(
+                (SELECT MAX(m.timestamp) FROM chatmessage m WHERE m.session_id = chatsession.id),
+                chatsession.start_time),
+            last_message_text = (
+                SELECT SUBSTR(m.message_text, 1, 200) FROM chatmessage m
+                WHERE m.session_id = chatsession.id
+                ORDER BY m.timestamp DESC, m.id DESC LIMIT 1)
+    """)
+
+
+def downgrade():
+    with op.batch_alter_table('chatsession', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_chatsession_last_message_at'))
+        batch_op.drop_column('unread_for_agents')
+        batch_op.drop_column('last_message_at')
+        batch_op.drop_column('last_message_text')
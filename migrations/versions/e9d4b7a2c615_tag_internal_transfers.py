@@ -0,0 +1,128 @@
+"""Tag transfers between a customer's own accounts
+
+Revision ID: e9d4b7a2c615
+Revises: c5f2a8d61e94
+Create Date: 2026-10-18 22:37:15.402817
+
+Both legs of an internal transfer now carry the 'Internal Transfer' category, which
+spending rollups and financial health cash flow leave out. Existing rows, hot and
+archived, are recognised by pairing: a customer's "receive" is the other leg of their own
+"send" when the two have the same amount and were written within PAIR_WINDOW of each
+other, as the transfer flow writes both legs in one flush. Notes aren't consulted, since a
+customer named after an account type writes the same notes on external transfers.
+
+Rollups built before this revision still include internal sends; run
+`flask rebuild-spending-rollups` afterwards.
+
+"""
+import datetime
+import decimal
+import json
+import zlib
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e9d4b7a2c615'
+down_revision = 'c5f2a8d61e94'
+branch_labels = None
+depends_on = None
+
+INTERNAL_TRANSFER_CATEGORY = 'Internal Transfer'
+PAIR_WINDOW = datetime.timedelta(seconds=1)
+
+transaction = sa.table(
+    'transaction',
+    sa.column('id', sa.Integer), sa.column('customer_id', sa.Integer), sa.column('timestamp', sa.DateTime),
+    sa.column('type', sa.String), sa.column('amount', sa.Numeric(10, 2)), sa.column('category', sa.String)
+)
+transactionarchive = sa.table(
+    'transactionarchive',
+    sa.column('id', sa.Integer), sa.column('customer_id', sa.Integer), sa.column('payload', sa.LargeBinary)
+)
+
+
+def _pair_internal_legs(legs):
+    """
+    Takes one customer's (key, type, amount, timestamp, id) send and receive legs and returns
+    the keys of those pairing up as internal transfers. Each receive takes the unpaired send
+    of the same amount inside PAIR_WINDOW that is closest to it by id.
+    """
+    sends = {}
+    for leg in legs:
+        if leg[1] == 'send':
+            sends.setdefault(leg[2], []).append(leg)
+    paired = set()
+    for key, type_, amount, timestamp, id_ in legs:
+        if type_ != 'receive':
+            continue
+        candidates = [send for send in sends.get(amount, ())
+                      if send[0] not in paired and abs(send[3] - timestamp) <= PAIR_WINDOW]
+        if candidates:
+            send = min(candidates, key=lambda send: abs(send[4] - id_))
+            paired.update((key, send[0]))
+    return paired
+
+
+def _tag(bind):
+    """Tags paired legs, one customer at a time; legs may be split between the hot table and the archive."""
+    uncategorized = sa.func.coalesce(transaction.c.category, 'Uncategorized') == 'Uncategorized'
+    legs_filter = (transaction.c.type.in_(('send', 'receive')), uncategorized)
+    customer_ids = sorted(set(bind.execute(sa.select(transaction.c.customer_id).where(*legs_filter).distinct()).scalars())
+                          | set(bind.execute(sa.select(transactionarchive.c.customer_id).distinct()).scalars()))
+    for customer_id in customer_ids:
+        legs = [(('hot', row.id), row.type, decimal.Decimal(row.amount), row.timestamp, row.id)
+                for row in bind.execute(sa.select(transaction.c.id, transaction.c.type, transaction.c.amount, transaction.c.timestamp)
+                                        .where(transaction.c.customer_id == customer_id, *legs_filter))]
+        # Archived rows: [id, timestamp, type, account_type, amount, notes, status, category, is_read]
+        segments = {}
+        for segment_id, payload in bind.execute(sa.select(transactionarchive.c.id, transactionarchive.c.payload)
+                                                .where(transactionarchive.c.customer_id == customer_id)):
+            segments[segment_id] = json.loads(zlib.decompress(payload))
+            legs += [(('archive', segment_id, index), row[2], decimal.Decimal(row[4]), datetime.datetime.fromisoformat(row[1]), row[0])
+                     for index, row in enumerate(segments[segment_id])
+                     if row[2] in ('send', 'receive') and (row[7] or 'Uncategorized') == 'Uncategorized']
+
+        ids, changed = [], set()
+        for key in _pair_internal_legs(legs):
+            if key[0] == 'hot':
+                ids.append(key[1])
+            else:
+                segments[key[1]][key[2]][7] = INTERNAL_TRANSFER_CATEGORY
+                changed.add(key[1])
+        for start in range(0, len(ids), 500):
+            bind.execute(transaction.update().where(transaction.c.id.in_(ids[start:start + 500]))
+                         .values(category=INTERNAL_TRANSFER_CATEGORY))
+        for segment_id in changed:
+            bind.execute(transactionarchive.update().where(transactionarchive.c.id == segment_id).values(
+                payload=zlib.compress(json.dumps(segments[segment_id], separators=(',', ':')).encode())
+            ))
+
+
+def _untag(bind):
+    """Moves every tagged leg, hot and archived, back to 'Uncategorized'."""
+    bind.execute(transaction.update().where(transaction.c.category == INTERNAL_TRANSFER_CATEGORY)
+                 .values(category='Uncategorized'))
+    # One segment in memory at a time
+    for segment_id in bind.execute(sa.select(transactionarchive.c.id)).scalars().all():
+        payload = bind.execute(sa.select(transactionarchive.c.payload).where(transactionarchive.c.id == segment_id)).scalar()
+        archived = json.loads(zlib.decompress(payload))
+        changed = False
+        for row in archived:
+            if row[7] == INTERNAL_TRANSFER_CATEGORY:
+                row[7] = 'Uncategorized'
+                changed = True
+        if changed:
+            bind.execute(transactionarchive.update().where(transactionarchive.c.id == segment_id).values(
+                payload=zlib.compress(json.dumps(archived, separators=(',', ':')).encode())
+            ))
+
+
+def upgrade():
+    _tag(op.get_bind())
+
+
+def downgrade():
+    _untag(op.get_bind())
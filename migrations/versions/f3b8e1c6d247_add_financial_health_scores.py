@@ -0,0 +1,37 @@
+"""Add financial health scores
+
+Revision ID: f3b8e1c6d247
+Revises: d2c7a9e4b813
+Create Date: 2026-10-18 20:12:48.530917
+
+Scores are filled in by `flask score-financial-health`; until then the endpoint
+scores a customer on first request.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3b8e1c6d247'
+down_revision = 'd2c7a9e4b813'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('financialhealthscore',
+    sa.Column('customer_id', sa.Integer(), nullable=False),
+    sa.Column('score', sa.Integer(), nullable=False),
+    sa.Column('previous_score', sa.Integer(), nullable=True),
+    sa.Column('balance_score', sa.Float(), nullable=False),
+    sa.Column('cash_flow_score', sa.Float(), nullable=False),
+    sa.Column('stability_score', sa.Float(), nullable=False),
+    sa.Column('computed_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['customer_id'], ['customer.id'], ),
+    sa.PrimaryKeyConstraint('customer_id')
+    )
+
+
+def downgrade():
+    op.drop_table('financialhealthscore')
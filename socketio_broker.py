@@ -0,0 +1,120 @@
+"""
+Local Socket.IO scale-out for several gevent workers on one host: a client manager that
+relays pub/sub traffic over a Unix socket, and the broker that fans it out. Selected by
+SOCKETIO_MESSAGE_QUEUE=unix://<path>; the broker runs as `flask socketio-broker`.
+"""
+
+import os
+import socket
+import struct
+import threading
+from urllib.parse import urlparse
+
+import gevent
+from gevent.queue import Queue
+from socketio import PubSubManager
+
+
+class UnixSocketManager(PubSubManager):
+    """
+    Socket.IO client manager that relays pub/sub traffic through the broker started
+    with `flask socketio-broker`, so several gevent workers on one host can share rooms
+    without a Redis server. Frames are length-prefixed JSON; the first byte of each
+    connection tells the broker whether it publishes ('P') or subscribes ('S').
+    """
+    name = 'unix'
+
+    def __init__(self, url, channel='socketio', write_only=False, logger=None, json=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger, json=json)
+        self.path = urlparse(url).path
+        self._publisher = None
+        self._publish_lock = threading.Lock()
+
+    def _connect(self, role):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(self.path)
+        sock.sendall(role)
+        return sock
+
+    def _publish(self, data):
+        payload = self.json.dumps(data).encode('utf-8')
+        frame = struct.pack('!I', len(payload)) + payload
+        with self._publish_lock:
+            for attempt in range(2):
+                try:
+                    if self._publisher is None:
+                        self._publisher = self._connect(b'P')
+                    self._publisher.sendall(frame)
+                    return
+                except OSError:
+                    self._publisher = None
+                    if attempt:
+                        raise
+
+    def _listen(self):
+        while True:
+            try:
+                sock = self._connect(b'S')
+            except OSError:
+                self._get_logger().error('Cannot reach Socket.IO broker at %s, retrying', self.path)
+                gevent.sleep(1)
+                continue
+            reader = sock.makefile('rb')
+            try:
+                while True:
+                    header = reader.read(4)
+                    if len(header) < 4:
+                        break
+                    yield reader.read(struct.unpack('!I', header)[0])
+            finally:
+                reader.close()
+                sock.close()
+            self._get_logger().error('Socket.IO broker connection lost, reconnecting')
+
+
+def run_socketio_broker(path):
+    """Fans every frame a publisher sends out to all subscribers, including the sender's own worker."""
+    from gevent.server import StreamServer
+
+    if os.path.exists(path):
+        os.unlink(path)
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(path)
+    listener.listen(128)
+    subscribers = {}  # connection -> outbound frame queue, drained by that subscriber's writer
+
+    def write_frames(conn, outbound):
+        try:
+            while True:
+                conn.sendall(outbound.get())
+        except OSError:
+            conn.close()
+
+    def handle(conn, address):
+        role = conn.recv(1)
+        if role == b'S':
+            outbound = Queue()
+            subscribers[conn] = outbound
+            writer = gevent.spawn(write_frames, conn, outbound)
+            try:
+                while conn.recv(1):  # subscribers never write; this just waits for the close
+                    pass
+            except OSError:
+                pass
+            finally:
+                subscribers.pop(conn, None)
+                writer.kill()
+            return
+        reader = conn.makefile('rb')
+        try:
+            while True:
+                header = reader.read(4)
+                if len(header) < 4:
+                    break
+                frame = header + reader.read(struct.unpack('!I', header)[0])
+                for outbound in list(subscribers.values()):
+                    outbound.put(frame)
+        finally:
+            reader.close()
+
+    StreamServer(listener, handle).serve_forever()
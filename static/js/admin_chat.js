@@ -9,6 +9,8 @@ class AdminChatDashboard {
         this.socket = null;
         this.activeSessionId = null;
         this.activeCustomerId = null;
+        this.historyCursor = null; // cursor for the next page of older messages
+        this.loadingOlder = false;
         this.isConnected = false;
         this.isMobile = window.innerWidth <= 992;
 
@@ -29,6 +31,8 @@ class AdminChatDashboard {
         // Chat elements
         this.messagesContainer = document.querySelector('.messages-scroll-area');
         this.customerNameEl = document.getElementById('activeCustomerName');
+        this.customerStatusEl = document.getElementById('activeCustomerStatus');
+        this.agentsOnlineEl = document.getElementById('agentsOnline');
         this.chatInput = document.getElementById('chatInput');
         this.chatForm = document.getElementById('chatInputForm');
         this.sendBtn = document.getElementById('chatSendBtn');
@@ -154,6 +158,19 @@ class AdminChatDashboard {
             }
         });
 
+        // Load older messages when scrolled to the top
+        if (this.messagesContainer) {
+            this.messagesContainer.addEventListener('scroll', () => {
+                if (this.messagesContainer.scrollTop < 40 && this.historyCursor && !this.loadingOlder && this.isConnected) {
+                    this.loadingOlder = true;
+                    this.socket.emit('request_history', {
+                        session_id: this.activeSessionId,
+                        before: this.historyCursor
+                    });
+                }
+            });
+        }
+
         // Window resize handling
         window.addEventListener('resize', () => {
             this.handleResize();
@@ -162,7 +179,7 @@ class AdminChatDashboard {
 
     createNewConversationElement(data) {
         const conversationItem = document.createElement('div');
-        conversationItem.className = 'conversation-item';
+        conversationItem.className = 'conversation-item online';
         conversationItem.dataset.sessionId = data.session_id;
         conversationItem.dataset.customerId = data.customer_id;
 
@@ -185,7 +202,7 @@ class AdminChatDashboard {
 
     connectSocket() {
         try {
-            this.socket = io();
+            this.socket = io(window.SOCKET_OPTIONS || {});
 
             this.socket.on('connect', () => {
                 console.log('💬 Admin connected to chat server');
@@ -200,9 +217,19 @@ class AdminChatDashboard {
             });
 
             this.socket.on('chat_history', (data) => {
-                this.renderChatHistory(data.history);
+                // Ignore late responses for a conversation that is no longer open
+                if (data.session_id != this.activeSessionId) return;
+                this.historyCursor = data.next_cursor;
+                if (data.older) {
+                    this.prependChatHistory(data.history);
+                    this.loadingOlder = false;
+                } else {
+                    this.renderChatHistory(data.history);
+                }
             });
 
+            this.socket.on('presence_update', (data) => this.applyPresence(data));
+
             this.socket.on('receive_message', (data) => {
                 // Ignore messages sent by other agents for now
                 if (data.sender_type === 'agent') return;
@@ -218,9 +245,12 @@ class AdminChatDashboard {
                     } else {
                         this.showNotificationDot(data.session_id);
                     }
-                    // Optional: Update preview message
+                    // Update the preview and move the conversation to the top (most recent activity)
                     const preview = sessionElement.querySelector('.conversation-preview');
                     if(preview) preview.textContent = data.message;
+                    const time = sessionElement.querySelector('.conversation-time');
+                    if (time) time.textContent = data.timestamp;
+                    this.sessionList.prepend(sessionElement);
                 } else {
                     // This is a brand new conversation
                     const newConversation = this.createNewConversationElement(data);
@@ -283,6 +313,8 @@ class AdminChatDashboard {
         // Get session data
         this.activeSessionId = conversationElement.dataset.sessionId;
         this.activeCustomerId = conversationElement.dataset.customerId;
+        this.historyCursor = null;
+        this.loadingOlder = false;
 
         // Hide notification dot
         const notificationDot = conversationElement.querySelector('.notification-dot');
@@ -293,6 +325,7 @@ class AdminChatDashboard {
         // Update UI
         this.showActiveScreen();
         this.updateCustomerName(conversationElement.querySelector('.conversation-name').textContent);
+        this.updateCustomerStatus(conversationElement.classList.contains('online'));
 
         // Load chat history
         if (this.socket && this.isConnected) {
@@ -339,6 +372,25 @@ class AdminChatDashboard {
         }
     }
 
+    updateCustomerStatus(online) {
+        if (this.customerStatusEl) {
+            this.customerStatusEl.textContent = online ? 'Online' : 'Offline';
+            this.customerStatusEl.classList.toggle('online', online);
+        }
+    }
+
+    applyPresence(data) {
+        // Deltas only name users whose online state changed since the last update
+        const setOnline = (customerId, online) => {
+            this.sessionList.querySelectorAll(`[data-customer-id="${customerId}"]`)
+                .forEach(item => item.classList.toggle('online', online));
+            if (this.activeCustomerId == customerId) this.updateCustomerStatus(online);
+        };
+        data.online.forEach(id => setOnline(id, true));
+        data.offline.forEach(id => setOnline(id, false));
+        if (this.agentsOnlineEl) this.agentsOnlineEl.textContent = data.agents_online;
+    }
+
     renderChatHistory(history) {
         if (!this.messagesContainer) return;
 
@@ -354,9 +406,27 @@ class AdminChatDashboard {
         });
     }
 
+    prependChatHistory(history) {
+        if (!this.messagesContainer) return;
+
+        // Keep the viewport anchored on the message the agent was looking at
+        const previousHeight = this.messagesContainer.scrollHeight;
+        const fragment = document.createDocumentFragment();
+        history.forEach(msg => {
+            fragment.appendChild(this.buildMessage(msg.message_text, msg.sender_type, msg.timestamp));
+        });
+        this.messagesContainer.insertBefore(fragment, this.messagesContainer.firstChild);
+        this.messagesContainer.scrollTop += this.messagesContainer.scrollHeight - previousHeight;
+    }
+
     addMessage(content, senderType, timestamp = null) {
         if (!this.messagesContainer) return;
 
+        this.messagesContainer.appendChild(this.buildMessage(content, senderType, timestamp));
+        this.scrollToBottom();
+    }
+
+    buildMessage(content, senderType, timestamp = null) {
         const messageEl = document.createElement('div');
         messageEl.className = `chat-message ${senderType}`;
 
@@ -370,9 +440,7 @@ class AdminChatDashboard {
 
         messageEl.appendChild(bubbleEl);
         messageEl.appendChild(timestampEl);
-
-        this.messagesContainer.appendChild(messageEl);
-        this.scrollToBottom();
+        return messageEl;
     }
 
     addSystemMessage(content) {
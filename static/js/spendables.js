@@ -28,6 +28,16 @@ const App = {
     // Any other initializers can be added here
   },
 
+  /**
+   * One Socket.IO connection per page, shared by the chat widget and the notification panel.
+   */
+  socket() {
+    if (!this._socket && typeof io !== "undefined") {
+      this._socket = io(window.SOCKET_OPTIONS || {});
+    }
+    return this._socket;
+  },
+
   deactivatedDashboardHandler() {
     const dashboard = document.querySelector('.deactivated-dashboard');
     if (!dashboard) return;
@@ -101,9 +111,12 @@ liveChat() {
     let socket = null;
     let isConnected = false;
     let isOpen = false;
+    let historyLoaded = false;
+    let historyCursor = null; // cursor for the next page of older messages
+    let loadingOlder = false;
 
     try {
-        socket = io();
+        socket = App.socket();
 
         socket.on('connect', () => {
             console.log('💬 Customer connected to chat server');
@@ -124,13 +137,16 @@ liveChat() {
             }
         });
 
-        let historyLoaded = false; // <-- ADD THIS FLAG
-
         socket.on('chat_history', (data) => {
-            if (!historyLoaded) {
+            if (data.older) {
+                prependHistory(data.history);
+                historyCursor = data.next_cursor;
+                loadingOlder = false;
+            } else if (!historyLoaded) {
                 data.history.forEach(msg => {
                     addMessage(msg.message_text, msg.sender_type, msg.timestamp);
                 });
+                historyCursor = data.next_cursor;
                 historyLoaded = true;
             }
         });
@@ -154,6 +170,14 @@ liveChat() {
         }
     });
 
+    // Load older messages when scrolled to the top
+    messages.addEventListener('scroll', () => {
+        if (messages.scrollTop < 40 && historyCursor && !loadingOlder && isConnected) {
+            loadingOlder = true;
+            socket.emit('request_history', { before: historyCursor });
+        }
+    });
+
     // Auto-resize textarea
     input.addEventListener('input', () => {
         input.style.height = 'auto';
@@ -220,6 +244,22 @@ liveChat() {
     }
 
     function addMessage(content, type, timestamp = null) {
+        messages.appendChild(buildMessage(content, type, timestamp));
+        scrollToBottom();
+    }
+
+    function prependHistory(history) {
+        // Keep the viewport anchored on the message the user was looking at
+        const previousHeight = messages.scrollHeight;
+        const fragment = document.createDocumentFragment();
+        history.forEach(msg => {
+            fragment.appendChild(buildMessage(msg.message_text, msg.sender_type, msg.timestamp));
+        });
+        messages.insertBefore(fragment, messages.firstChild);
+        messages.scrollTop += messages.scrollHeight - previousHeight;
+    }
+
+    function buildMessage(content, type, timestamp = null) {
         const message = document.createElement('div');
         message.className = `message ${type}`;
 
@@ -233,9 +273,7 @@ liveChat() {
 
         message.appendChild(messageContent);
         message.appendChild(messageTime);
-
-        messages.appendChild(message);
-        scrollToBottom();
+        return message;
     }
 
     function addSystemMessage(content) {
@@ -422,17 +460,19 @@ liveChat() {
   },
 
   /**
-   * Handles marking notifications as read when the panel is opened.
+   * Handles marking notifications as read when the panel is opened, and
+   * adds notifications pushed by the server to the open page.
    */
   notificationHandler() {
-    const trigger = document.getElementById("notifications-panel-trigger");
-    if (!trigger) return;
+    // The mobile and desktop headers each have a trigger with this id
+    const triggers = document.querySelectorAll("#notifications-panel-trigger");
+    if (!triggers.length) return;
 
-    trigger.addEventListener("click", () => {
-      const dot = trigger.querySelector(".notification-dot");
-      if (dot) {
+    triggers.forEach((trigger) => trigger.addEventListener("click", () => {
+      const dots = document.querySelectorAll("#notifications-panel-trigger .notification-dot");
+      if (dots.length) {
         // Optimistically remove the dot from the UI
-        dot.style.display = "none";
+        dots.forEach((dot) => dot.remove());
 
         // Call the API in the background to mark as read
         const csrfToken = document.querySelector(
@@ -446,8 +486,90 @@ liveChat() {
           // If it fails, maybe show the dot again? For now, we just log.
         });
       }
+    }));
+
+    const socket = this.socket();
+    const panel = document.querySelector("#notifications-panel .panel-content");
+    if (!socket || !panel) return;
+
+    socket.on("notifications", (data) => {
+      let list = panel.querySelector(".list");
+      if (!list) {
+        panel.innerHTML = "";
+        list = document.createElement("div");
+        list.className = "list";
+        panel.appendChild(list);
+      }
+      data.items.forEach((n) => {
+        const item = this.renderNotification(n);
+        // A status change (e.g. an approved deposit) replaces the entry it updates
+        const existing = n.id !== null && list.querySelector(`[data-notification-id="${n.id}"]`);
+        if (existing) {
+          existing.replaceWith(item);
+        } else {
+          list.prepend(item);
+        }
+      });
+      // Keep the panel at the server-rendered feed length (NOTIFICATION_FEED_SIZE)
+      const items = list.querySelectorAll(".list-item[data-notification-id]");
+      for (let i = 10; i < items.length; i++) items[i].remove();
+
+      document.querySelectorAll(".header-icon-group-desktop #notifications-panel-trigger").forEach((trigger) => {
+        if (!trigger.querySelector(".notification-dot")) {
+          const dot = document.createElement("span");
+          dot.className = "notification-dot";
+          trigger.appendChild(dot);
+        }
+      });
     });
   },
+
+  /**
+   * Builds one notification panel entry, mirroring the markup in base.html.
+   */
+  renderNotification(n) {
+    const isCredit = ["receive", "admin_deposit"].includes(n.type);
+    const isSystem = ["welcome_message", "admin_message"].includes(n.type);
+
+    const item = document.createElement("div");
+    item.className = "list-item";
+    item.dataset.notificationId = n.id === null ? "" : n.id;
+
+    const icon = document.createElement("div");
+    icon.className = `list-item-icon ${isCredit ? "icon-credit" : isSystem ? "icon-info" : "icon-debit"}`;
+    icon.innerHTML = `<i class="fas ${isCredit ? "fa-arrow-down" : isSystem ? "fa-info-circle" : "fa-arrow-up"}"></i>`;
+    item.appendChild(icon);
+
+    const content = document.createElement("div");
+    content.className = "list-item-content";
+    const title = document.createElement("span");
+    title.className = "list-item-title";
+    if (n.type === "admin_message") {
+      title.textContent = "A Message from Support";
+      const text = document.createElement("p");
+      text.className = "list-item-text";
+      text.textContent = n.notes;
+      content.append(title, text);
+    } else {
+      title.textContent = n.type.replace(/_/g, " ").replace(/\b\w/g, (c) => c.toUpperCase());
+      const subtitle = document.createElement("span");
+      subtitle.className = "list-item-subtitle";
+      // Timestamps are naive UTC, rendered like the server does
+      const when = new Date(n.timestamp + "Z");
+      const options = { timeZone: "UTC" };
+      subtitle.textContent = `${when.toLocaleDateString("en-US", { ...options, month: "short", day: "2-digit" })} at ${when.toLocaleTimeString("en-US", { ...options, hour: "2-digit", minute: "2-digit" })}`;
+      content.append(title, subtitle);
+    }
+    item.appendChild(content);
+
+    if (!isSystem) {
+      const value = document.createElement("div");
+      value.className = `list-item-value ${isCredit ? "value-credit" : "value-debit"}`;
+      value.textContent = `${isCredit ? "+" : "-"}$${n.amount}`;
+      item.appendChild(value);
+    }
+    return item;
+  },
 };
 
 // Start the application once the DOM is ready
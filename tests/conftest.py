@@ -0,0 +1,99 @@
+import os
+import sys
+import tempfile
+import uuid
+
+import pytest
+
+# The app reads its configuration at import time, so point it at a throwaway database first
+_db_dir = tempfile.mkdtemp(prefix='spendables-tests-')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_db_dir, 'test.db')
+os.environ['TRANSACTION_ARCHIVE_INTERVAL'] = '0'
+os.environ['PASSWORD_HASH_WORKERS'] = '0'
+os.environ.pop('SOCKETIO_MESSAGE_QUEUE', None)
+os.environ.pop('FLASK_ENV', None)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import app as bank  # noqa: E402
+from flask_migrate import upgrade  # noqa: E402
+
+MIGRATIONS = os.path.join(ROOT, 'migrations')
+
+
+@pytest.fixture(scope='session', autouse=True)
+def schema():
+    # ASSETS_DEBUG links the source files instead of building bundles into static/
+    bank.app.config.update(TESTING=True, WTF_CSRF_ENABLED=False, ASSETS_DEBUG=True)
+    with bank.app.app_context():
+        upgrade(directory=MIGRATIONS)
+    yield
+
+
+@pytest.fixture(autouse=True)
+def fresh_caches():
+    yield
+    for cache in (bank.identity_cache, bank.recipient_cache, bank.notification_cache):
+        cache.clear()
+
+
+@pytest.fixture
+def client():
+    # Requests push their own app context, so each one gets its own session and `g`
+    return bank.app.test_client()
+
+
+@pytest.fixture
+def make_customer():
+    """Creates a customer with one account per (type, balance) pair and returns (customer_id, {type: account_id})."""
+    def make(*accounts, is_admin=False):
+        with bank.app.app_context():
+            customer = bank.Customer(username=f"test-{uuid.uuid4().hex[:12]}", password_hash='!', is_admin=is_admin)
+            bank.db.session.add(customer)
+            bank.db.session.flush()
+            rows = {account_type: bank.Account(account_type=account_type, balance=balance, customer_id=customer.id)
+                    for account_type, balance in accounts}
+            bank.db.session.add_all(rows.values())
+            bank.db.session.commit()
+            return customer.id, {account_type: account.id for account_type, account in rows.items()}
+    return make
+
+
+@pytest.fixture
+def login(client):
+    """Signs the test client in as a customer by writing Flask-Login's session keys."""
+    def sign_in(customer_id):
+        with client.session_transaction() as flask_session:
+            flask_session['_user_id'] = str(customer_id)
+            flask_session['_fresh'] = True
+    return sign_in
+
+
+@pytest.fixture
+def balance_of():
+    def read(account_id):
+        with bank.app.app_context():
+            return bank.db.session.get(bank.Account, account_id).balance
+    return read
+
+
+@pytest.fixture
+def account_number_of():
+    def read(customer_id):
+        with bank.app.app_context():
+            return bank.db.session.get(bank.Customer, customer_id).account_number
+    return read
+
+
+@pytest.fixture
+def send_money(client):
+    """Runs an external transfer through both steps of the web flow; returns the confirm response."""
+    def send(from_account_id, account_number, amount, memo=''):
+        response = client.post('/transfer', data={
+            'transfer_type': 'external', 'from_account': from_account_id,
+            'recipient_account_number': account_number, 'amount': amount, 'memo': memo
+        })
+        assert response.status_code == 302, response.get_data(as_text=True)
+        return client.post('/transfer/confirm')
+    return send
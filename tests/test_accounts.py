@@ -0,0 +1,56 @@
+import uuid
+
+import pytest
+
+import app as bank
+
+
+@pytest.fixture
+def allocator(monkeypatch):
+    """The shared allocator with an empty pool and one-number blocks, so every customer reserves."""
+    monkeypatch.setattr(bank.account_number_allocator, 'block_size', 1)
+    monkeypatch.setattr(bank.account_number_allocator, '_numbers', [])
+    return bank.account_number_allocator
+
+
+def _customer():
+    return bank.Customer(username=f"test-{uuid.uuid4().hex[:12]}", password_hash='!')
+
+
+def _next_position():
+    with bank.app.app_context():
+        return bank.db.session.get(bank.AccountNumberSequence, 1).next_position
+
+
+def test_accounts_created_inside_one_open_write_transaction(allocator):
+    with bank.app.app_context():
+        first = _customer()
+        bank.db.session.add(first)
+        bank.db.session.flush()  # this transaction now holds SQLite's write lock
+        second = _customer()
+        bank.db.session.add(second)
+        bank.db.session.flush()
+        bank.db.session.commit()
+        numbers = {first.account_number, second.account_number}
+    assert len(numbers) == 2 and all(len(n) == 10 for n in numbers)
+
+
+def test_rolled_back_reservation_is_not_reused_across_sessions(allocator, monkeypatch):
+    monkeypatch.setattr(allocator, 'block_size', 5)
+    position = _next_position()
+    with bank.app.app_context():
+        bank.db.session.add(_customer())
+        bank.db.session.flush()
+        bank.db.session.rollback()
+    # The claim went with the transaction, and so did its block
+    assert _next_position() == position
+    assert allocator._numbers == []
+
+    with bank.app.app_context():
+        customer = _customer()
+        bank.db.session.add(customer)
+        bank.db.session.commit()
+        number = customer.account_number
+    # Committed: the rest of the block is free for any session
+    assert _next_position() == position + 5
+    assert len(allocator._numbers) == 4 and number not in allocator._numbers
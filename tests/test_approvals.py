@@ -0,0 +1,107 @@
+import datetime
+
+import app as bank
+
+
+def _pending(customer_id, *deposits, start=datetime.datetime(2025, 3, 1)):
+    """Queues admin deposits as (account_type, amount); returns their ids in queue order."""
+    with bank.app.app_context():
+        rows = [bank.Transaction(customer_id=customer_id, type='admin_deposit', account_type=account_type, amount=amount,
+                                 notes='Manual Deposit by Bank Staff', status='pending',
+                                 timestamp=start + datetime.timedelta(minutes=i))
+                for i, (account_type, amount) in enumerate(deposits)]
+        bank.db.session.add_all(rows)
+        bank.db.session.commit()
+        return [row.id for row in rows]
+
+
+def _statuses(ids):
+    with bank.app.app_context():
+        return {t.id: t.status for t in bank.Transaction.query.filter(bank.Transaction.id.in_(ids))}
+
+
+def _accounts(customer_id):
+    with bank.app.app_context():
+        return {a.account_type: a.balance for a in bank.Account.query.filter_by(customer_id=customer_id)}
+
+
+def test_approval_credits_summed_amounts_and_opens_missing_accounts(make_customer):
+    customer_id, _ = make_customer(('Checking', 10))
+    ids = _pending(customer_id, ('Checking', 5), ('Checking', 7), ('Savings', 20))
+
+    with bank.app.app_context():
+        assert bank.approve_pending_transactions(ids) == 3
+
+    assert _accounts(customer_id) == {'Checking': 22, 'Savings': 20}
+    assert set(_statuses(ids).values()) == {'completed'}
+
+
+def test_approval_that_opens_a_checking_account_invalidates_the_cached_recipient(make_customer, account_number_of):
+    customer_id, _ = make_customer(('Savings', 0))
+    account_number = account_number_of(customer_id)
+    ids = _pending(customer_id, ('Checking', 5))
+
+    with bank.app.app_context():
+        assert bank.resolve_recipient(account_number).checking_account_id is None
+        assert bank.approve_pending_transactions(ids) == 1
+        assert bank.recipient_cache.get(account_number) is None
+        assert bank.resolve_recipient(account_number).checking_account_id is not None
+
+
+def test_approval_skips_ids_that_are_no_longer_pending(make_customer):
+    customer_id, accounts = make_customer(('Checking', 0))
+    first, second = _pending(customer_id, ('Checking', 5), ('Checking', 7))
+    with bank.app.app_context():
+        assert bank.approve_pending_transactions([first]) == 1
+        # Approving again, or approving an id that doesn't exist, credits nothing twice
+        assert bank.approve_pending_transactions([first, second, 0]) == 1
+        assert bank.approve_pending_transactions([first, second]) == 0
+
+    assert _accounts(customer_id) == {'Checking': 12}
+
+
+def test_bulk_approval_route(client, login, make_customer):
+    admin_id, _ = make_customer(is_admin=True)
+    customer_id, _ = make_customer(('Checking', 0))
+    ids = _pending(customer_id, ('Checking', 5), ('Checking', 7), ('Checking', 9))
+    login(admin_id)
+
+    response = client.post('/admin/approve_transactions', data={'transaction_ids': ids[:2]}, follow_redirects=True)
+    assert b'Approved 2 transaction(s).' in response.data
+    response = client.post('/admin/approve_transactions', data={'transaction_ids': ids}, follow_redirects=True)
+    assert b'Approved 1 transaction(s). 2 were no longer pending.' in response.data
+
+    assert _accounts(customer_id) == {'Checking': 21}
+    assert set(_statuses(ids).values()) == {'completed'}
+
+
+def test_bulk_approval_route_is_admin_only(client, login, make_customer):
+    customer_id, _ = make_customer(('Checking', 0))
+    ids = _pending(customer_id, ('Checking', 5))
+    login(customer_id)
+
+    response = client.post('/admin/approve_transactions', data={'transaction_ids': ids})
+    assert response.status_code == 302
+    assert _statuses(ids) == {ids[0]: 'pending'}
+
+
+def test_pending_queue_pages_oldest_first(make_customer):
+    customer_id, _ = make_customer(('Checking', 0))
+    # Same timestamp throughout, so only the id orders the queue
+    ids = _pending(customer_id, *[('Checking', 1)] * 5, start=datetime.datetime(2000, 1, 1))
+    with bank.app.app_context():
+        bank.db.session.execute(bank.update(bank.Transaction).where(bank.Transaction.id.in_(ids))
+                                .values(timestamp=datetime.datetime(2000, 1, 1)))
+        bank.db.session.commit()
+
+        seen, cursor = [], None
+        while True:
+            rows, next_cursor = bank.get_pending_page(cursor and bank.decode_history_cursor(cursor), limit=2)
+            seen += [(transaction.id, username) for transaction, username in rows]
+            if not next_cursor:
+                break
+            cursor = next_cursor
+        username = bank.db.session.get(bank.Customer, customer_id).username
+
+    assert [entry for entry in seen if entry[0] in ids] == [(transaction_id, username) for transaction_id in ids]
+    assert len(seen) == len(set(seen))
@@ -0,0 +1,117 @@
+import datetime
+
+import pytest
+
+import app as bank
+
+
+def _seed_history(customer_id, count, start=None):
+    start = start or datetime.datetime(2025, 1, 1)
+    with bank.app.app_context():
+        bank.db.session.execute(bank.insert(bank.Transaction), [{
+            'customer_id': customer_id, 'type': 'receive', 'account_type': 'Checking', 'amount': i + 1,
+            'notes': f"row {i}", 'status': 'completed', 'category': 'Uncategorized', 'is_read': False,
+            'timestamp': start + datetime.timedelta(hours=i)
+        } for i in range(count)])
+        bank.db.session.commit()
+
+
+def _history(customer_id):
+    with bank.app.app_context():
+        return [(t.id, t.timestamp, t.type, t.amount, t.notes, t.status, t.category)
+                for t in bank.iter_transaction_history(customer_id)]
+
+
+def _segments(customer_id):
+    with bank.app.app_context():
+        return [(s.row_count, [t.id for t in bank._unpack_segment(customer_id, s.payload)])
+                for s in bank.TransactionArchive.query.filter_by(customer_id=customer_id).order_by(bank.TransactionArchive.id)]
+
+
+def _archive(customer_id):
+    with bank.app.app_context():
+        return bank.archive_old_transactions([customer_id])
+
+
+def test_archiving_keeps_the_full_history_readable(client, login, make_customer):
+    customer_id, _ = make_customer(('Checking', 0))
+    _seed_history(customer_id, 60)
+    before = _history(customer_id)
+
+    assert _archive(customer_id) == 60 - bank.MAX_COMPLETED_TRANSACTIONS_TO_KEEP
+    assert _history(customer_id) == before
+    with bank.app.app_context():
+        assert bank.Transaction.query.filter_by(customer_id=customer_id).count() == bank.MAX_COMPLETED_TRANSACTIONS_TO_KEEP
+
+    # The paged API walks across the hot/archive boundary without gaps or repeats
+    login(customer_id)
+    ids, cursor = [], None
+    while True:
+        page = client.get('/api/transactions', query_string={'limit': 7, **({'before': cursor} if cursor else {})}).get_json()
+        ids += [t['id'] for t in page['transactions']]
+        cursor = page['next_cursor']
+        if not cursor:
+            break
+    assert ids == [row[0] for row in before]
+
+
+def test_later_sweeps_top_up_the_newest_segment(make_customer, monkeypatch):
+    customer_id, _ = make_customer(('Checking', 0))
+    _seed_history(customer_id, 40)
+    _archive(customer_id)
+    assert [count for count, _ in _segments(customer_id)] == [15]
+
+    _seed_history(customer_id, 10, start=datetime.datetime(2025, 6, 1))
+    assert _archive(customer_id) == 10
+    assert [count for count, _ in _segments(customer_id)] == [25]
+
+    monkeypatch.setattr(bank, 'ARCHIVE_SEGMENT_ROWS', 30)
+    before = _history(customer_id)
+    _seed_history(customer_id, 20, start=datetime.datetime(2025, 9, 1))
+    assert _archive(customer_id) == 20
+    # The partial segment fills up with the oldest rows, the overflow starts a new one
+    assert [count for count, _ in _segments(customer_id)] == [30, 15]
+    assert _history(customer_id)[20:] == before
+
+
+def test_segments_cover_disjoint_time_ranges(make_customer, monkeypatch):
+    monkeypatch.setattr(bank, 'ARCHIVE_SEGMENT_ROWS', 10)
+    customer_id, _ = make_customer(('Checking', 0))
+    _seed_history(customer_id, 50)
+    before = _history(customer_id)
+    assert _archive(customer_id) == 25
+    _seed_history(customer_id, 7, start=datetime.datetime(2025, 6, 1))
+    assert _archive(customer_id) == 7
+
+    with bank.app.app_context():
+        segments = [(s.first_timestamp, s.last_timestamp, s.row_count) for s in bank.TransactionArchive.query.filter_by(
+            customer_id=customer_id).order_by(bank.TransactionArchive.last_timestamp)]
+    # Only the newest segment is partial, and each segment starts after the previous one ends
+    assert [count for _, _, count in segments] == [10, 10, 10, 2]
+    assert all(earlier[1] < later[0] for earlier, later in zip(segments, segments[1:]))
+    assert _history(customer_id)[7:] == before
+
+
+def test_overlapping_sweeps_archive_each_row_once(make_customer, monkeypatch):
+    customer_id, _ = make_customer(('Checking', 0))
+    _seed_history(customer_id, 60)
+    before = _history(customer_id)
+
+    # Another worker's sweep runs to completion after this one picked its rows but before it claims them
+    claim = bank._claim_for_archive
+    calls = []
+
+    def racing_claim(transaction_ids):
+        if not calls:
+            calls.append(transaction_ids)
+            with bank.app.app_context():
+                calls.append(bank.archive_old_transactions([customer_id]))
+        return claim(transaction_ids)
+
+    monkeypatch.setattr(bank, '_claim_for_archive', racing_claim)
+    assert _archive(customer_id) == 0
+    assert calls[1] == 35
+
+    archived_ids = [tid for _, ids in _segments(customer_id) for tid in ids]
+    assert len(archived_ids) == len(set(archived_ids)) == 35
+    assert _history(customer_id) == before
@@ -0,0 +1,68 @@
+import base64
+import datetime
+import types
+
+import pytest
+
+import app as bank
+
+
+def _cursor(raw):
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _pages(client, limit):
+    ids, cursor = [], None
+    while True:
+        response = client.get('/api/transactions', query_string={'limit': limit, **({'before': cursor} if cursor else {})})
+        assert response.status_code == 200
+        page = response.get_json()
+        ids.append([t['id'] for t in page['transactions']])
+        cursor = page['next_cursor']
+        if not cursor:
+            return ids
+
+
+def test_pages_break_timestamp_ties_by_id(client, login, make_customer):
+    customer_id, _ = make_customer(('Checking', 0))
+    # Pairs of rows share a timestamp, so a page boundary can fall between them
+    start = datetime.datetime(2025, 1, 1)
+    with bank.app.app_context():
+        bank.db.session.execute(bank.insert(bank.Transaction), [{
+            'customer_id': customer_id, 'type': 'receive', 'account_type': 'Checking', 'amount': 1,
+            'notes': f"row {i}", 'status': 'completed', 'category': 'Uncategorized', 'is_read': False,
+            'timestamp': start + datetime.timedelta(hours=i // 2)
+        } for i in range(9)])
+        bank.db.session.commit()
+        expected = [t.id for t in bank.Transaction.query.filter_by(customer_id=customer_id).order_by(
+            bank.Transaction.timestamp.desc(), bank.Transaction.id.desc())]
+
+    login(customer_id)
+    pages = _pages(client, 3)
+    assert [len(page) for page in pages] == [3, 3, 3]
+    assert sum(pages, []) == expected
+
+
+@pytest.mark.parametrize('cursor', [
+    'not base64!',
+    'YWJj=',
+    _cursor('2025-01-01T00:00:00'),
+    _cursor('2025-13-01T00:00:00|5'),
+    _cursor('2025-01-01T00:00:00|five'),
+    _cursor('2025-01-01T00:00:00|5|6'),
+    _cursor('2025-01-01T00:00:00+00:00|5'),
+    _cursor(f'2025-01-01T00:00:00|{2 ** 63}'),
+    base64.urlsafe_b64encode(b'\xff\xfe|5').decode(),
+])
+def test_malformed_cursors_are_rejected(client, login, make_customer, cursor):
+    customer_id, _ = make_customer(('Checking', 0))
+    login(customer_id)
+
+    response = client.get('/api/transactions', query_string={'before': cursor})
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Invalid cursor.'}
+
+
+def test_cursors_round_trip():
+    row = types.SimpleNamespace(id=42, timestamp=datetime.datetime(2025, 1, 1, 12, 30, 15, 250))
+    assert bank.decode_history_cursor(bank.encode_history_cursor(row)) == (row.timestamp, 42)
@@ -0,0 +1,90 @@
+import datetime
+
+import sqlalchemy as sa
+from flask_migrate import downgrade, upgrade
+
+import app as bank
+from conftest import MIGRATIONS
+
+
+def _schema():
+    """Tables with their columns and indexes, as the database reports them."""
+    inspector = sa.inspect(bank.db.engine)
+    with bank.db.engine.connect() as conn:
+        # Straight from sqlite_master: the inspector skips expression indexes such as lower(email)
+        indexes = conn.execute(sa.text(
+            "SELECT tbl_name, name FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL"
+        )).all()
+    return {
+        table: (
+            sorted(column['name'] for column in inspector.get_columns(table)),
+            sorted(name for tbl_name, name in indexes if tbl_name == table)
+        ) for table in inspector.get_table_names()
+    }
+
+
+def test_migration_chain_downgrades_to_base_and_back():
+    with bank.app.app_context():
+        head = _schema()
+        downgrade(directory=MIGRATIONS, revision='base')
+        assert set(_schema()) <= {'alembic_version'}
+        upgrade(directory=MIGRATIONS)
+        assert _schema() == head
+
+
+def test_migrations_match_the_models():
+    with bank.app.app_context():
+        schema = _schema()
+        for table in bank.db.metadata.sorted_tables:
+            columns, indexes = schema[table.name]
+            assert columns == sorted(column.name for column in table.columns), table.name
+            assert set(index.name for index in table.indexes) <= set(indexes), table.name
+
+
+def test_internal_transfer_legs_written_before_tagging_are_tagged(make_customer):
+    customer_id, _ = make_customer(('Checking', 0))
+    other_id, _ = make_customer(('Checking', 0))
+    at = datetime.datetime(2025, 1, 1)
+    legacy = [
+        # Two moves between own accounts, written receive first as the transfer flow always has
+        (customer_id, 'receive', 10, 'From Checking.', at),
+        (customer_id, 'send', 10, 'To Savings. Memo: None', at + datetime.timedelta(microseconds=40)),
+        (customer_id, 'receive', 25, 'From Savings.', at + datetime.timedelta(hours=1)),
+        (customer_id, 'send', 25, 'To Checking. Memo: None', at + datetime.timedelta(hours=1, microseconds=40)),
+        # A payment from a customer named Checking, and one to a customer named Savings
+        (customer_id, 'receive', 10, 'From Checking.', at + datetime.timedelta(hours=2)),
+        (customer_id, 'send', 10, 'To Savings (1234). Memo: rent', at + datetime.timedelta(hours=3)),
+        # The same customer's send and receive of different amounts, and another customer's receive of the same one
+        (customer_id, 'send', 7, 'To bob (5678). Memo: None', at + datetime.timedelta(hours=4)),
+        (customer_id, 'receive', 8, 'From carol.', at + datetime.timedelta(hours=4)),
+        (other_id, 'receive', 7, 'From Checking.', at + datetime.timedelta(hours=4)),
+    ]
+    expected = [bank.INTERNAL_TRANSFER_CATEGORY] * 4 + ['Uncategorized'] * 5
+    with bank.app.app_context():
+        downgrade(directory=MIGRATIONS, revision='c5f2a8d61e94')
+        rows = [bank.Transaction(customer_id=owner, type=type_, account_type='Checking', amount=amount, notes=notes, timestamp=timestamp)
+                for owner, type_, amount, notes, timestamp in legacy]
+        bank.db.session.add_all(rows)
+        bank.db.session.flush()
+        ids = [row.id for row in rows]
+        # The oldest three rows were archived, splitting the first pair across the tiers
+        archived = rows[:3]
+        bank.db.session.add(bank.TransactionArchive(
+            customer_id=customer_id, first_timestamp=archived[0].timestamp, last_timestamp=archived[-1].timestamp,
+            row_count=len(archived), payload=bank._pack_segment(archived[::-1])
+        ))
+        bank.db.session.execute(bank.delete(bank.Transaction).where(bank.Transaction.id.in_(ids[:3])))
+        bank.db.session.commit()
+        upgrade(directory=MIGRATIONS)
+
+        categories = {t.id: t.category for t in bank.Transaction.query.filter(bank.Transaction.id.in_(ids))}
+        segment = bank.TransactionArchive.query.filter_by(customer_id=customer_id).one()
+        categories.update((t.id, t.category) for t in bank._unpack_segment(customer_id, segment.payload))
+        assert [categories[transaction_id] for transaction_id in ids] == expected
+
+        downgrade(directory=MIGRATIONS, revision='c5f2a8d61e94')
+        bank.db.session.expire_all()
+        categories = {t.id: t.category for t in bank.Transaction.query.filter(bank.Transaction.id.in_(ids))}
+        categories.update((t.id, t.category) for t in bank._unpack_segment(customer_id, segment.payload))
+        assert set(categories.values()) == {'Uncategorized'}
+        upgrade(directory=MIGRATIONS)
@@ -0,0 +1,37 @@
+import datetime
+
+import pytest
+
+import app as bank
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    """A fresh presence registry in a worker that shares a message queue with others."""
+    monkeypatch.setattr(bank, 'SOCKETIO_MESSAGE_QUEUE', 'redis://shared-queue')
+    fresh = bank.PresenceRegistry()
+    monkeypatch.setattr(bank, 'presence', fresh)
+    yield fresh
+    if fresh._worker is not None:
+        fresh._worker.kill()
+    with bank.app.app_context():
+        bank.PresenceRecord.query.delete()
+        bank.db.session.commit()
+
+
+def test_worker_without_sockets_sees_other_workers_presence(client, login, make_customer, registry):
+    admin_id, _ = make_customer(is_admin=True)
+    customer_id, _ = make_customer(('Checking', 0))
+    now = datetime.datetime.utcnow()
+    with bank.app.app_context():
+        # The customer's socket lives on another worker
+        bank.db.session.add(bank.PresenceRecord(worker_id='elsewhere:1', user_id=customer_id, is_agent=False,
+                                                connections=1, last_seen=now, heartbeat_at=now))
+        bank.db.session.commit()
+
+    login(admin_id)
+    body = client.get('/api/admin/presence', query_string={'user_id': customer_id}).get_json()
+    assert body['online'] is True
+    assert body['connections'] == 1
+    # Serving a request started the sync loop, though no socket ever connected here
+    assert registry._worker is not None and not registry._worker.dead
@@ -0,0 +1,113 @@
+import os
+
+import app as bank
+
+
+def _rollups(customer_id):
+    with bank.app.app_context():
+        rows = bank.SpendingRollup.query.filter_by(customer_id=customer_id).all()
+        return {(r.month, r.category): (r.total, r.count) for r in rows}
+
+
+def test_transfers_keep_rollups_equal_to_a_full_rebuild(login, make_customer, account_number_of, send_money):
+    sender_id, accounts = make_customer(('Checking', 500))
+    recipient_id, _ = make_customer(('Checking', 0))
+    login(sender_id)
+    for amount in ('25.00', '10.50'):
+        send_money(accounts['Checking'], account_number_of(recipient_id), amount)
+
+    incremental = _rollups(sender_id)
+    assert sum(total for total, _ in incremental.values()) == 35.5
+    with bank.app.app_context():
+        bank.rebuild_spending_rollups([sender_id])
+    assert _rollups(sender_id) == incremental
+    # Receiving money isn't spending
+    assert _rollups(recipient_id) == {}
+
+
+def test_stress_transfers_completes_on_a_fresh_database(tmp_path):
+    url = 'sqlite:///' + os.path.join(tmp_path, 'stress.db')
+    result = bank.app.test_cli_runner().invoke(args=[
+        'stress-transfers', '--database-url', url, '--transfers', '50', '--concurrency', '5'
+    ])
+    assert result.exit_code == 0, result.output
+    assert 'errors: 0' in result.output
+
+
+def _move_between_own_accounts(client, from_account_id, to_account_id, amount):
+    response = client.post('/transfer', data={
+        'transfer_type': 'internal', 'from_account': from_account_id, 'to_account_internal': to_account_id,
+        'amount': amount, 'memo': ''
+    })
+    assert response.status_code == 302, response.get_data(as_text=True)
+    assert client.post('/transfer/confirm').status_code == 302
+
+
+def test_moving_money_between_own_accounts_is_not_spending(client, login, make_customer):
+    customer_id, accounts = make_customer(('Checking', 1000), ('Savings', 0))
+    with bank.app.app_context():
+        bank.db.session.add(bank.Transaction(type='admin_deposit', account_type='Checking', amount=300,
+                                             customer_id=customer_id, status='completed'))
+        bank.db.session.commit()
+    login(customer_id)
+    _move_between_own_accounts(client, accounts['Checking'], accounts['Savings'], '500.00')
+
+    with bank.app.app_context():
+        legs = bank.Transaction.query.filter(bank.Transaction.customer_id == customer_id,
+                                             bank.Transaction.type.in_(('send', 'receive'))).all()
+        assert {t.category for t in legs} == {bank.INTERNAL_TRANSFER_CATEGORY}
+        bank.rebuild_spending_rollups([customer_id])
+        assert _rollups(customer_id) == {}
+
+        bank.compute_financial_health([customer_id])
+        score = bank.db.session.get(bank.FinancialHealthScore, customer_id)
+        # Only the deposit is cash flow: income with no outflow scores the full component
+        assert score.cash_flow_score == 1.0
+
+
+def _score(customer_id):
+    with bank.app.app_context():
+        health = bank.db.session.get(bank.FinancialHealthScore, customer_id)
+        return health.score, health.previous_score
+
+
+def test_rescoring_keeps_the_previous_score(make_customer):
+    customer_id, accounts = make_customer(('Checking', 0))
+    with bank.app.app_context():
+        bank.compute_financial_health([customer_id])
+    first, previous = _score(customer_id)
+    assert previous is None
+
+    with bank.app.app_context():
+        bank.db.session.execute(bank.update(bank.Account).where(bank.Account.id == accounts['Checking']).values(balance=50000))
+        bank.db.session.commit()
+        bank.compute_financial_health([customer_id])
+    second, previous = _score(customer_id)
+    assert previous == first and second > first
+
+
+def test_first_request_scores_a_customer_another_request_just_scored(client, login, make_customer):
+    customer_id, _ = make_customer(('Checking', 100))
+    with bank.app.app_context():
+        engine = bank.db.engine
+
+    # Another worker stores this customer's first score between our read and our write
+    def race(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith('INSERT INTO financialhealthscore') and not raced:
+            raced.append(True)
+            with engine.begin() as other:
+                other.execute(bank.insert(bank.FinancialHealthScore), {
+                    'customer_id': customer_id, 'score': 1, 'balance_score': 0, 'cash_flow_score': 0,
+                    'stability_score': 0, 'computed_at': bank.datetime.utcnow()
+                })
+
+    raced = []
+    login(customer_id)
+    bank.event.listen(engine, 'before_cursor_execute', race)
+    try:
+        response = client.get('/api/financial-health')
+    finally:
+        bank.event.remove(engine, 'before_cursor_execute', race)
+
+    assert raced and response.status_code == 200
+    assert _score(customer_id) == (response.get_json()['score'], 1)
@@ -0,0 +1,209 @@
+import decimal
+import re
+
+import pytest
+
+import app as bank
+
+
+@pytest.mark.parametrize('reverse_ids', [False, True])
+def test_move_funds_rolls_back_when_credit_account_is_gone(make_customer, balance_of, reverse_ids):
+    _, accounts = make_customer(('Checking', 100), ('Savings', 0))
+    from_id, to_id = accounts['Checking'], accounts['Savings']
+    with bank.app.app_context():
+        bank.db.session.execute(bank.delete(bank.Account).where(bank.Account.id == to_id))
+        bank.db.session.commit()
+    # A missing id on either side of the ascending-id ordering
+    missing_id = 0 if reverse_ids else to_id
+
+    with bank.app.app_context():
+        assert not bank.move_funds(bank.db.session, from_id, missing_id, decimal.Decimal('40'))
+        bank.db.session.rollback()
+
+    assert balance_of(from_id) == 100
+
+
+def test_move_funds_moves_money_between_accounts(make_customer, balance_of):
+    _, accounts = make_customer(('Checking', 100), ('Savings', 0))
+    with bank.app.app_context():
+        assert bank.move_funds(bank.db.session, accounts['Savings'], accounts['Checking'], decimal.Decimal('1')) is False
+        bank.db.session.rollback()
+        assert bank.move_funds(bank.db.session, accounts['Checking'], accounts['Savings'], decimal.Decimal('40'))
+        bank.db.session.commit()
+
+    assert balance_of(accounts['Checking']) == 60
+    assert balance_of(accounts['Savings']) == 40
+
+
+def _sends(customer_id):
+    with bank.app.app_context():
+        return bank.Transaction.query.filter_by(customer_id=customer_id, type='send').count()
+
+
+@pytest.mark.parametrize('recipient_type', [
+    'Checking',
+    # Without a Checking account the confirm step would open one, which must not outlive a deleted customer
+    'Savings',
+])
+def test_confirm_rechecks_a_recipient_cached_before_it_went_away(client, login, make_customer, balance_of,
+                                                                 account_number_of, recipient_type):
+    sender_id, accounts = make_customer(('Checking', 100))
+    recipient_id, recipient_accounts = make_customer((recipient_type, 0))
+    account_number = account_number_of(recipient_id)
+    login(sender_id)
+    response = client.post('/transfer', data={
+        'transfer_type': 'external', 'from_account': accounts['Checking'],
+        'recipient_account_number': account_number, 'amount': '40.00', 'memo': ''
+    })
+    assert response.status_code == 302
+    assert bank.recipient_cache.get(account_number).checking_account_id == recipient_accounts.get('Checking')
+
+    # Another worker removes the recipient; this worker's cache never hears about it
+    with bank.app.app_context():
+        bank.db.session.execute(bank.delete(bank.Account).where(bank.Account.customer_id == recipient_id))
+        bank.db.session.execute(bank.delete(bank.Customer).where(bank.Customer.id == recipient_id))
+        bank.db.session.commit()
+
+    response = client.post('/transfer/confirm', follow_redirects=True)
+    assert b'recipient account is no longer available' in response.data
+    assert balance_of(accounts['Checking']) == 100
+    assert _sends(sender_id) == 0
+    assert bank.recipient_cache.get(account_number) is None
+    with bank.app.app_context():
+        # Nothing was left behind for a recipient that no longer exists
+        assert bank.Account.query.filter_by(customer_id=recipient_id).count() == 0
+
+
+@pytest.mark.parametrize('change', ['opened', 'closed'])
+def test_confirm_credits_the_checking_account_the_recipient_has_now(client, login, make_customer, balance_of,
+                                                                   account_number_of, change):
+    sender_id, accounts = make_customer(('Checking', 100))
+    recipient_id, _ = make_customer(('Checking' if change == 'closed' else 'Savings', 0))
+    account_number = account_number_of(recipient_id)
+    login(sender_id)
+    client.post('/transfer', data={
+        'transfer_type': 'external', 'from_account': accounts['Checking'],
+        'recipient_account_number': account_number, 'amount': '40.00', 'memo': ''
+    })
+    cached = bank.recipient_cache.get(account_number).checking_account_id
+
+    # Another worker opens or closes the recipient's Checking account; this worker's cache never hears about it
+    with bank.app.app_context():
+        if change == 'opened':
+            bank.db.session.add(bank.Account(account_type='Checking', balance=0, customer_id=recipient_id))
+        else:
+            bank.db.session.execute(bank.delete(bank.Account).where(bank.Account.id == cached))
+        bank.db.session.commit()
+
+    response = client.post('/transfer/confirm', follow_redirects=True)
+    assert b'Successfully transferred $40.00!' in response.data
+    assert balance_of(accounts['Checking']) == 60
+    with bank.app.app_context():
+        checking = bank.Account.query.filter_by(customer_id=recipient_id, account_type='Checking').all()
+    # Exactly one Checking account, holding the credit
+    assert [account.balance for account in checking] == [40]
+    assert bank.recipient_cache.get(account_number) is None
+
+
+def test_confirm_reports_insufficient_funds_for_a_live_recipient(client, login, make_customer, balance_of,
+                                                                 account_number_of):
+    sender_id, accounts = make_customer(('Checking', 100))
+    recipient_id, _ = make_customer(('Checking', 0))
+    login(sender_id)
+    client.post('/transfer', data={
+        'transfer_type': 'external', 'from_account': accounts['Checking'],
+        'recipient_account_number': account_number_of(recipient_id), 'amount': '80.00', 'memo': ''
+    })
+    # The balance drops between review and confirmation
+    with bank.app.app_context():
+        bank.db.session.execute(bank.update(bank.Account).where(bank.Account.id == accounts['Checking']).values(balance=50))
+        bank.db.session.commit()
+
+    response = client.post('/transfer/confirm', follow_redirects=True)
+    assert b'Insufficient funds' in response.data
+    assert balance_of(accounts['Checking']) == 50
+
+
+def _batch(client, *items):
+    return client.post('/api/transfers/batch', json={'transfers': list(items)})
+
+
+def test_batch_rejects_malformed_items_one_by_one(client, login, make_customer, account_number_of, balance_of):
+    sender_id, accounts = make_customer(('Checking', 100))
+    recipient_id, recipient_accounts = make_customer(('Checking', 0))
+    number = account_number_of(recipient_id)
+    login(sender_id)
+
+    response = _batch(
+        client,
+        {'from_account_id': accounts['Checking'], 'recipient_account_number': number, 'amount': '5', 'memo': 12},
+        {'from_account_id': accounts['Checking'], 'recipient_account_number': number, 'amount': '5', 'memo': {'a': 1}},
+        {'from_account_id': True, 'recipient_account_number': number, 'amount': '5'},
+        {'from_account_id': accounts['Checking'], 'recipient_account_number': number, 'amount': '5', 'memo': 'rent'},
+    )
+    assert response.status_code == 200
+    body = response.get_json()
+    assert [r['status'] for r in body['results']] == ['failed', 'failed', 'failed', 'completed']
+    assert body['results'][0]['error'] == 'Memo must be text.'
+    assert body['results'][2]['error'] == 'Invalid source account.'
+    assert balance_of(accounts['Checking']) == 95
+    assert balance_of(recipient_accounts['Checking']) == 5
+
+
+def test_batch_opens_recipient_accounts_only_for_transfers_that_go_through(client, login, make_customer, account_number_of):
+    sender_id, accounts = make_customer(('Checking', 100))
+    declined_id, _ = make_customer(('Savings', 0))
+    paid_id, _ = make_customer(('Savings', 0))
+    paid_number = account_number_of(paid_id)
+    login(sender_id)
+    # The single-transfer flow has the recipient cached without a Checking account
+    with bank.app.app_context():
+        assert bank.resolve_recipient(paid_number).checking_account_id is None
+
+    body = _batch(
+        client,
+        {'from_account_id': accounts['Checking'], 'recipient_account_number': account_number_of(declined_id), 'amount': '500'},
+        {'from_account_id': accounts['Checking'], 'recipient_account_number': paid_number, 'amount': '30'},
+    ).get_json()
+    assert [r['status'] for r in body['results']] == ['failed', 'completed']
+    assert bank.recipient_cache.get(paid_number) is None
+
+    with bank.app.app_context():
+        assert bank.Account.query.filter_by(customer_id=declined_id, account_type='Checking').count() == 0
+        opened = bank.Account.query.filter_by(customer_id=paid_id, account_type='Checking').one()
+        assert opened.balance == 30
+
+
+@pytest.fixture
+def account_reads():
+    """Counts the SELECTs reading the account table, per request."""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if re.match(r'\s*SELECT\b.*\bFROM account\b', statement, re.S):
+            statements.append(statement)
+
+    with bank.app.app_context():
+        engine = bank.db.engine
+    bank.event.listen(engine, 'before_cursor_execute', record)
+    yield statements
+    bank.event.remove(engine, 'before_cursor_execute', record)
+
+
+def test_transfer_flow_loads_accounts_once_per_request(client, login, make_customer, account_reads, balance_of):
+    customer_id, accounts = make_customer(('Checking', 100), ('Savings', 0))
+    login(customer_id)
+    form = {'transfer_type': 'internal', 'from_account': accounts['Checking'],
+            'to_account_internal': accounts['Savings'], 'amount': '25.00', 'memo': ''}
+
+    reads = []
+    for method, path, data in [('get', '/transfer', None), ('post', '/transfer', form), ('get', '/transfer/confirm', None),
+                               ('post', '/transfer/confirm', None)]:
+        del account_reads[:]
+        response = getattr(client, method)(path, data=data)
+        assert response.status_code in (200, 302), path
+        reads.append(len(account_reads))
+
+    # The form choices, amount validation and the confirm step all share one snapshot
+    assert reads == [1, 1, 0, 1]
+    assert balance_of(accounts['Savings']) == 25